@@ -8,6 +8,7 @@ from ai.config import AIConfig
 from ai.llm_provider import LLMProvider
 from ai.prompts.insight_templates import INSIGHTS_SYSTEM_PROMPT, INSIGHTS_USER_TEMPLATE
 from db import database as db
+from services.valuation import cached_lots_frame, value_holdings
 
 logger = logging.getLogger(__name__)
 
@@ -69,28 +70,25 @@ class InsightsAgent:
         )
 
     def _gather_data(self) -> dict:
-        holdings = db.get_holdings()
+        lots = value_holdings(cached_lots_frame(db.get_holdings()), fx_history=False).lots
         enriched = []
-        for h in holdings:
+        for _, lot in lots.iterrows():
             entry = {
-                "name": h["name"],
-                "symbol": h["symbol"],
-                "category": h["category"],
-                "quantity": h["quantity"],
-                "buy_price": h["buy_price"],
-                "currency": h["currency"],
-                "invested": h["quantity"] * h["buy_price"],
+                "name": lot["name"],
+                "symbol": lot["symbol"],
+                "category": lot["category"],
+                "quantity": lot["quantity"],
+                "buy_price": lot["buy_price"],
+                "currency": lot["currency"],
+                "invested": lot["invested"],
             }
-            cached = db.get_cached_price(h["symbol"], ttl_minutes=1440)
-            if cached and cached.get("current_price"):
-                entry["current_price"] = cached["current_price"]
-                entry["current_value"] = h["quantity"] * cached["current_price"]
-                entry["return_pct"] = round(
-                    (cached["current_price"] - h["buy_price"]) / h["buy_price"] * 100, 2
-                )
-                entry["all_time_high"] = cached.get("all_time_high")
-                entry["all_time_low"] = cached.get("all_time_low")
-                entry["trend"] = cached.get("trend")
+            if lot["has_price"]:
+                entry["current_price"] = lot["current_price"]
+                entry["current_value"] = lot["value"]
+                entry["return_pct"] = round(lot["pnl_pct"], 2)
+                entry["all_time_high"] = lot["all_time_high"]
+                entry["all_time_low"] = lot["all_time_low"]
+                entry["trend"] = lot["trend"]
             enriched.append(entry)
 
         return {
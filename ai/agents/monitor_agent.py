@@ -4,11 +4,12 @@ import logging
 import threading
 import time
 from dataclasses import dataclass, field
-from datetime import datetime
-
-import yfinance as yf
+from datetime import date, datetime, timedelta
 
 from db import database as db
+from services import negative_cache
+from services.market_data import refresh_stock_prices
+from utils.market_hours import effective_ttl_minutes
 
 logger = logging.getLogger(__name__)
 
@@ -89,47 +90,42 @@ class MonitorAgent:
         if not stock_holdings:
             return
 
-        symbols = [h["symbol"] for h in stock_holdings]
         symbol_map = {h["symbol"]: h for h in stock_holdings}
 
-        try:
-            tickers = yf.Tickers(" ".join(symbols))
-            for symbol in symbols:
-                try:
-                    t = tickers.tickers.get(symbol)
-                    if not t:
-                        continue
-                    hist = t.history(period="5d")
-                    if hist.empty or len(hist) < 2:
-                        continue
-
-                    current = float(hist["Close"].iloc[-1])
-                    prev = float(hist["Close"].iloc[-2])
-                    change_pct = (current - prev) / prev * 100
-
-                    if abs(change_pct) >= self._threshold:
-                        h = symbol_map[symbol]
-                        direction = "up" if change_pct > 0 else "down"
-                        self._store.add(Alert(
-                            timestamp=datetime.now(),
-                            alert_type="price_move",
-                            severity="warning" if abs(change_pct) < 10 else "critical",
-                            symbol=symbol,
-                            title=f"{h['name']} {direction} {abs(change_pct):.1f}%",
-                            description=f"{symbol}: {prev:.2f} -> {current:.2f} ({change_pct:+.1f}%)",
-                        ))
-
-                    # Update price cache
-                    db.upsert_price_cache(symbol, {
-                        "current_price": current,
-                        "all_time_high": None,
-                        "all_time_low": None,
-                        "trend": None,
-                        "currency": None,
-                    })
-
-                except Exception as e:
-                    logger.warning("Monitor check failed for %s: %s", symbol, e)
-
-        except Exception as e:
-            logger.error("Batch monitor fetch failed: %s", e)
+        # A closed market's price cannot move: skip symbols already cached after its close
+        cached = db.get_cached_prices(list(symbol_map))
+        # Symbols that keep failing (delisted, mistyped) are left to their back-off
+        failing = negative_cache.suppressed([f"stock:{s}" for s in symbol_map])
+        symbols = [
+            s for s in symbol_map
+            if f"stock:{s}" not in failing
+            and (s not in cached or cached[s]["age_seconds"] > effective_ttl_minutes(s, 0) * 60)
+        ]
+        if not symbols:
+            return
+
+        # Shares downloads with any session or tool fetching the same symbols; the
+        # refreshed prices (and extremes) are written to price_cache and history
+        prices = refresh_stock_prices(symbols)
+        since = (date.today() - timedelta(days=10)).isoformat()
+        closes: dict[str, list[float]] = {}
+        for row in db.get_closes_bulk([s for s, p in prices.items() if p], since=since):
+            closes.setdefault(row["symbol"], []).append(row["close"])
+
+        for symbol, symbol_closes in closes.items():
+            if len(symbol_closes) < 2:
+                continue
+            current, prev = symbol_closes[-1], symbol_closes[-2]
+            change_pct = (current - prev) / prev * 100
+
+            if abs(change_pct) >= self._threshold:
+                h = symbol_map[symbol]
+                direction = "up" if change_pct > 0 else "down"
+                self._store.add(Alert(
+                    timestamp=datetime.now(),
+                    alert_type="price_move",
+                    severity="warning" if abs(change_pct) < 10 else "critical",
+                    symbol=symbol,
+                    title=f"{h['name']} {direction} {abs(change_pct):.1f}%",
+                    description=f"{symbol}: {prev:.2f} -> {current:.2f} ({change_pct:+.1f}%)",
+                ))
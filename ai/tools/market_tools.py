@@ -2,10 +2,14 @@ from __future__ import annotations
 
 import logging
 
-import requests
 import yfinance as yf
 
 from ai.tools.registry import ToolRegistry
+from db.database import get_history_stats
+from services import http_client
+from services.throttle import provider_slot
+from services import indicators
+from services.price_history import load_history, sync_history
 
 logger = logging.getLogger(__name__)
 
@@ -16,7 +20,8 @@ def register_market_tools(registry: ToolRegistry) -> None:
         """Fetch current market price for a stock/ETF."""
         try:
             ticker = yf.Ticker(symbol)
-            hist = ticker.history(period="5d")
+            with provider_slot("yfinance"):
+                hist = ticker.history(period="5d")
             if hist.empty:
                 return {"symbol": symbol, "error": "No data available"}
             current = float(hist["Close"].iloc[-1])
@@ -46,9 +51,7 @@ def register_market_tools(registry: ToolRegistry) -> None:
     def get_mutual_fund_nav(scheme_code: str) -> dict:
         """Fetch latest NAV for an Indian mutual fund."""
         try:
-            resp = requests.get(f"https://api.mfapi.in/mf/{scheme_code}/latest", timeout=10)
-            resp.raise_for_status()
-            data = resp.json()
+            data = http_client.get_json(f"https://api.mfapi.in/mf/{scheme_code}/latest", timeout=10)
             nav_data = data.get("data", [{}])[0] if data.get("data") else {}
             return {
                 "scheme_code": scheme_code,
@@ -74,13 +77,11 @@ def register_market_tools(registry: ToolRegistry) -> None:
     def get_forex_rate(from_currency: str, to_currency: str) -> dict:
         """Get current exchange rate between two currencies."""
         try:
-            resp = requests.get(
+            data = http_client.get_json(
                 "https://api.frankfurter.dev/latest",
                 params={"from": from_currency, "to": to_currency},
                 timeout=10,
             )
-            resp.raise_for_status()
-            data = resp.json()
             rate = data["rates"][to_currency]
             return {"from": from_currency, "to": to_currency, "rate": rate}
         except Exception as e:
@@ -102,13 +103,13 @@ def register_market_tools(registry: ToolRegistry) -> None:
     def get_52_week_range(symbol: str) -> dict:
         """Get 52-week high/low for a stock."""
         try:
-            ticker = yf.Ticker(symbol)
-            hist = ticker.history(period="1y")
-            if hist.empty:
+            sync_history(symbol)
+            stats = get_history_stats(symbol)
+            if not stats or stats["high_52w"] is None:
                 return {"symbol": symbol, "error": "No data"}
-            current = float(hist["Close"].iloc[-1])
-            high_52w = float(hist["High"].max())
-            low_52w = float(hist["Low"].min())
+            current = stats["last_close"]
+            high_52w = stats["high_52w"]
+            low_52w = stats["low_52w"]
             pct_below = (high_52w - current) / high_52w * 100
             return {
                 "symbol": symbol,
@@ -131,3 +132,29 @@ def register_market_tools(registry: ToolRegistry) -> None:
             "required": ["symbol"],
         },
     )
+
+    def get_technical_indicators(symbol: str) -> dict:
+        """Get trend, moving averages, RSI, volatility and drawdown for a stock or ETF."""
+        try:
+            sync_history(symbol)
+            history = load_history(symbol, days=indicators.LOOKBACK_DAYS)
+            if history.empty:
+                return {"symbol": symbol, "error": "No data"}
+            row = indicators.records(indicators.compute({symbol: history["Close"]}))[symbol]
+            return {"symbol": symbol, **row}
+        except Exception as e:
+            return {"symbol": symbol, "error": str(e)}
+
+    registry.register(
+        func=get_technical_indicators,
+        description="Get technical indicators for a stock or ETF from up to a year of daily closes: trend (SMA5 vs SMA20), "
+                    "SMA/EMA levels, MACD (EMA12 - EMA26), 14-day RSI, annualised volatility, and current/max drawdown "
+                    "from the 1-year high (fractions, e.g. -0.12 = 12% below).",
+        parameters={
+            "type": "object",
+            "properties": {
+                "symbol": {"type": "string", "description": "Yahoo Finance ticker symbol."},
+            },
+            "required": ["symbol"],
+        },
+    )
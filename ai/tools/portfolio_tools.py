@@ -2,6 +2,14 @@ from __future__ import annotations
 
 from ai.tools.registry import ToolRegistry
 from db import database as db
+from services.indicators import history_symbol, portfolio_indicators, records
+from services.valuation import cached_lots_frame, value_holdings
+
+
+def _portfolio_indicators(holdings: list[dict]) -> dict[str, dict]:
+    # Same symbol set as the dashboard, so its indicator snapshot is reused
+    symbols = (history_symbol(h["category"], h["symbol"]) for h in holdings)
+    return records(portfolio_indicators(s for s in symbols if s))
 
 
 def register_portfolio_tools(registry: ToolRegistry) -> None:
@@ -29,50 +37,55 @@ def register_portfolio_tools(registry: ToolRegistry) -> None:
 
     def get_portfolio_summary() -> dict:
         """Get high-level portfolio summary with totals by category."""
-        holdings = db.get_holdings()
-        summary = {}
-        total_invested = 0
-        for h in holdings:
-            cat = h["category"]
-            if cat not in summary:
-                summary[cat] = {"total_invested": 0, "count": 0, "currency": h["currency"]}
-            cost = h["quantity"] * h["buy_price"]
-            summary[cat]["total_invested"] += cost
-            summary[cat]["count"] += 1
-            total_invested += cost
-
+        valuation = value_holdings(cached_lots_frame(db.get_holdings()))
+        summary = {
+            cat: {
+                "total_invested": round(row["invested"], 2),
+                "current_value": round(row["value"], 2),
+                "pnl_pct": round(row["pnl_pct"], 2),
+                "current_value_sgd": round(row["value_base"], 2),
+                "count": int(row["count"]),
+                "currency": row["currency"],
+            }
+            for cat, row in valuation.by_category.iterrows()
+        }
+        totals = valuation.totals
         return {
             "by_category": summary,
-            "total_invested": total_invested,
-            "total_holdings": len(holdings),
+            "total_invested_sgd": round(totals["invested_base"], 2),
+            "total_value_sgd": round(totals["value_base"], 2),
+            "total_pnl_sgd": round(totals["pnl_base"], 2),
+            "fx_pnl_sgd": round(totals["fx_pnl_base"], 2),
+            "total_holdings": totals["count"],
+            "priced_holdings": int(valuation.lots["has_price"].sum()),
         }
 
     registry.register(
         func=get_portfolio_summary,
-        description="Get a high-level portfolio summary with total invested amount and breakdown by category (market/asset type).",
+        description="Get a high-level portfolio summary: total invested, value and P&L in SGD (invested converted at buy-date "
+                    "exchange rates, with the currency-driven part of P&L), and a breakdown by category (market/asset type) "
+                    "in each category's own currency. Holdings without a recent cached price are valued at their buy price.",
         parameters={"type": "object", "properties": {}, "required": []},
     )
 
     def get_top_performers(n: int = 5, worst: bool = False) -> dict:
         """Get top or worst performers by return percentage (based on buy price vs current cached price)."""
-        holdings = db.get_holdings()
-        performers = []
-        for h in holdings:
-            cached = db.get_cached_price(h["symbol"], ttl_minutes=1440)
-            if cached and cached.get("current_price"):
-                current = cached["current_price"]
-                ret = (current - h["buy_price"]) / h["buy_price"] * 100
-                performers.append({
-                    "name": h["name"],
-                    "symbol": h["symbol"],
-                    "category": h["category"],
-                    "buy_price": h["buy_price"],
-                    "current_price": current,
-                    "return_pct": round(ret, 2),
-                    "currency": h["currency"],
-                })
-        performers.sort(key=lambda x: x["return_pct"], reverse=not worst)
-        return {"performers": performers[:n], "type": "worst" if worst else "best"}
+        lots = value_holdings(cached_lots_frame(db.get_holdings()), fx_history=False).lots
+        lots = lots[lots["has_price"]]
+        ranked = lots.nsmallest(n, "pnl_pct") if worst else lots.nlargest(n, "pnl_pct")
+        performers = [
+            {
+                "name": row["name"],
+                "symbol": row["symbol"],
+                "category": row["category"],
+                "buy_price": row["buy_price"],
+                "current_price": row["current_price"],
+                "return_pct": round(row["pnl_pct"], 2),
+                "currency": row["currency"],
+            }
+            for _, row in ranked.iterrows()
+        ]
+        return {"performers": performers, "type": "worst" if worst else "best"}
 
     registry.register(
         func=get_top_performers,
@@ -92,12 +105,15 @@ def register_portfolio_tools(registry: ToolRegistry) -> None:
         holdings = db.get_holdings()
         for h in holdings:
             if h["symbol"].upper() == symbol.upper():
-                cached = db.get_cached_price(h["symbol"], ttl_minutes=1440)
-                if cached:
+                cached = db.get_cached_prices([h["symbol"]], ttl_minutes=1440).get(h["symbol"])
+                if cached and not cached["is_stale"]:
                     h["current_price"] = cached.get("current_price")
                     h["all_time_high"] = cached.get("all_time_high")
                     h["all_time_low"] = cached.get("all_time_low")
                     h["trend"] = cached.get("trend")
+                hist_symbol = history_symbol(h["category"], h["symbol"])
+                if hist_symbol:
+                    h["indicators"] = _portfolio_indicators(holdings).get(hist_symbol)
                 return h
         return {"error": f"No holding found with symbol {symbol}"}
 
@@ -134,24 +150,27 @@ def register_portfolio_tools(registry: ToolRegistry) -> None:
 
     def get_allocation_breakdown(group_by: str = "category") -> dict:
         """Get portfolio allocation breakdown by category or currency."""
-        holdings = db.get_holdings()
-        breakdown = {}
-        for h in holdings:
-            key = h.get(group_by, "unknown")
-            if key not in breakdown:
-                breakdown[key] = {"total_invested": 0, "count": 0}
-            breakdown[key]["total_invested"] += h["quantity"] * h["buy_price"]
-            breakdown[key]["count"] += 1
-
-        grand_total = sum(v["total_invested"] for v in breakdown.values())
-        for v in breakdown.values():
-            v["pct"] = round(v["total_invested"] / grand_total * 100, 1) if grand_total else 0
-
-        return {"breakdown": breakdown, "group_by": group_by, "grand_total": grand_total}
+        lots = value_holdings(cached_lots_frame(db.get_holdings())).lots
+        if group_by not in ("category", "currency"):
+            group_by = "category"
+        grouped = lots.groupby(group_by).agg(
+            total_invested_sgd=("invested_base", "sum"),
+            current_value_sgd=("value_base", "sum"),
+            count=("symbol", "size"),
+        )
+        grand_total = float(grouped["current_value_sgd"].sum())
+        grouped["pct"] = grouped["current_value_sgd"] / grand_total * 100 if grand_total else 0.0
+        breakdown = {
+            key: {"total_invested_sgd": round(row["total_invested_sgd"], 2),
+                  "current_value_sgd": round(row["current_value_sgd"], 2),
+                  "count": int(row["count"]), "pct": round(row["pct"], 1)}
+            for key, row in grouped.iterrows()
+        }
+        return {"breakdown": breakdown, "group_by": group_by, "grand_total_sgd": round(grand_total, 2)}
 
     registry.register(
         func=get_allocation_breakdown,
-        description="Get portfolio allocation breakdown. Group by 'category' or 'currency'.",
+        description="Get portfolio allocation breakdown by current value in SGD. Group by 'category' or 'currency'.",
         parameters={
             "type": "object",
             "properties": {
@@ -165,3 +184,40 @@ def register_portfolio_tools(registry: ToolRegistry) -> None:
             "required": [],
         },
     )
+
+    def get_technical_overview(category: str | None = None) -> dict:
+        """Get trend, RSI, volatility and drawdown for every holding from locally stored daily history."""
+        holdings = db.get_holdings(category)
+        rows = _portfolio_indicators(db.get_holdings())
+        overview = []
+        for h in holdings:
+            row = rows.get(history_symbol(h["category"], h["symbol"]) or "")
+            if row:
+                overview.append({
+                    "symbol": h["symbol"],
+                    "name": h["name"],
+                    "category": h["category"],
+                    "trend": row["trend"],
+                    "rsi_14": row["rsi_14"],
+                    "volatility": row["volatility"],
+                    "drawdown": row["drawdown"],
+                    "max_drawdown": row["max_drawdown"],
+                })
+        return {"holdings": overview, "count": len(overview)}
+
+    registry.register(
+        func=get_technical_overview,
+        description="Get technical indicators for every holding at once: trend, 14-day RSI, annualised volatility, and current/max "
+                    "drawdown from the 1-year high (fractions). Optionally filter by category. Holdings without price history are omitted.",
+        parameters={
+            "type": "object",
+            "properties": {
+                "category": {
+                    "type": "string",
+                    "enum": ["INDIAN_STOCK", "SG_STOCK", "US_STOCK", "INDIAN_MF", "SG_MF", "PRECIOUS_METAL"],
+                    "description": "Filter by holding category.",
+                },
+            },
+            "required": [],
+        },
+    )
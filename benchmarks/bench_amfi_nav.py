@@ -0,0 +1,112 @@
+"""Per-scheme mfapi refresh vs. one AMFI NAVAll.txt ingestion, against fake sources.
+
+Every scheme starts with NAV history up to the previous business day, as it
+would after its first mfapi download. The per-scheme path then makes one
+/latest request per fund over 5 threads. The AMFI path reads a generated
+NAVAll.txt with as many rows as the real file, plus a fixed charge for
+downloading it.
+
+Run from the project root:  python -m benchmarks.bench_amfi_nav
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from db import database as db
+from services import amfi_nav, mf_data
+from services.throttle import PROVIDERS
+
+REQUEST_LATENCY_S = 0.15
+FILE_DOWNLOAD_S = 1.0        # ~1.5 MB NAVAll.txt
+FILE_SCHEMES = 14_000
+HISTORY_NAVS = 2500
+SIZES = (20, 100)
+
+_TODAY = pd.Timestamp.today().normalize()
+_NAV_DATE = _TODAY if np.is_busday(_TODAY.date()) else _TODAY - pd.offsets.BDay(1)
+_HISTORY_INDEX = pd.bdate_range(end=_NAV_DATE - pd.offsets.BDay(1), periods=HISTORY_NAVS)
+
+
+def _scheme_code(i: int) -> str:
+    return str(100_000 + i)
+
+
+def _latest_nav(code: str) -> float:
+    return 10 + int(code) % 500 / 7
+
+
+def _write_nav_file(path: str) -> None:
+    date_text = _NAV_DATE.strftime("%d-%b-%Y")
+    with open(path, "w") as f:
+        f.write("Scheme Code;ISIN Div Payout/ ISIN Growth;ISIN Div Reinvestment;Scheme Name;Net Asset Value;Date\n\n")
+        for i in range(FILE_SCHEMES):
+            if i % 400 == 0:
+                f.write(f"\nOpen Ended Schemes(Category {i // 400})\n\nFund House {i // 400}\n\n")
+            code = _scheme_code(i)
+            f.write(f"{code};INF{code}A01;-;Fund {code} - Direct Plan - Growth;{_latest_nav(code):.4f};{date_text}\n")
+
+
+def _fake_get_json(url: str, params: dict | None = None, **_) -> dict:
+    time.sleep(REQUEST_LATENCY_S)
+    code = url.rstrip("/").split("/")[-2]
+    return {"data": [{"date": _NAV_DATE.strftime("%d-%m-%Y"), "nav": f"{_latest_nav(code):.4f}"}]}
+
+
+def _seed(codes: list[str]) -> None:
+    walk = np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.005, HISTORY_NAVS)))
+    dates = _HISTORY_INDEX.strftime("%Y-%m-%d")
+    with db.transaction():
+        for code in codes:
+            navs = walk * _latest_nav(code)
+            db.upsert_price_history(code, [{"date": d, "close": float(n)} for d, n in zip(dates, navs)])
+
+
+def _per_scheme(codes: list[str], nav_file: str) -> None:
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        list(executor.map(mf_data._fetch_mf_price, codes))
+
+
+def _amfi(codes: list[str], nav_file: str) -> None:
+    time.sleep(FILE_DOWNLOAD_S)
+    updated = amfi_nav.refresh_from_amfi(codes, source=nav_file)
+    assert len(updated) == len(codes)
+
+
+def _run(label: str, fn, codes: list[str], nav_file: str) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.init_db()
+        _seed(codes)
+        start = time.perf_counter()
+        fn(codes, nav_file)
+        elapsed = time.perf_counter() - start
+        db.close_connection()
+    print(f"{label:<12} {len(codes):>5} funds   {elapsed:7.2f}s")
+
+
+def main() -> None:
+    mf_data.http_client.get_json = _fake_get_json
+    PROVIDERS["mfapi"].bucket.rate = PROVIDERS["mfapi"].bucket.capacity = 1e6
+    with tempfile.TemporaryDirectory() as tmp:
+        nav_file = os.path.join(tmp, "NAVAll.txt")
+        _write_nav_file(nav_file)
+
+        start = time.perf_counter()
+        with open(nav_file) as f:
+            rows = sum(1 for _ in amfi_nav.parse_nav_file(f))
+        print(f"parse        {rows:>5} rows    {time.perf_counter() - start:7.3f}s")
+
+        for n in SIZES:
+            codes = [_scheme_code(i * 37) for i in range(n)]
+            _run("per-scheme", _per_scheme, codes, nav_file)
+            _run("amfi", _amfi, codes, nav_file)
+
+
+if __name__ == "__main__":
+    main()
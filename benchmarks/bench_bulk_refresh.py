@@ -0,0 +1,100 @@
+"""Per-ticker refresh vs. batched multi-ticker download, against a fake data source.
+
+The fake source charges a fixed round-trip latency per request plus a small
+per-ticker cost, which is how yfinance behaves from a home connection. Both
+paths run on a fresh database, first cold (full backfill) and then warm
+(incremental refresh of already stored symbols).
+
+Run from the project root:  python -m benchmarks.bench_bulk_refresh
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from db import database as db
+from services import market_data, price_history
+from services.throttle import PROVIDERS
+
+REQUEST_LATENCY_S = 0.15
+PER_TICKER_LATENCY_S = 0.002
+HISTORY_BARS = 2500
+SIZES = (50, 200, 1000)
+
+
+# Built once so the benchmark measures the refresh paths, not fake-data generation
+_INDEX = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=HISTORY_BARS, tz="UTC")
+_WALK = np.exp(np.cumsum(np.random.default_rng(0).normal(0, 0.01, HISTORY_BARS)))
+
+
+def _fake_frame(symbol: str, bars: int) -> pd.DataFrame:
+    close = _WALK[-bars:] * (50 + abs(hash(symbol)) % 100)
+    return pd.DataFrame({
+        "Open": close, "High": close * 1.01, "Low": close * 0.99, "Close": close,
+        "Volume": np.full(bars, 1_000.0),
+    }, index=_INDEX[-bars:])
+
+
+def _bars_requested(period: str | None, start: str | None) -> int:
+    if period == "max":
+        return HISTORY_BARS
+    return max(int((_INDEX >= pd.Timestamp(start, tz="UTC")).sum()), 1)
+
+
+class _FakeTicker:
+    def __init__(self, symbol: str):
+        self._symbol = symbol
+
+    def history(self, period: str | None = None, start: str | None = None, **_) -> pd.DataFrame:
+        time.sleep(REQUEST_LATENCY_S + PER_TICKER_LATENCY_S)
+        return _fake_frame(self._symbol, _bars_requested(period, start))
+
+
+def _fake_download(tickers: list[str], period: str | None = None, start: str | None = None, **_) -> pd.DataFrame:
+    time.sleep(REQUEST_LATENCY_S + PER_TICKER_LATENCY_S * len(tickers))
+    bars = _bars_requested(period, start)
+    return pd.concat({t: _fake_frame(t, bars) for t in tickers}, axis=1)
+
+
+def _per_ticker(symbols: list[str]) -> None:
+    # The pre-bulk path: one incremental history call per symbol over 5 threads
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        results = list(executor.map(market_data._fetch_stock_price, symbols))
+    db.bulk_upsert_price_cache([market_data._cache_row(s, r) for s, r in zip(symbols, results) if r])
+
+
+def _bulk(symbols: list[str]) -> None:
+    market_data.refresh_prices_bulk(symbols, download=_fake_download)
+
+
+def _run(label: str, fn, symbols: list[str]) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.init_db()
+        timings = []
+        for _ in ("cold", "warm"):
+            start = time.perf_counter()
+            fn(symbols)
+            timings.append(time.perf_counter() - start)
+        db.close_connection()
+    print(f"{label:<12} {len(symbols):>5} symbols   cold {timings[0]:7.2f}s   warm {timings[1]:7.2f}s")
+
+
+def main() -> None:
+    price_history.yf.Ticker = _FakeTicker
+    # The fake source has no upstream quota; don't let the yfinance token bucket
+    # turn this into a rate-limit benchmark.
+    PROVIDERS["yfinance"].bucket.rate = PROVIDERS["yfinance"].bucket.capacity = 1e6
+    for n in SIZES:
+        symbols = [f"SYM{i}" for i in range(n)]
+        _run("per-ticker", _per_ticker, symbols)
+        _run("bulk", _bulk, symbols)
+
+
+if __name__ == "__main__":
+    main()
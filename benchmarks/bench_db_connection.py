@@ -0,0 +1,71 @@
+"""Per-call overhead of the pooled connection vs. a fresh connection per call.
+
+Run from the project root:  python -m benchmarks.bench_db_connection
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import tempfile
+import time
+
+from db import database as db
+
+CALLS = 2000
+
+
+def _legacy_get_cached_price(symbol: str) -> dict | None:
+    # What every helper did before pooling: connect, set pragmas, query, close.
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    row = conn.execute("SELECT * FROM price_cache WHERE symbol=?", (symbol,)).fetchone()
+    conn.close()
+    return dict(row) if row else None
+
+
+def _legacy_upsert_price_cache(symbol: str, price: float) -> None:
+    conn = sqlite3.connect(db.DB_PATH)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute(
+        """INSERT OR REPLACE INTO price_cache (symbol, current_price, fetched_at)
+           VALUES (?, ?, datetime('now'))""",
+        (symbol, price),
+    )
+    conn.commit()
+    conn.close()
+
+
+def _time(label: str, fn) -> float:
+    start = time.perf_counter()
+    for i in range(CALLS):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    per_call_us = elapsed / CALLS * 1e6
+    print(f"{label:<32} {per_call_us:9.1f} us/call")
+    return per_call_us
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.init_db()
+        for i in range(100):
+            db.upsert_price_cache(f"SYM{i}", {"current_price": float(i)})
+
+        print(f"{CALLS} calls each\n")
+        before = _time("read  (connect per call)", lambda i: _legacy_get_cached_price(f"SYM{i % 100}"))
+        after = _time("read  (pooled)", lambda i: db.get_cached_price(f"SYM{i % 100}"))
+        print(f"{'':<32} {before / after:9.1f}x faster\n")
+
+        before = _time("write (connect per call)", lambda i: _legacy_upsert_price_cache(f"SYM{i % 100}", i))
+        after = _time("write (pooled)", lambda i: db.upsert_price_cache(f"SYM{i % 100}", {"current_price": i}))
+        print(f"{'':<32} {before / after:9.1f}x faster")
+
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Sequential per-holding price fetches vs. the concurrent price resolver, on a cold cache.
+
+Provider calls are replaced with sleeps of typical latencies: a stock
+request per symbol (or one batched download), one mfapi request per scheme,
+one metal spot price and one FX matrix request. The sequential run calls
+them one after another, as the dashboard's enrichment loop used to;
+resolve_prices() runs the asset classes side by side. No network.
+
+Run from the project root:  python -m benchmarks.bench_price_resolver
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+
+from db import database as db
+from db.models import PriceData
+from services import price_resolver
+from utils.constants import Category
+
+STOCKS = 10
+SCHEMES = 3
+LATENCY = {"stock": 0.5, "stock-batch": 1.2, "mf": 0.6, "metal": 0.8, "fx": 0.4}
+
+
+def _price(_=None) -> PriceData:
+    return PriceData(100.0, 0, 0, "UP")
+
+
+def _stocks(symbols: list[str]) -> dict[str, PriceData]:
+    time.sleep(LATENCY["stock-batch"])
+    return {s: _price() for s in symbols}
+
+
+def _stock(symbol: str) -> PriceData:
+    time.sleep(LATENCY["stock"])
+    return _price()
+
+
+def _mf(code: str) -> PriceData:
+    time.sleep(LATENCY["mf"])
+    return _price()
+
+
+def _mf_bulk(codes: list[str]) -> dict[str, PriceData]:
+    # Stands in for the per-scheme requests running in parallel
+    time.sleep(LATENCY["mf"])
+    return {c: _price() for c in codes}
+
+
+def _metal(metal: str) -> PriceData:
+    time.sleep(LATENCY["metal"])
+    return _price()
+
+
+def _fx() -> None:
+    time.sleep(LATENCY["fx"])
+
+
+def _holdings() -> list[dict]:
+    stocks = [{"category": Category.US_STOCK, "symbol": f"S{i}"} for i in range(STOCKS)]
+    schemes = [{"category": Category.INDIAN_MF, "symbol": str(100000 + i)} for i in range(SCHEMES)]
+    return stocks + schemes + [{"category": Category.PRECIOUS_METAL, "symbol": "GOLD"}]
+
+
+def _sequential(holdings: list[dict]) -> None:
+    for h in holdings:
+        if h["category"] == Category.US_STOCK:
+            _stock(h["symbol"])
+        elif h["category"] == Category.INDIAN_MF:
+            _mf(h["symbol"])
+        else:
+            _metal(h["symbol"])
+    _fx()
+
+
+def main() -> None:
+    price_resolver.batch_fetch_prices = _stocks
+    price_resolver.refresh_mf_prices_bulk = _mf_bulk
+    price_resolver.get_metal_price_sgd_per_gram = _metal
+    price_resolver.get_fx_matrix = _fx
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.init_db()
+        holdings = _holdings()
+        for name, fn in (("sequential", _sequential), ("resolve_prices", price_resolver.resolve_prices)):
+            start = time.perf_counter()
+            fn(holdings)
+            print(f"{name:>15}  {len(holdings)} holdings  {time.perf_counter() - start:6.2f} s")
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
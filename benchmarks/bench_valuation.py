@@ -0,0 +1,102 @@
+"""Per-holding valuation loop vs. the columnar valuation engine, on synthetic lots.
+
+The loop mirrors the dashboard's former enrichment: scalar P&L, one
+convert_to_sgd() per lot and dict regrouping by symbol. The engine values
+every lot with column arithmetic and builds by-symbol and by-category
+aggregates, optionally converting invested amounts at buy-date rates from
+a seeded FX history. "end-to-end" is lots_frame() plus value_holdings()
+from the same dicts the loop gets, i.e. what the dashboard pays; the loop
+does less (no by-category aggregate, no buy-date FX), and at these sizes
+it is still the faster of the two. Best of 5 runs. No network: the FX
+matrix and history are pre-populated.
+
+Run from the project root:  python -m benchmarks.bench_valuation
+"""
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from db import database as db
+from db.models import PriceData
+from services import forex_data, fx_history
+from services.valuation import lots_frame, value_holdings
+from utils.constants import CATEGORY_CURRENCIES, Category
+
+SIZES = (1_000, 10_000)
+SYMBOLS = 500
+RATES = {"INR": 62.0, "USD": 0.74}
+
+_rng = np.random.default_rng(0)
+
+
+def _holdings(n: int) -> tuple[list[dict], list[PriceData]]:
+    kinds = [Category.INDIAN_STOCK, Category.SG_STOCK, Category.US_STOCK, Category.INDIAN_MF]
+    categories = [kinds[i] for i in _rng.integers(0, len(kinds), n)]
+    symbols = _rng.integers(0, SYMBOLS, n)
+    dates = pd.Timestamp("2020-01-01") + pd.to_timedelta(_rng.integers(0, 2000, n), unit="D")
+    holdings = [
+        {"id": i, "category": cat.value, "name": f"Holding {sym}", "symbol": f"{cat.value}-{sym}",
+         "quantity": float(_rng.integers(1, 100)), "buy_price": float(_rng.uniform(10, 500)),
+         "buy_date": d.strftime("%Y-%m-%d"), "currency": CATEGORY_CURRENCIES[cat]}
+        for i, (cat, sym, d) in enumerate(zip(categories, symbols, dates))
+    ]
+    prices = [PriceData(h["buy_price"] * _rng.uniform(0.7, 1.5), 0, 0, "UP") for h in holdings]
+    return holdings, prices
+
+
+def _seed_fx() -> None:
+    days = pd.bdate_range("2019-12-01", pd.Timestamp.today())
+    rows = [(c, d, rate * (1 + 0.05 * np.sin(i / 200)))
+            for c, rate in RATES.items() for i, d in enumerate(days.strftime("%Y-%m-%d"))]
+    db.upsert_fx_history(rows)
+    forex_data._matrix = forex_data.FxMatrix("SGD", RATES, time.monotonic() + 1e9)
+    fx_history._checked_at.update({c: time.monotonic() + 1e9 for c in RATES})
+
+
+def _loop(holdings: list[dict], prices: list[PriceData]) -> None:
+    grouped: dict[str, dict] = {}
+    for h, p in zip(holdings, prices):
+        invested = h["quantity"] * h["buy_price"]
+        value = h["quantity"] * p.current_price
+        pnl = value - invested
+        _ = (pnl / invested * 100) if invested else 0
+        value_sgd = forex_data.convert_to_sgd(value, h["currency"])
+        g = grouped.setdefault(h["symbol"], {"qty": 0.0, "invested": 0.0, "value_sgd": 0.0})
+        g["qty"] += h["quantity"]
+        g["invested"] += invested
+        g["value_sgd"] += value_sgd
+
+
+def _time(fn, *args, repeat: int = 5) -> float:
+    fn(*args)  # warm-up: FX lookups, caches
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = os.path.join(tmp, "bench.db")
+        db.init_db()
+        _seed_fx()
+        for n in SIZES:
+            holdings, prices = _holdings(n)
+            lots = lots_frame(holdings, prices)
+            print(f"{n:>6} lots   loop {_time(_loop, holdings, prices):6.1f} ms   "
+                  f"lots_frame {_time(lots_frame, holdings, prices):6.1f} ms   "
+                  f"value {_time(lambda: value_holdings(lots, fx_history=False)):6.1f} ms   "
+                  f"end-to-end {_time(lambda: value_holdings(lots_frame(holdings, prices), fx_history=False)):6.1f} ms   "
+                  f"end-to-end + buy-date FX {_time(lambda: value_holdings(lots_frame(holdings, prices))):6.1f} ms")
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -20,7 +20,9 @@ CATEGORY_LABELS = {
 }
 
 
+@st.fragment
 def render_insights_panel() -> None:
+    """Runs as a fragment: generating insights reruns only this panel."""
     config = AIConfig.from_env()
     if not config.is_configured:
         st.caption("AI insights unavailable — configure AI_API_KEY in .env")
@@ -3,17 +3,18 @@ from __future__ import annotations
 import streamlit as st
 import pandas as pd
 
-from db.models import EnrichedHolding
 from utils.constants import CURRENCY_SYMBOLS, CATEGORY_LABELS
 from components.trend_indicator import trend_arrow
+from utils.formatters import format_age
 
 
 def render_holdings_table(
-    enriched: list[EnrichedHolding],
+    by_symbol: pd.DataFrame,
     category: str,
     currency: str,
 ) -> None:
-    if not enriched:
+    """One row per symbol of ``category``, from Valuation.by_symbol."""
+    if by_symbol.empty:
         return
 
     sym = CURRENCY_SYMBOLS.get(currency, currency)
@@ -21,50 +22,25 @@ def render_holdings_table(
 
     st.subheader(label)
 
-    # Group holdings by symbol
-    grouped: dict[str, dict] = {}
-    for e in enriched:
-        sym_key = e.holding.symbol or ""
-        if sym_key not in grouped:
-            grouped[sym_key] = {
-                "name": e.holding.name or "",
-                "symbol": sym_key,
-                "total_qty": 0.0,
-                "total_invested": 0.0,
-                "current_price": e.current_price if e.current_price is not None else 0,
-                "trend": e.trend,
-                "ath": e.all_time_high if e.all_time_high else 0,
-                "atl": e.all_time_low if e.all_time_low else 0,
-            }
-        qty = e.holding.quantity if e.holding.quantity is not None else 0
-        grouped[sym_key]["total_qty"] += qty
-        grouped[sym_key]["total_invested"] += e.total_invested if e.total_invested is not None else 0
-
-    rows = []
-    for g in grouped.values():
-        total_qty = g["total_qty"]
-        total_invested = g["total_invested"]
-        avg_buy_price = (total_invested / total_qty) if total_qty else 0
-        current_value = total_qty * g["current_price"]
-        pnl = current_value - total_invested
-        pnl_pct = (pnl / total_invested * 100) if total_invested else 0
-
-        rows.append({
-            "Name": g["name"],
-            "Symbol": g["symbol"],
-            "Qty": total_qty,
-            "Avg Buy": avg_buy_price,
-            "Current": g["current_price"],
-            "Invested": total_invested,
-            "Value": current_value,
-            "P&L": pnl,
-            "P&L %": pnl_pct,
-            "Trend": trend_arrow(g["trend"]) if g["trend"] else "—",
-            "ATH": g["ath"],
-            "ATL": g["atl"],
-        })
-
-    df = pd.DataFrame(rows)
+    age = by_symbol["price_age_seconds"].astype(object).where(by_symbol["price_age_seconds"].notna(), None)
+    df = pd.DataFrame({
+        "Name": by_symbol["name"].fillna(""),
+        "Symbol": by_symbol["symbol"].fillna(""),
+        "Qty": by_symbol["quantity"],
+        "Avg Buy": by_symbol["avg_buy"],
+        "Current": by_symbol["current_price"],
+        "Invested": by_symbol["invested"],
+        "Value": by_symbol["value"],
+        "P&L": by_symbol["pnl"],
+        "P&L %": by_symbol["pnl_pct"],
+        "Trend": [trend_arrow(t) if t else "—" for t in by_symbol["trend"]],
+        "ATH": by_symbol["all_time_high"].fillna(0),
+        "ATL": by_symbol["all_time_low"].fillna(0),
+        "RSI": by_symbol["rsi"],
+        "Volatility": by_symbol["volatility"] * 100,
+        "Drawdown": by_symbol["drawdown"] * 100,
+        "Updated": [("⏳ " if stale else "") + format_age(a) for stale, a in zip(by_symbol["is_stale"], age)],
+    })
 
     col_config = {
         "Name": st.column_config.TextColumn("Name", width="medium"),
@@ -79,6 +55,11 @@ def render_holdings_table(
         "Trend": st.column_config.TextColumn("Trend", width="small"),
         "ATH": st.column_config.NumberColumn(f"ATH ({sym})", format="%.3f"),
         "ATL": st.column_config.NumberColumn(f"ATL ({sym})", format="%.3f"),
+        "RSI": st.column_config.NumberColumn("RSI", format="%.0f", help="14-day RSI; above 70 overbought, below 30 oversold"),
+        "Volatility": st.column_config.NumberColumn("Volatility", format="%.1f%%", help="Annualised, from the last 20 daily returns"),
+        "Drawdown": st.column_config.NumberColumn("Drawdown", format="%.1f%%", help="Below the highest close of the past year"),
+        "Updated": st.column_config.TextColumn("Updated", width="small",
+                                               help="Price age; ⏳ = stale, refreshing in background"),
     }
 
     st.dataframe(df, column_config=col_config, use_container_width=True, hide_index=True)
@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+import streamlit as st
+
+from services import negative_cache
+from services.throttle import CircuitBreaker, provider_status
+
+PROVIDER_LABELS = {
+    "yfinance": "Yahoo Finance",
+    "mfapi": "mfapi.in",
+    "frankfurter": "Frankfurter",
+    "amfi": "AMFI",
+}
+
+
+def render_provider_status(fetch_keys: dict[str, str]) -> None:
+    """Outage banners for data providers and a note on holdings whose fetches keep failing.
+
+    ``fetch_keys`` maps each holding's fetch key (e.g. "stock:AAPL") to the name shown.
+    """
+    for status in provider_status():
+        label = PROVIDER_LABELS.get(status["provider"], status["provider"])
+        if status["state"] == CircuitBreaker.OPEN:
+            st.warning(f"{label} is unavailable — showing last known prices. "
+                       f"Retrying in {int(status['retry_in'])}s.")
+        elif status["state"] == CircuitBreaker.HALF_OPEN:
+            st.info(f"{label} is recovering — checking with a single request.")
+
+    failing = negative_cache.suppressed(list(fetch_keys))
+    if failing:
+        names = ", ".join(sorted(fetch_keys[k] for k in failing))
+        st.caption(f"No price data for {names} — showing last known prices where available. "
+                   "Retrying automatically with back-off.")
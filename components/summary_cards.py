@@ -2,23 +2,35 @@ from __future__ import annotations
 
 import streamlit as st
 
-from db.models import EnrichedHolding
-from utils.constants import CATEGORY_LABELS, CURRENCY_SYMBOLS, Category
-from utils.formatters import format_currency, format_percentage
-
-
-def render_summary_cards(
-    enriched: list[EnrichedHolding],
-    category_totals: dict[str, dict],
-) -> None:
-    # Total portfolio in SGD
-    total_value_sgd = sum(e.current_value_sgd for e in enriched)
-    total_invested_sgd = sum(e.total_invested for e in enriched)  # rough — not converted, used for delta display
-
-    st.metric(
-        label="Total Portfolio Value (SGD)",
-        value=format_currency(total_value_sgd, "SGD"),
-    )
+from services.valuation import Valuation
+from utils.constants import CATEGORY_CURRENCIES, CATEGORY_LABELS, CURRENCY_SYMBOLS
+from utils.formatters import format_currency, format_percentage, format_pnl
+
+
+def render_summary_cards(valuation: Valuation) -> None:
+    totals = valuation.totals
+    base = valuation.base
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric(
+            label=f"Total Portfolio Value ({base})",
+            value=format_currency(totals["value_base"], base),
+        )
+    with col2:
+        st.metric(
+            label=f"Total P&L ({base})",
+            value=format_pnl(totals["pnl_base"], base),
+            delta=format_percentage(totals["pnl_pct"]),
+            help=f"Against {format_currency(totals['invested_base'], base)} invested, "
+                 "converted at each holding's buy-date exchange rate.",
+        )
+    with col3:
+        st.metric(
+            label=f"Currency Impact ({base})",
+            value=format_pnl(totals["fx_pnl_base"], base),
+            help="Part of the P&L due to exchange rates moving since each buy date.",
+        )
 
     st.markdown("---")
 
@@ -30,12 +42,11 @@ def render_summary_cards(
         cols = st.columns(len(row))
         for col, cat in zip(cols, row):
             with col:
-                info = category_totals.get(cat, {})
-                value = info.get("current_value", 0)
-                invested = info.get("total_invested", 0)
-                currency = info.get("currency", "SGD")
-                count = info.get("count", 0)
-                pnl_pct = ((value - invested) / invested * 100) if invested else 0
+                info = valuation.by_category.loc[cat] if cat in valuation.by_category.index else None
+                value = info["value"] if info is not None else 0
+                pnl_pct = info["pnl_pct"] if info is not None else 0
+                count = int(info["count"]) if info is not None else 0
+                currency = CATEGORY_CURRENCIES.get(cat, "SGD")
 
                 st.metric(
                     label=CATEGORY_LABELS[cat],
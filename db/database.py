@@ -1,20 +1,86 @@
 from __future__ import annotations
 
 import os
+import re
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from typing import Iterator
+
+from db.models import HoldingsDiff
 
 DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "portfolio.db")
 
+# Statements are reused across calls on the same thread's connection, so let
+# sqlite3 keep enough of them compiled to cover every helper in this module.
+STATEMENT_CACHE_SIZE = 256
+MMAP_SIZE_BYTES = 64 * 1024 * 1024
+CACHE_SIZE_KIB = 16 * 1024
 
-def get_connection() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
+_local = threading.local()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
     conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute(f"PRAGMA mmap_size={MMAP_SIZE_BYTES}")
+    conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KIB}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's persistent connection, opening it on first use.
+
+    Connections are never shared across threads, so callers must not close
+    the returned connection — use close_connection() instead.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != DB_PATH:
+        if conn is not None:
+            conn.close()
+        conn = _connect(DB_PATH)
+        _local.conn = conn
+        _local.path = DB_PATH
+        _local.depth = 0
     return conn
 
 
+def close_connection() -> None:
+    """Close the calling thread's pooled connection, if any."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+        _local.path = None
+        _local.depth = 0
+
+
+@contextmanager
+def transaction() -> Iterator[sqlite3.Connection]:
+    """Run the enclosed statements as one transaction on the pooled connection.
+
+    Nested blocks join the outermost transaction, which commits on clean exit
+    and rolls back if any exception escapes.
+    """
+    conn = get_connection()
+    _local.depth += 1
+    try:
+        yield conn
+    except BaseException:
+        _local.depth -= 1
+        if _local.depth == 0:
+            conn.rollback()
+        raise
+    _local.depth -= 1
+    if _local.depth == 0:
+        conn.commit()
+
+
 def init_db() -> None:
     conn = get_connection()
     conn.executescript("""
@@ -42,7 +108,36 @@ def init_db() -> None:
             all_time_low    REAL,
             trend           TEXT,
             currency        TEXT,
-            fetched_at      TEXT NOT NULL DEFAULT (datetime('now'))
+            fetched_at      TEXT NOT NULL DEFAULT (datetime('now')),
+            stats_at        TEXT,
+            trend_at        TEXT,
+            epoch           INTEGER NOT NULL DEFAULT 0
+        );
+
+        CREATE TABLE IF NOT EXISTS price_history (
+            symbol      TEXT NOT NULL,
+            date        TEXT NOT NULL,
+            open        REAL,
+            high        REAL,
+            low         REAL,
+            close       REAL NOT NULL,
+            volume      REAL,
+            PRIMARY KEY (symbol, date)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS price_stats (
+            symbol          TEXT PRIMARY KEY,
+            all_time_high   REAL,
+            all_time_low    REAL,
+            high_52w        REAL,
+            low_52w         REAL,
+            range_date      TEXT,
+            last_date       TEXT,
+            last_close      REAL,
+            trend           TEXT,
+            trend_at        TEXT,
+            updated_at      TEXT NOT NULL DEFAULT (datetime('now')),
+            epoch           INTEGER NOT NULL DEFAULT 0
         );
 
         CREATE TABLE IF NOT EXISTS forex_cache (
@@ -51,6 +146,44 @@ def init_db() -> None:
             fetched_at  TEXT NOT NULL DEFAULT (datetime('now'))
         );
 
+        CREATE TABLE IF NOT EXISTS fx_matrix_fetches (
+            base        TEXT PRIMARY KEY,
+            currencies  TEXT NOT NULL,
+            fetched_at  TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+
+        CREATE TABLE IF NOT EXISTS fx_history (
+            currency    TEXT NOT NULL,
+            date        TEXT NOT NULL,
+            rate        REAL NOT NULL,
+            PRIMARY KEY (currency, date)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS fx_history_requested (
+            currency    TEXT PRIMARY KEY,
+            since       TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS fetch_failures (
+            key         TEXT PRIMARY KEY,
+            failures    INTEGER NOT NULL DEFAULT 1,
+            last_error  TEXT,
+            failed_at   TEXT NOT NULL DEFAULT (datetime('now')),
+            retry_at    TEXT NOT NULL
+        );
+
+        CREATE TABLE IF NOT EXISTS mf_schemes (
+            scheme_code     TEXT PRIMARY KEY,
+            scheme_name     TEXT NOT NULL,
+            refreshed_at    TEXT NOT NULL DEFAULT (datetime('now'))
+        );
+
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name        TEXT PRIMARY KEY,
+            version     INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO data_versions (name) VALUES ('holdings'), ('prices'), ('history'), ('fx');
+
         CREATE TABLE IF NOT EXISTS ai_usage_log (
             id              INTEGER PRIMARY KEY AUTOINCREMENT,
             timestamp       TEXT NOT NULL DEFAULT (datetime('now')),
@@ -62,47 +195,111 @@ def init_db() -> None:
             feature         TEXT NOT NULL
         );
     """)
+    _add_missing_columns(conn, "price_cache", {
+        "stats_at": "TEXT", "trend_at": "TEXT", "epoch": "INTEGER NOT NULL DEFAULT 0",
+    })
+    _add_missing_columns(conn, "price_stats", {"epoch": "INTEGER NOT NULL DEFAULT 0"})
+    conn.executescript(_VERSION_TRIGGERS_SQL)
+    try:
+        # Trigram full-text index over scheme names (SQLite 3.34+ built with FTS5)
+        conn.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS mf_schemes_fts USING fts5(
+            scheme_name, content='mf_schemes', content_rowid='rowid', tokenize='trigram')""")
+    except sqlite3.OperationalError:
+        pass  # search_mf_schemes() falls back to LIKE
     conn.commit()
-    conn.close()
+
+
+# Every write to holdings bumps the "holdings" version. Every price_cache write
+# bumps the "prices" version and stamps the row with it as its epoch, so the
+# newest epoch among a set of symbols changes exactly when one of their prices does.
+# price_stats rows (rewritten whenever a symbol's history grows) get a "history"
+# epoch the same way; any write to forex_cache or fx_history bumps "fx".
+_VERSION_TRIGGERS_SQL = """
+    CREATE TRIGGER IF NOT EXISTS holdings_version_insert AFTER INSERT ON holdings BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'holdings';
+    END;
+    CREATE TRIGGER IF NOT EXISTS holdings_version_update AFTER UPDATE ON holdings BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'holdings';
+    END;
+    CREATE TRIGGER IF NOT EXISTS holdings_version_delete AFTER DELETE ON holdings BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'holdings';
+    END;
+    CREATE TRIGGER IF NOT EXISTS price_epoch_insert AFTER INSERT ON price_cache BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'prices';
+        UPDATE price_cache SET epoch = (SELECT version FROM data_versions WHERE name = 'prices')
+            WHERE symbol = NEW.symbol;
+    END;
+    CREATE TRIGGER IF NOT EXISTS price_epoch_update
+        AFTER UPDATE OF current_price, all_time_high, all_time_low, trend ON price_cache BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'prices';
+        UPDATE price_cache SET epoch = (SELECT version FROM data_versions WHERE name = 'prices')
+            WHERE symbol = NEW.symbol;
+    END;
+    CREATE TRIGGER IF NOT EXISTS history_epoch_insert AFTER INSERT ON price_stats BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'history';
+        UPDATE price_stats SET epoch = (SELECT version FROM data_versions WHERE name = 'history')
+            WHERE symbol = NEW.symbol;
+    END;
+    CREATE TRIGGER IF NOT EXISTS history_epoch_update
+        AFTER UPDATE OF all_time_high, all_time_low, high_52w, low_52w, last_date, last_close
+        ON price_stats BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'history';
+        UPDATE price_stats SET epoch = (SELECT version FROM data_versions WHERE name = 'history')
+            WHERE symbol = NEW.symbol;
+    END;
+    CREATE TRIGGER IF NOT EXISTS fx_version_forex_insert AFTER INSERT ON forex_cache BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'fx';
+    END;
+    CREATE TRIGGER IF NOT EXISTS fx_version_forex_update AFTER UPDATE ON forex_cache BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'fx';
+    END;
+    CREATE TRIGGER IF NOT EXISTS fx_version_history_insert AFTER INSERT ON fx_history BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'fx';
+    END;
+    CREATE TRIGGER IF NOT EXISTS fx_version_history_update AFTER UPDATE ON fx_history BEGIN
+        UPDATE data_versions SET version = version + 1 WHERE name = 'fx';
+    END;
+"""
+
+
+def _add_missing_columns(conn: sqlite3.Connection, table: str, columns: dict[str, str]) -> None:
+    """Bring tables created by older versions up to date (CREATE IF NOT EXISTS skips them)."""
+    existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
 
 
 # --------------- Holdings CRUD ---------------
 
-def add_holding(data: dict) -> int:
-    conn = get_connection()
-    cursor = conn.execute(
-        """INSERT INTO holdings (category, name, symbol, quantity, buy_price,
+_INSERT_HOLDING_SQL = """INSERT INTO holdings (category, name, symbol, quantity, buy_price,
            buy_date, currency, broker, notes)
            VALUES (:category, :name, :symbol, :quantity, :buy_price,
-           :buy_date, :currency, :broker, :notes)""",
-        data,
-    )
-    conn.commit()
-    row_id = cursor.lastrowid
-    conn.close()
-    return row_id
+           :buy_date, :currency, :broker, :notes)"""
+
+
+def add_holding(data: dict) -> int:
+    with transaction() as conn:
+        cursor = conn.execute(_INSERT_HOLDING_SQL, data)
+    return cursor.lastrowid
 
 
 def update_holding(holding_id: int, data: dict) -> None:
-    conn = get_connection()
     data["id"] = holding_id
     data["updated_at"] = datetime.utcnow().isoformat()
-    conn.execute(
-        """UPDATE holdings SET name=:name, symbol=:symbol, quantity=:quantity,
-           buy_price=:buy_price, buy_date=:buy_date, currency=:currency,
-           broker=:broker, notes=:notes, updated_at=:updated_at
-           WHERE id=:id""",
-        data,
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(
+            """UPDATE holdings SET name=:name, symbol=:symbol, quantity=:quantity,
+               buy_price=:buy_price, buy_date=:buy_date, currency=:currency,
+               broker=:broker, notes=:notes, updated_at=:updated_at
+               WHERE id=:id""",
+            data,
+        )
 
 
 def delete_holding(holding_id: int) -> None:
-    conn = get_connection()
-    conn.execute("DELETE FROM holdings WHERE id=?", (holding_id,))
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute("DELETE FROM holdings WHERE id=?", (holding_id,))
 
 
 def get_holdings(category: str | None = None) -> list[dict]:
@@ -113,109 +310,704 @@ def get_holdings(category: str | None = None) -> list[dict]:
         ).fetchall()
     else:
         rows = conn.execute("SELECT * FROM holdings ORDER BY category, name").fetchall()
-    conn.close()
     return [dict(r) for r in rows]
 
 
 def get_holding_by_id(holding_id: int) -> dict | None:
     conn = get_connection()
     row = conn.execute("SELECT * FROM holdings WHERE id=?", (holding_id,)).fetchone()
-    conn.close()
     return dict(row) if row else None
 
 
 # --------------- Price Cache ---------------
 
+# Merge-upsert: fields the writer leaves out (or sets to None) keep their
+# cached values, and each group of fields carries its own write timestamp:
+# fetched_at for the price, stats_at for ATH/ATL, trend_at for the trend.
+_UPSERT_PRICE_SQL = """INSERT INTO price_cache
+               (symbol, current_price, all_time_high, all_time_low, trend, currency,
+                fetched_at, stats_at, trend_at)
+               VALUES (:symbol, :current_price, :all_time_high, :all_time_low, :trend, :currency,
+                       datetime('now'),
+                       CASE WHEN COALESCE(:all_time_high, :all_time_low) IS NOT NULL THEN datetime('now') END,
+                       CASE WHEN :trend IS NOT NULL THEN datetime('now') END)
+               ON CONFLICT(symbol) DO UPDATE SET
+                   current_price = COALESCE(excluded.current_price, current_price),
+                   all_time_high = COALESCE(excluded.all_time_high, all_time_high),
+                   all_time_low = COALESCE(excluded.all_time_low, all_time_low),
+                   trend = COALESCE(excluded.trend, trend),
+                   currency = COALESCE(excluded.currency, currency),
+                   fetched_at = CASE WHEN excluded.current_price IS NOT NULL
+                                     THEN excluded.fetched_at ELSE fetched_at END,
+                   stats_at = COALESCE(excluded.stats_at, stats_at),
+                   trend_at = COALESCE(excluded.trend_at, trend_at)"""
+
+_PRICE_CACHE_FIELDS = ("current_price", "all_time_high", "all_time_low", "trend", "currency")
+
+
+def _price_cache_params(symbol: str, data: dict) -> dict:
+    return {"symbol": symbol, **{f: data.get(f) for f in _PRICE_CACHE_FIELDS}}
+
+
 def upsert_price_cache(symbol: str, data: dict) -> None:
-    conn = get_connection()
-    conn.execute(
-        """INSERT OR REPLACE INTO price_cache
-           (symbol, current_price, all_time_high, all_time_low, trend, currency, fetched_at)
-           VALUES (?, ?, ?, ?, ?, ?, datetime('now'))""",
-        (symbol, data.get("current_price"), data.get("all_time_high"),
-         data.get("all_time_low"), data.get("trend"), data.get("currency")),
-    )
-    conn.commit()
-    conn.close()
+    """Merge the known fields of ``data`` into the cached row for ``symbol``."""
+    with transaction() as conn:
+        conn.execute(_UPSERT_PRICE_SQL, _price_cache_params(symbol, data))
+
+
+def bulk_upsert_price_cache(rows: list[dict]) -> int:
+    """Merge many price_cache rows (each with a "symbol" key) in one transaction.
 
+    Returns number of rows written.
+    """
+    if not rows:
+        return 0
+    with transaction() as conn:
+        conn.executemany(_UPSERT_PRICE_SQL, [_price_cache_params(r["symbol"], r) for r in rows])
+    return len(rows)
 
-def get_cached_price(symbol: str, ttl_minutes: int = 15) -> dict | None:
+
+def get_cached_price(symbol: str, ttl_minutes: int = 15, allow_stale: bool = False) -> dict | None:
+    """Cached row for ``symbol``, or None if missing or older than ``ttl_minutes``.
+
+    With ``allow_stale`` an expired row is still returned; like every row it
+    carries ``age_seconds`` and ``is_stale`` so the caller can revalidate, and
+    ``stats_age_seconds`` / ``trend_age_seconds`` (None if never written).
+    """
     conn = get_connection()
     row = conn.execute("SELECT * FROM price_cache WHERE symbol=?", (symbol,)).fetchone()
-    conn.close()
     if not row:
         return None
-    fetched_at = datetime.fromisoformat(row["fetched_at"])
-    if datetime.utcnow() - fetched_at > timedelta(minutes=ttl_minutes):
+    now = datetime.utcnow()
+    age = now - datetime.fromisoformat(row["fetched_at"])
+    is_stale = age > timedelta(minutes=ttl_minutes)
+    if is_stale and not allow_stale:
         return None
-    return dict(row)
+    ages = {
+        f"{field}_age_seconds": (now - datetime.fromisoformat(row[f"{field}_at"])).total_seconds()
+        if row[f"{field}_at"] else None
+        for field in ("stats", "trend")
+    }
+    return {**dict(row), "age_seconds": age.total_seconds(), "is_stale": is_stale, **ages}
+
+
+# Above this many symbols, get_cached_prices() joins against a temp table
+# instead of binding one parameter per symbol.
+MAX_IN_CLAUSE_SYMBOLS = 500
+
+
+def get_cached_prices(symbols: list[str], ttl_minutes: int = 15) -> dict[str, dict]:
+    """Fetch cache rows for many symbols in a single query.
+
+    Every cached symbol is returned, keyed by symbol, with extra fields
+    ``age_seconds`` and ``is_stale`` (older than ``ttl_minutes``) for the
+    price, and ``stats_age_seconds`` / ``trend_age_seconds`` for ATH/ATL and
+    the trend (None if never written). Writers that only know the price
+    advance ``fetched_at`` alone. Symbols that were never cached are absent
+    from the result.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+
+    columns = """p.*,
+        (julianday('now') - julianday(p.fetched_at)) * 86400.0 AS age_seconds,
+        (julianday('now') - julianday(p.stats_at)) * 86400.0 AS stats_age_seconds,
+        (julianday('now') - julianday(p.trend_at)) * 86400.0 AS trend_age_seconds,
+        p.fetched_at < datetime('now', ?) AS is_stale"""
+    ttl_arg = f"-{int(ttl_minutes)} minutes"
+
+    conn = get_connection()
+    if len(symbols) <= MAX_IN_CLAUSE_SYMBOLS:
+        placeholders = ",".join("?" * len(symbols))
+        rows = conn.execute(
+            f"SELECT {columns} FROM price_cache p WHERE p.symbol IN ({placeholders})",
+            (ttl_arg, *symbols),
+        ).fetchall()
+    else:
+        with transaction():
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS _symbol_batch (symbol TEXT PRIMARY KEY)")
+            conn.execute("DELETE FROM _symbol_batch")
+            conn.executemany("INSERT INTO _symbol_batch (symbol) VALUES (?)", ((s,) for s in symbols))
+            rows = conn.execute(
+                f"SELECT {columns} FROM price_cache p JOIN _symbol_batch b ON b.symbol = p.symbol",
+                (ttl_arg,),
+            ).fetchall()
+            conn.execute("DELETE FROM _symbol_batch")
+
+    result = {}
+    for row in rows:
+        entry = dict(row)
+        entry["is_stale"] = bool(entry["is_stale"])
+        result[entry["symbol"]] = entry
+    return result
+
+
+# --------------- Price History ---------------
+
+def get_last_history_date(symbol: str) -> str | None:
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT MAX(date) AS last_date FROM price_history WHERE symbol=?", (symbol,)
+    ).fetchone()
+    return row["last_date"]
+
+
+def get_last_history_dates(symbols: list[str]) -> dict[str, str]:
+    """Last stored bar date per symbol; symbols with no history are absent."""
+    symbols = list(dict.fromkeys(symbols))
+    conn = get_connection()
+    result = {}
+    for i in range(0, len(symbols), MAX_IN_CLAUSE_SYMBOLS):
+        chunk = symbols[i:i + MAX_IN_CLAUSE_SYMBOLS]
+        rows = conn.execute(
+            f"""SELECT symbol, MAX(date) AS last_date FROM price_history
+                WHERE symbol IN ({",".join("?" * len(chunk))}) GROUP BY symbol""",
+            chunk,
+        ).fetchall()
+        result.update({r["symbol"]: r["last_date"] for r in rows})
+    return result
+
+
+def upsert_price_history(symbol: str, bars: list[dict]) -> int:
+    """Store daily bars (date, open, high, low, close, volume) for a symbol.
+
+    Existing dates are overwritten and the symbol's price_stats are updated
+    from the new bars. Returns number of bars written.
+    """
+    if not bars:
+        return 0
+    with transaction() as conn:
+        conn.executemany(
+            """INSERT OR REPLACE INTO price_history (symbol, date, open, high, low, close, volume)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            [(symbol, b["date"], b.get("open"), b.get("high"), b.get("low"), b["close"], b.get("volume"))
+             for b in bars],
+        )
+        _update_price_stats(conn, symbol, bars)
+    return len(bars)
+
+
+def delete_price_history(symbol: str) -> None:
+    with transaction() as conn:
+        conn.execute("DELETE FROM price_history WHERE symbol=?", (symbol,))
+        conn.execute("DELETE FROM price_stats WHERE symbol=?", (symbol,))
+
+
+def replace_price_history(symbol: str, bars: list[dict]) -> int:
+    """Swap the whole stored history (and price_stats) for ``symbol`` for ``bars`` in one
+    transaction. With no bars nothing is touched. Returns number of bars written."""
+    if not bars:
+        return 0
+    with transaction():
+        delete_price_history(symbol)
+        return upsert_price_history(symbol, bars)
+
+
+def get_price_history(symbol: str, since: str | None = None) -> list[dict]:
+    """Daily bars for a symbol in date order, optionally from ``since`` (YYYY-MM-DD)."""
+    conn = get_connection()
+    rows = conn.execute(
+        """SELECT date, open, high, low, close, volume FROM price_history
+           WHERE symbol=? AND date >= ? ORDER BY date""",
+        (symbol, since or ""),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_closes_bulk(symbols: list[str], since: str | None = None) -> list[dict]:
+    """``symbol, date, close`` rows for many symbols, ordered by symbol then date."""
+    symbols = list(dict.fromkeys(symbols))
+    conn = get_connection()
+    result = []
+    for i in range(0, len(symbols), MAX_IN_CLAUSE_SYMBOLS):
+        chunk = symbols[i:i + MAX_IN_CLAUSE_SYMBOLS]
+        rows = conn.execute(
+            f"""SELECT symbol, date, close FROM price_history
+                WHERE symbol IN ({",".join("?" * len(chunk))}) AND date >= ? ORDER BY symbol, date""",
+            (*chunk, since or ""),
+        ).fetchall()
+        result.extend(dict(r) for r in rows)
+    return result
+
+
+# --------------- Price Stats ---------------
+# Slow-moving statistics kept apart from price_cache. All-time extremes are
+# folded in from each batch of new bars; the 52-week range is re-derived from
+# its window once a day, and the trend expires after a new bar or on the
+# caller's TTL. Only a symbol seen for the first time scans its full history.
+
+_REBUILD_STATS_SQL = """INSERT OR REPLACE INTO price_stats
+           (symbol, all_time_high, all_time_low, high_52w, low_52w, range_date,
+            last_date, last_close, trend, trend_at, updated_at)
+           SELECT :symbol,
+                  MAX(COALESCE(high, close)),
+                  MIN(COALESCE(low, close)),
+                  MAX(CASE WHEN date >= date('now', '-365 days') THEN COALESCE(high, close) END),
+                  MIN(CASE WHEN date >= date('now', '-365 days') THEN COALESCE(low, close) END),
+                  date('now'),
+                  MAX(date),
+                  (SELECT close FROM price_history WHERE symbol=:symbol ORDER BY date DESC LIMIT 1),
+                  NULL, NULL, datetime('now')
+           FROM price_history WHERE symbol=:symbol
+           HAVING COUNT(*) > 0"""
+
+_REFRESH_RANGE_SQL = """UPDATE price_stats SET
+           high_52w = (SELECT MAX(COALESCE(high, close)) FROM price_history
+                       WHERE symbol=:symbol AND date >= date('now', '-365 days')),
+           low_52w = (SELECT MIN(COALESCE(low, close)) FROM price_history
+                      WHERE symbol=:symbol AND date >= date('now', '-365 days')),
+           range_date = date('now')
+           WHERE symbol=:symbol"""
+
+# SET expressions all see the row as it was before the update
+_FOLD_BARS_SQL = """UPDATE price_stats SET
+           all_time_high = MAX(COALESCE(all_time_high, :high), :high),
+           all_time_low = MIN(COALESCE(all_time_low, :low), :low),
+           high_52w = MAX(COALESCE(high_52w, :high), :high),
+           low_52w = MIN(COALESCE(low_52w, :low), :low),
+           last_close = CASE WHEN :last_date >= last_date THEN :last_close ELSE last_close END,
+           trend = CASE WHEN :last_date > last_date THEN NULL ELSE trend END,
+           last_date = MAX(last_date, :last_date),
+           updated_at = datetime('now')
+           WHERE symbol=:symbol"""
+
+_STATS_COLUMNS = """*, (julianday('now') - julianday(trend_at)) * 86400.0 AS trend_age_seconds,
+           range_date < date('now') AS range_outdated"""
+
+
+def _update_price_stats(conn: sqlite3.Connection, symbol: str, bars: list[dict]) -> None:
+    last = max(bars, key=lambda b: b["date"])
+    params = {
+        "symbol": symbol,
+        "high": max(b.get("high") or b["close"] for b in bars),
+        "low": min(b.get("low") or b["close"] for b in bars),
+        "last_date": last["date"],
+        "last_close": last["close"],
+    }
+    if conn.execute(_FOLD_BARS_SQL, params).rowcount == 0:
+        # First sight of this symbol (or history was just re-backfilled)
+        conn.execute(_REBUILD_STATS_SQL, {"symbol": symbol})
+
+
+def _load_price_stats(conn: sqlite3.Connection, symbols: list[str]) -> dict[str, dict]:
+    rows = conn.execute(
+        f"SELECT {_STATS_COLUMNS} FROM price_stats WHERE symbol IN ({','.join('?' * len(symbols))})",
+        symbols,
+    ).fetchall()
+    return {r["symbol"]: dict(r) for r in rows}
+
+
+def get_history_stats_bulk(symbols: list[str]) -> dict[str, dict]:
+    """Cached statistics for many symbols; symbols with no stored history are absent.
+
+    Each row has all_time_high/low, high/low_52w, last_date, last_close,
+    trend (None once expired by a new bar) and trend_age_seconds.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    conn = get_connection()
+    result = {}
+    for i in range(0, len(symbols), MAX_IN_CLAUSE_SYMBOLS):
+        chunk = symbols[i:i + MAX_IN_CLAUSE_SYMBOLS]
+        stats = _load_price_stats(conn, chunk)
+        missing = [s for s in chunk if s not in stats]
+        if missing:
+            # Only symbols with stored bars have stats to rebuild; the rest stay a read
+            missing = list(get_last_history_dates(missing))
+        outdated = [s for s, row in stats.items() if row["range_outdated"]]
+        if missing or outdated:
+            # Histories stored before price_stats existed, and 52-week windows that moved on
+            with transaction():
+                for symbol in missing:
+                    conn.execute(_REBUILD_STATS_SQL, {"symbol": symbol})
+                for symbol in outdated:
+                    conn.execute(_REFRESH_RANGE_SQL, {"symbol": symbol})
+            stats.update(_load_price_stats(conn, missing + outdated))
+        result.update(stats)
+    return result
+
+
+def get_history_stats(symbol: str) -> dict | None:
+    """All-time and 52-week high/low, latest close and cached trend for ``symbol``."""
+    return get_history_stats_bulk([symbol]).get(symbol)
+
+
+def set_price_trends(trends: dict[str, str]) -> None:
+    """Cache freshly computed trends (symbol -> UP/DOWN/SIDEWAYS)."""
+    if not trends:
+        return
+    with transaction() as conn:
+        conn.executemany(
+            "UPDATE price_stats SET trend=?, trend_at=datetime('now') WHERE symbol=?",
+            [(trend, symbol) for symbol, trend in trends.items()],
+        )
 
 
 # --------------- Forex Cache ---------------
 
+_UPSERT_FOREX_SQL = """INSERT OR REPLACE INTO forex_cache (pair, rate, fetched_at)
+               VALUES (?, ?, datetime('now'))"""
+
+
 def upsert_forex_cache(pair: str, rate: float) -> None:
-    conn = get_connection()
-    conn.execute(
-        """INSERT OR REPLACE INTO forex_cache (pair, rate, fetched_at)
-           VALUES (?, ?, datetime('now'))""",
-        (pair, rate),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(_UPSERT_FOREX_SQL, (pair, rate))
+
+
+def bulk_upsert_forex_cache(rates: dict[str, float]) -> None:
+    """Cache many pairs (e.g. "INRSGD" -> 0.0155) in one transaction."""
+    if not rates:
+        return
+    with transaction() as conn:
+        conn.executemany(_UPSERT_FOREX_SQL, list(rates.items()))
 
 
-def get_cached_forex(pair: str, ttl_minutes: int = 60) -> float | None:
+def get_cached_forex(pair: str, ttl_minutes: int = 60, allow_stale: bool = False) -> float | None:
     conn = get_connection()
     row = conn.execute("SELECT * FROM forex_cache WHERE pair=?", (pair,)).fetchone()
-    conn.close()
     if not row:
         return None
     fetched_at = datetime.fromisoformat(row["fetched_at"])
-    if datetime.utcnow() - fetched_at > timedelta(minutes=ttl_minutes):
+    if datetime.utcnow() - fetched_at > timedelta(minutes=ttl_minutes) and not allow_stale:
         return None
     return row["rate"]
 
 
+def get_all_cached_forex() -> dict[str, float]:
+    """Every cached pair's last known rate, however old."""
+    conn = get_connection()
+    return {row["pair"]: row["rate"] for row in conn.execute("SELECT pair, rate FROM forex_cache")}
+
+
+def store_fx_matrix(base: str, rates: dict[str, float]) -> None:
+    """Cache a full matrix fetch in one transaction: its ``<CCY><base>`` pairs
+    (as bulk_upsert_forex_cache) and the currencies it covered."""
+    with transaction() as conn:
+        bulk_upsert_forex_cache(rates)
+        conn.execute(
+            "INSERT OR REPLACE INTO fx_matrix_fetches (base, currencies, fetched_at) VALUES (?, ?, datetime('now'))",
+            (base, ",".join(sorted(pair[:-len(base)] for pair in rates))),
+        )
+
+
+def get_fx_matrix_fetch(base: str) -> dict | None:
+    """Last full matrix fetch against ``base``: its ``currencies`` and ``age_seconds``."""
+    conn = get_connection()
+    row = conn.execute(
+        """SELECT currencies, (julianday('now') - julianday(fetched_at)) * 86400.0 AS age_seconds
+           FROM fx_matrix_fetches WHERE base=?""",
+        (base,),
+    ).fetchone()
+    if not row:
+        return None
+    return {"currencies": row["currencies"].split(",") if row["currencies"] else [], "age_seconds": row["age_seconds"]}
+
+
+# --------------- FX History ---------------
+# Daily rates quoted like the FX matrix: units of ``currency`` per 1 unit of the base.
+
+def upsert_fx_history(rows: list[tuple[str, str, float]]) -> int:
+    """Store ``(currency, date, rate)`` rows; existing dates are overwritten."""
+    if not rows:
+        return 0
+    with transaction() as conn:
+        conn.executemany("INSERT OR REPLACE INTO fx_history (currency, date, rate) VALUES (?, ?, ?)", rows)
+    return len(rows)
+
+
+def mark_fx_history_requested(currencies: list[str], since: str) -> None:
+    """Record that history from ``since`` was requested for ``currencies``, so
+    days before their first fixing (weekends, holidays) are not asked for again."""
+    with transaction() as conn:
+        conn.executemany(
+            """INSERT INTO fx_history_requested (currency, since) VALUES (?, ?)
+               ON CONFLICT(currency) DO UPDATE SET since = MIN(since, excluded.since)""",
+            [(c, since) for c in dict.fromkeys(currencies)],
+        )
+
+
+def get_fx_history_bounds(currencies: list[str]) -> dict[str, tuple[str, str]]:
+    """First and last date covered per currency: the first is the earlier of the
+    first stored rate and the earliest date requested. Currencies with no
+    history are absent."""
+    currencies = list(dict.fromkeys(currencies))
+    if not currencies:
+        return {}
+    conn = get_connection()
+    rows = conn.execute(
+        f"""SELECT h.currency, MIN(MIN(h.date), COALESCE(r.since, MIN(h.date))) AS first_date,
+                   MAX(h.date) AS last_date
+            FROM fx_history h LEFT JOIN fx_history_requested r ON r.currency = h.currency
+            WHERE h.currency IN ({",".join("?" * len(currencies))}) GROUP BY h.currency""",
+        currencies,
+    ).fetchall()
+    return {r["currency"]: (r["first_date"], r["last_date"]) for r in rows}
+
+
+def get_fx_history(currencies: list[str], since: str | None = None) -> list[dict]:
+    """Stored rates for ``currencies`` in date order, optionally from ``since``."""
+    currencies = list(dict.fromkeys(currencies))
+    if not currencies:
+        return []
+    conn = get_connection()
+    rows = conn.execute(
+        f"""SELECT currency, date, rate FROM fx_history
+            WHERE currency IN ({",".join("?" * len(currencies))}) AND date >= ? ORDER BY date""",
+        (*currencies, since or ""),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+# --------------- Fetch Failures ---------------
+
+# Consecutive failures double the wait: base, 2*base, 4*base ... capped at max
+_RECORD_FAILURE_SQL = """INSERT INTO fetch_failures (key, failures, last_error, failed_at, retry_at)
+               VALUES (:key, 1, :error, datetime('now'), datetime('now', '+' || :base || ' seconds'))
+               ON CONFLICT(key) DO UPDATE SET
+                   failures = failures + 1,
+                   last_error = excluded.last_error,
+                   failed_at = excluded.failed_at,
+                   retry_at = datetime('now', '+' || MIN(:max, :base * (1 << MIN(failures, 20))) || ' seconds')"""
+
+
+def record_fetch_failures(keys: list[str], error: str, base_seconds: int, max_seconds: int) -> None:
+    """Count another failed fetch for each key and push its next retry out exponentially."""
+    if not keys:
+        return
+    with transaction() as conn:
+        conn.executemany(_RECORD_FAILURE_SQL, [
+            {"key": k, "error": error, "base": int(base_seconds), "max": int(max_seconds)} for k in keys
+        ])
+
+
+def clear_fetch_failures(keys: list[str]) -> None:
+    if not keys:
+        return
+    with transaction() as conn:
+        conn.executemany("DELETE FROM fetch_failures WHERE key=?", [(k,) for k in keys])
+
+
+def get_fetch_failures(keys: list[str]) -> dict[str, dict]:
+    """Failure rows for ``keys``, each with ``is_suppressed`` (still backing off)
+    and ``retry_in_seconds``. Keys without recorded failures are absent."""
+    keys = list(dict.fromkeys(keys))
+    conn = get_connection()
+    result = {}
+    for i in range(0, len(keys), MAX_IN_CLAUSE_SYMBOLS):
+        batch = keys[i:i + MAX_IN_CLAUSE_SYMBOLS]
+        rows = conn.execute(
+            f"""SELECT *, retry_at > datetime('now') AS is_suppressed,
+                       (julianday(retry_at) - julianday('now')) * 86400.0 AS retry_in_seconds
+                FROM fetch_failures WHERE key IN ({",".join("?" * len(batch))})""",
+            batch,
+        ).fetchall()
+        for row in rows:
+            entry = dict(row)
+            entry["is_suppressed"] = bool(entry["is_suppressed"])
+            result[entry["key"]] = entry
+    return result
+
+
+# --------------- MF Scheme Index ---------------
+
+def _has_scheme_fts(conn: sqlite3.Connection) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='mf_schemes_fts'"
+    ).fetchone() is not None
+
+
+def replace_mf_schemes(schemes: list[tuple[str, str]]) -> int:
+    """Replace the scheme master list with ``(scheme_code, scheme_name)`` pairs and reindex it."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM mf_schemes")
+        conn.executemany("INSERT OR REPLACE INTO mf_schemes (scheme_code, scheme_name) VALUES (?, ?)", schemes)
+        if _has_scheme_fts(conn):
+            conn.execute("INSERT INTO mf_schemes_fts (mf_schemes_fts) VALUES ('rebuild')")
+    return len(schemes)
+
+
+def get_mf_schemes_age() -> float | None:
+    """Seconds since the scheme list was last refreshed, or None if it is empty."""
+    conn = get_connection()
+    row = conn.execute(
+        "SELECT (julianday('now') - julianday(MAX(refreshed_at))) * 86400.0 AS age FROM mf_schemes"
+    ).fetchone()
+    return row["age"]
+
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def search_mf_schemes(query: str, limit: int = 10) -> list[dict]:
+    """Rank schemes against ``query`` using the local trigram index.
+
+    Names containing every word of the query come first (bm25 order). If
+    that leaves room, names sharing the most trigrams with the query follow,
+    which tolerates typos like "parik flexy". Words shorter than 3 letters
+    are ignored.
+    """
+    words = [w for w in re.findall(r"\w+", query.lower()) if len(w) >= 3]
+    if not words:
+        return []
+
+    conn = get_connection()
+    if not _has_scheme_fts(conn):
+        where = " AND ".join("scheme_name LIKE ?" for _ in words)
+        rows = conn.execute(
+            f"SELECT scheme_code, scheme_name FROM mf_schemes WHERE {where} ORDER BY length(scheme_name) LIMIT ?",
+            (*[f"%{w}%" for w in words], limit),
+        ).fetchall()
+        return [dict(r) for r in rows]
+
+    sql = """SELECT s.scheme_code, s.scheme_name FROM mf_schemes_fts f
+             JOIN mf_schemes s ON s.rowid = f.rowid
+             WHERE mf_schemes_fts MATCH ? ORDER BY bm25(mf_schemes_fts) LIMIT ?"""
+    rows = conn.execute(sql, (" AND ".join(_fts_phrase(w) for w in words), limit)).fetchall()
+    if len(rows) < limit:
+        trigrams = sorted({w[i:i + 3] for w in words for i in range(len(w) - 2)})
+        seen = {r["scheme_code"] for r in rows}
+        fuzzy = conn.execute(sql, (" OR ".join(_fts_phrase(t) for t in trigrams), limit * 2)).fetchall()
+        rows += [r for r in fuzzy if r["scheme_code"] not in seen][:limit - len(rows)]
+    return [dict(r) for r in rows]
+
+
+# --------------- Data Versions ---------------
+
+def get_data_version(name: str) -> int:
+    """Counter bumped on every write to the data ``name`` covers ("holdings", "prices",
+    "history" or "fx")."""
+    conn = get_connection()
+    row = conn.execute("SELECT version FROM data_versions WHERE name=?", (name,)).fetchone()
+    return row["version"] if row else 0
+
+
+def _max_epoch(table: str, symbols: list[str]) -> int:
+    symbols = list(dict.fromkeys(symbols))
+    conn = get_connection()
+    epoch = 0
+    for i in range(0, len(symbols), MAX_IN_CLAUSE_SYMBOLS):
+        chunk = symbols[i:i + MAX_IN_CLAUSE_SYMBOLS]
+        row = conn.execute(
+            f"SELECT MAX(epoch) AS epoch FROM {table} WHERE symbol IN ({','.join('?' * len(chunk))})",
+            chunk,
+        ).fetchone()
+        epoch = max(epoch, row["epoch"] or 0)
+    return epoch
+
+
+def get_price_epoch(symbols: list[str]) -> int:
+    """Newest price_cache epoch among ``symbols``; changes whenever one of their prices is written."""
+    return _max_epoch("price_cache", symbols)
+
+
+def get_history_epoch(symbols: list[str]) -> int:
+    """Newest price_stats epoch among ``symbols``; changes whenever one of their histories grows."""
+    return _max_epoch("price_stats", symbols)
+
+
 # --------------- AI Usage Log ---------------
 
 def log_ai_usage(provider: str, model: str, input_tokens: int,
                  output_tokens: int, cost_usd: float, feature: str) -> None:
-    conn = get_connection()
-    conn.execute(
-        """INSERT INTO ai_usage_log (provider, model, input_tokens, output_tokens, cost_usd, feature)
-           VALUES (?, ?, ?, ?, ?, ?)""",
-        (provider, model, input_tokens, output_tokens, cost_usd, feature),
-    )
-    conn.commit()
-    conn.close()
+    with transaction() as conn:
+        conn.execute(
+            """INSERT INTO ai_usage_log (provider, model, input_tokens, output_tokens, cost_usd, feature)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (provider, model, input_tokens, output_tokens, cost_usd, feature),
+        )
 
 
 def delete_all_holdings() -> int:
     """Delete all holdings. Returns number of rows deleted."""
-    conn = get_connection()
-    cursor = conn.execute("DELETE FROM holdings")
-    count = cursor.rowcount
-    conn.commit()
-    conn.close()
-    return count
+    with transaction() as conn:
+        cursor = conn.execute("DELETE FROM holdings")
+    return cursor.rowcount
 
 
 def bulk_insert_holdings(rows: list[dict]) -> int:
     """Insert multiple holdings at once. Returns number inserted."""
-    conn = get_connection()
-    count = 0
+    with transaction() as conn:
+        conn.executemany(_INSERT_HOLDING_SQL, rows)
+    return len(rows)
+
+
+def replace_all_holdings(rows: list[dict]) -> tuple[int, int]:
+    """Atomically swap the whole portfolio for ``rows``.
+
+    Returns (deleted, inserted). Either both steps land or neither does.
+    """
+    with transaction() as conn:
+        deleted = conn.execute("DELETE FROM holdings").rowcount
+        conn.executemany(_INSERT_HOLDING_SQL, rows)
+    return deleted, len(rows)
+
+
+# Columns that identify a lot across exports; the rest are compared for changes.
+HOLDING_KEY_FIELDS = ("category", "symbol", "buy_date", "broker")
+HOLDING_VALUE_FIELDS = ("name", "quantity", "buy_price", "currency", "notes")
+
+
+def _normalize_holding_value(value):
+    if value is None or value != value:  # NaN from pandas
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return value
+
+
+def _holding_keys(rows: list[dict]) -> list[tuple]:
+    # Identical lots (same key) are paired in order via an occurrence counter.
+    seen: dict[tuple, int] = {}
+    keys = []
     for row in rows:
-        conn.execute(
-            """INSERT INTO holdings (category, name, symbol, quantity, buy_price,
-               buy_date, currency, broker, notes)
-               VALUES (:category, :name, :symbol, :quantity, :buy_price,
-               :buy_date, :currency, :broker, :notes)""",
-            row,
+        base = tuple(_normalize_holding_value(row.get(f)) for f in HOLDING_KEY_FIELDS)
+        seen[base] = seen.get(base, 0) + 1
+        keys.append((*base, seen[base]))
+    return keys
+
+
+def merge_holdings(rows: list[dict], dry_run: bool = False) -> HoldingsDiff:
+    """Sync holdings to ``rows``, writing only what changed.
+
+    Lots are matched on HOLDING_KEY_FIELDS. Matched lots whose other fields
+    differ are updated, unmatched incoming rows are inserted and existing lots
+    missing from ``rows`` are deleted. With ``dry_run`` nothing is written and
+    the returned diff is just the report.
+    """
+    existing = sorted(get_holdings(), key=lambda h: h["id"])
+    existing_by_key = dict(zip(_holding_keys(existing), existing))
+
+    diff = HoldingsDiff()
+    for key, row in zip(_holding_keys(rows), rows):
+        current = existing_by_key.pop(key, None)
+        if current is None:
+            diff.inserts.append(row)
+        elif any(_normalize_holding_value(row.get(f)) != _normalize_holding_value(current.get(f))
+                 for f in HOLDING_VALUE_FIELDS):
+            diff.updates.append({**row, "id": current["id"]})
+        else:
+            diff.unchanged += 1
+    diff.deletes = list(existing_by_key.values())
+
+    if dry_run or not diff.has_changes:
+        return diff
+
+    now = datetime.utcnow().isoformat()
+    with transaction() as conn:
+        conn.executemany("DELETE FROM holdings WHERE id=?", [(h["id"],) for h in diff.deletes])
+        conn.executemany(
+            """UPDATE holdings SET name=:name, quantity=:quantity, buy_price=:buy_price,
+               currency=:currency, notes=:notes, updated_at=:updated_at
+               WHERE id=:id""",
+            [{**{f: row.get(f) for f in HOLDING_VALUE_FIELDS}, "id": row["id"], "updated_at": now}
+             for row in diff.updates],
         )
-        count += 1
-    conn.commit()
-    conn.close()
-    return count
+        conn.executemany(_INSERT_HOLDING_SQL, diff.inserts)
+    return diff
 
 
 def get_monthly_ai_cost() -> float:
@@ -226,5 +1018,4 @@ def get_monthly_ai_cost() -> float:
         "SELECT COALESCE(SUM(cost_usd), 0) as total FROM ai_usage_log WHERE timestamp >= ?",
         (first_of_month.isoformat(),),
     ).fetchone()
-    conn.close()
     return row["total"]
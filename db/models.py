@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 
 @dataclass
@@ -23,17 +23,17 @@ class PriceData:
     all_time_high: float
     all_time_low: float
     trend: str  # "UP" | "DOWN" | "SIDEWAYS"
+    is_stale: bool = False  # served past its TTL while a refresh runs in the background
+    age_seconds: float | None = None  # time since the price was fetched; None if just fetched
 
 
 @dataclass
-class EnrichedHolding:
-    holding: Holding
-    current_price: float
-    total_invested: float
-    current_value: float
-    pnl: float
-    pnl_pct: float
-    all_time_high: float
-    all_time_low: float
-    trend: str
-    current_value_sgd: float
+class HoldingsDiff:
+    inserts: list[dict] = field(default_factory=list)
+    updates: list[dict] = field(default_factory=list)  # incoming rows, with the matched "id"
+    deletes: list[dict] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.inserts or self.updates or self.deletes)
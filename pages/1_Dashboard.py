@@ -1,19 +1,104 @@
 from __future__ import annotations
 
+import time
+from datetime import datetime, timedelta
+
 import streamlit as st
-from datetime import datetime
-
-from db.database import get_holdings
-from db.models import EnrichedHolding, Holding, PriceData
-from services.market_data import get_stock_price
-from services.mf_data import get_mf_price_data
-from services.metals_data import get_metal_price_sgd_per_gram
-from services.forex_data import convert_to_sgd
-from db.database import get_cached_price
+
+from db.database import get_data_version, get_history_epoch, get_holdings, get_price_epoch
+from services import metrics
+from services.background_refresh import pending_refreshes
+from services.indicators import history_symbol
+from services.portfolio import priced_lots
+from services.price_resolver import cached_prices, iter_prices, price_cache_key, resolve_prices
+from services.valuation import Valuation, combine, value_holdings
 from components.summary_cards import render_summary_cards
 from components.holdings_table import render_holdings_table
+from components.provider_status import render_provider_status
 from utils.constants import Category, CATEGORY_CURRENCIES, CATEGORY_LABELS
 
+# Prefix of the key a category's fetches are tracked under (single-flight and negative cache)
+FETCH_KEY_PREFIXES = {
+    Category.INDIAN_STOCK: "stock",
+    Category.SG_STOCK: "stock",
+    Category.US_STOCK: "stock",
+    Category.INDIAN_MF: "mf",
+    Category.PRECIOUS_METAL: "metal",
+}
+
+# Cached valuations are keyed on the holdings version, each category's price and
+# history epochs and the FX version; they also expire after this long so stale
+# markers and price ages catch up
+VALUATION_CACHE_TTL = timedelta(minutes=5)
+
+
+@st.cache_data(show_spinner=False)
+def _holdings(holdings_version: int) -> list[dict]:
+    return get_holdings()
+
+
+@st.cache_data(ttl=VALUATION_CACHE_TTL, show_spinner=False)
+def _category_valuation(category: str, holdings_version: int, epochs: tuple[int, int, int]) -> Valuation:
+    """One category's valuation from cached prices, recomputed only when its
+    holdings, their prices or histories, or FX rates change (``epochs``)."""
+    all_holdings = _holdings(holdings_version)
+    holdings = [h for h in all_holdings if h["category"] == category]
+    lots = priced_lots(holdings, cached_prices(holdings), universe=all_holdings)
+    return value_holdings(lots, "SGD")
+
+
+def _epochs(holdings: list[dict]) -> tuple[int, int, int]:
+    """Price epoch, history epoch (indicators) and FX version ``holdings``' valuation depends on."""
+    history_symbols = [history_symbol(h["category"], h["symbol"]) for h in holdings]
+    return (
+        get_price_epoch([price_cache_key(h["category"], h["symbol"]) for h in holdings]),
+        get_history_epoch([s for s in history_symbols if s]),
+        get_data_version("fx"),
+    )
+
+
+def _summary_valuation(holdings_version: int, holdings_by_category: dict[str, list[dict]]) -> Valuation:
+    return combine([
+        _category_valuation(cat, holdings_version, _epochs(holdings))
+        for cat, holdings in holdings_by_category.items()
+    ])
+
+
+@st.fragment
+def _summary_section(holdings_version: int, holdings_by_category: dict[str, list[dict]]) -> None:
+    render_summary_cards(_summary_valuation(holdings_version, holdings_by_category))
+
+
+@st.fragment
+def _category_section(category: str, holdings_version: int, holdings: list[dict],
+                      refreshable: bool = True) -> None:
+    """A category's table with its own refresh; other categories keep their cached valuations."""
+    valuation = _category_valuation(category, holdings_version, _epochs(holdings))
+    render_holdings_table(valuation.by_symbol, category, CATEGORY_CURRENCIES.get(category, "SGD"))
+
+    # Manually entered prices (SG MFs) have nothing to refresh
+    if refreshable and category in FETCH_KEY_PREFIXES and st.button(f"Refresh {CATEGORY_LABELS.get(category, category)}", key=f"refresh-{category}"):
+        with st.spinner("Fetching live prices..."):
+            resolve_prices(holdings, wait_for_fresh=True)
+        # The totals include this category; the rest of the page is served from cache
+        st.rerun(scope="app")
+
+
+def _paint(categories: set[str] | dict[str, list[dict]], final: bool = False) -> None:
+    """Redraw the totals and ``categories``' placeholders from their cached valuations.
+
+    Until the ``final`` paint, fetches are still running and the refresh
+    buttons (which may appear only once per run) are left out.
+    """
+    with summary_slot.container():
+        _summary_section(holdings_version, holdings_by_category)
+    for cat in categories:
+        with category_slots[cat].container():
+            _category_section(cat, holdings_version, holdings_by_category[cat], refreshable=final)
+
+
+started = time.perf_counter()
+
 st.header("Portfolio Dashboard")
 st.caption("Single pane of glass — all investments across India, Singapore, and USA")
 
@@ -22,115 +107,54 @@ col1, col2 = st.columns([3, 1])
 with col2:
     refresh = st.button("Refresh Prices", type="primary")
 
-all_holdings = get_holdings()
+holdings_version = get_data_version("holdings")
+all_holdings = _holdings(holdings_version)
 
 if not all_holdings:
     st.info("No holdings yet. Use the sidebar to add your stocks, mutual funds, and precious metals.")
     st.stop()
 
+holdings_by_category = {cat.value: [h for h in all_holdings if h["category"] == cat] for cat in Category}
+holdings_by_category = {cat: holdings for cat, holdings in holdings_by_category.items() if holdings}
+category_by_key = {price_cache_key(h["category"], h["symbol"]): h["category"] for h in all_holdings}
 
-def _get_price(holding: dict) -> PriceData | None:
-    cat = holding["category"]
-    symbol = holding["symbol"]
-
-    if cat in (Category.INDIAN_STOCK, Category.SG_STOCK, Category.US_STOCK):
-        return get_stock_price(symbol)
-    elif cat == Category.INDIAN_MF:
-        return get_mf_price_data(symbol)
-    elif cat == Category.PRECIOUS_METAL:
-        return get_metal_price_sgd_per_gram(symbol)
-    elif cat == Category.SG_MF:
-        # Manual NAV — read from price_cache (no TTL expiry for manual entries)
-        cached = get_cached_price(symbol, ttl_minutes=999999)
-        if cached and cached.get("current_price"):
-            return PriceData(
-                current_price=cached["current_price"],
-                all_time_high=cached.get("all_time_high") or 0,
-                all_time_low=cached.get("all_time_low") or 0,
-                trend=cached.get("trend") or "SIDEWAYS",
-            )
-        return None
-    return None
-
-
-# Enrich holdings with live data
-enriched_all: list[EnrichedHolding] = []
-with st.spinner("Fetching live prices..."):
-    for h in all_holdings:
-        price_data = _get_price(h)
-
-        if price_data:
-            current_price = price_data.current_price
-            ath = price_data.all_time_high
-            atl = price_data.all_time_low
-            trend = price_data.trend
-        else:
-            current_price = h["buy_price"]
-            ath = 0
-            atl = 0
-            trend = "SIDEWAYS"
-
-        total_invested = h["quantity"] * h["buy_price"]
-        current_value = h["quantity"] * current_price
-        pnl = current_value - total_invested
-        pnl_pct = (pnl / total_invested * 100) if total_invested else 0
-
-        currency = h["currency"]
-        current_value_sgd = convert_to_sgd(current_value, currency)
-
-        holding_obj = Holding(
-            id=h["id"],
-            category=h["category"],
-            name=h["name"],
-            symbol=h["symbol"],
-            quantity=h["quantity"],
-            buy_price=h["buy_price"],
-            buy_date=h.get("buy_date"),
-            currency=currency,
-            broker=h.get("broker"),
-            notes=h.get("notes"),
-        )
-
-        enriched_all.append(EnrichedHolding(
-            holding=holding_obj,
-            current_price=current_price,
-            total_invested=total_invested,
-            current_value=current_value,
-            pnl=pnl,
-            pnl_pct=pnl_pct,
-            all_time_high=ath,
-            all_time_low=atl,
-            trend=trend,
-            current_value_sgd=current_value_sgd,
-        ))
-
-# Build category totals
-category_totals = {}
-for e in enriched_all:
-    cat = e.holding.category
-    if cat not in category_totals:
-        currency = CATEGORY_CURRENCIES.get(cat, "SGD")
-        category_totals[cat] = {
-            "current_value": 0,
-            "total_invested": 0,
-            "currency": currency,
-            "count": 0,
-        }
-    category_totals[cat]["current_value"] += e.current_value
-    category_totals[cat]["total_invested"] += e.total_invested
-    category_totals[cat]["count"] += 1
-
-# Render summary cards
-render_summary_cards(enriched_all, category_totals)
-
+status_slot = st.container()
+summary_slot = st.empty()
 st.markdown("---")
-
-# Render per-category tables
-for cat in Category:
-    cat_enriched = [e for e in enriched_all if e.holding.category == cat]
-    if cat_enriched:
-        currency = CATEGORY_CURRENCIES.get(cat, "SGD")
-        render_holdings_table(cat_enriched, cat, currency)
+category_slots = {cat: st.empty() for cat in holdings_by_category}
+
+# Bring price_cache up to date: asset classes are fetched concurrently and stale
+# entries revalidated in the background. While fetches run, cached values are
+# shown at once and each category (and the totals) is redrawn as its fetch
+# completes. Prices written bump their category's epoch, so only those
+# categories' valuations are recomputed.
+first_paint = None
+with st.spinner("Fetching live prices..."):
+    updates = iter_prices(all_holdings, wait_for_fresh=refresh)
+    _, pending = next(updates)
+    if pending:
+        _paint(holdings_by_category)
+        first_paint = time.perf_counter() - started
+        for batch, _ in updates:
+            changed = {category_by_key[key] for key in batch}
+            if changed:
+                _paint(changed)
+_paint(holdings_by_category, final=True)
+
+complete = time.perf_counter() - started
+metrics.set_gauge("dashboard.first_paint.seconds", first_paint or complete)
+metrics.set_gauge("dashboard.complete.seconds", complete)
+
+with status_slot:
+    render_provider_status({
+        f"{FETCH_KEY_PREFIXES[h['category']]}:{h['symbol']}": h["name"]
+        for h in all_holdings if h["category"] in FETCH_KEY_PREFIXES
+    })
+
+    refreshing = pending_refreshes()
+    if refreshing:
+        st.caption(f"Showing last known prices — {refreshing} refresh(es) running in the background. "
+                   "Rerun or click Refresh Prices to see updates.")
 
 # AI Insights panel
 st.markdown("---")
@@ -34,11 +34,9 @@ if holdings:
             )
         with cols[2]:
             if st.button("Save", key=f"save_nav_{h['id']}", type="primary"):
+                # Only the NAV is known here; other cached fields are left as they are
                 upsert_price_cache(h["symbol"], {
                     "current_price": new_nav,
-                    "all_time_high": None,
-                    "all_time_low": None,
-                    "trend": "SIDEWAYS",
                     "currency": "SGD",
                 })
                 st.success(f"NAV updated to {new_nav:.4f}")
@@ -4,7 +4,7 @@ import io
 import pandas as pd
 import streamlit as st
 
-from db.database import get_holdings, delete_all_holdings, bulk_insert_holdings
+from db.database import get_holdings, merge_holdings, replace_all_holdings
 
 st.header("Import / Export Portfolio")
 st.caption("Download your holdings as CSV or upload a revised CSV to sync data.")
@@ -44,11 +44,29 @@ st.markdown("---")
 # ────────────────────────── UPLOAD ──────────────────────────
 
 st.subheader("Upload Holdings")
-st.warning(
-    "Uploading will **replace all existing holdings** with the data from the CSV. "
-    "Make sure to download a backup first!"
+
+IMPORT_MODES = {
+    "replace": "Replace all holdings",
+    "merge": "Merge changes (only write what changed)",
+}
+mode = st.radio(
+    "Import mode",
+    options=list(IMPORT_MODES),
+    format_func=IMPORT_MODES.get,
+    horizontal=True,
 )
 
+if mode == "replace":
+    st.warning(
+        "Uploading will **replace all existing holdings** with the data from the CSV. "
+        "Make sure to download a backup first!"
+    )
+else:
+    st.info(
+        "Lots are matched on category, symbol, buy date and broker. Matched lots are updated "
+        "if anything else changed, new lots are added, and lots missing from the CSV are removed."
+    )
+
 uploaded_file = st.file_uploader("Choose a CSV file", type=["csv"])
 
 if uploaded_file is not None:
@@ -76,17 +94,42 @@ if uploaded_file is not None:
 
     st.write(f"**{len(df_import)}** holdings found in the CSV.")
 
-    with st.expander("Preview import data", expanded=True):
+    with st.expander("Preview import data", expanded=mode == "replace"):
         st.dataframe(df_import[EXPORT_COLUMNS], use_container_width=True, hide_index=True)
 
-    # Confirm import
-    if st.button("Replace All Holdings with This Data", type="primary"):
-        rows = df_import[EXPORT_COLUMNS].to_dict("records")
-
-        deleted = delete_all_holdings()
-        inserted = bulk_insert_holdings(rows)
-
-        st.success(
-            f"Done! Removed **{deleted}** old holdings and imported **{inserted}** new holdings."
-        )
-        st.balloons()
+    rows = df_import[EXPORT_COLUMNS].to_dict("records")
+
+    if mode == "replace":
+        # Confirm import
+        if st.button("Replace All Holdings with This Data", type="primary"):
+            deleted, inserted = replace_all_holdings(rows)
+
+            st.success(
+                f"Done! Removed **{deleted}** old holdings and imported **{inserted}** new holdings."
+            )
+            st.balloons()
+    else:
+        # Dry run first so the user sees exactly what will be written
+        diff = merge_holdings(rows, dry_run=True)
+
+        st.markdown("**Dry run**")
+        cols = st.columns(4)
+        cols[0].metric("Inserts", len(diff.inserts))
+        cols[1].metric("Updates", len(diff.updates))
+        cols[2].metric("Deletes", len(diff.deletes))
+        cols[3].metric("Unchanged", diff.unchanged)
+
+        for label, changed in (("Inserts", diff.inserts), ("Updates", diff.updates), ("Deletes", diff.deletes)):
+            if changed:
+                with st.expander(f"{label} ({len(changed)})"):
+                    st.dataframe(pd.DataFrame(changed)[EXPORT_COLUMNS], use_container_width=True, hide_index=True)
+
+        if not diff.has_changes:
+            st.success("Holdings already match this CSV — nothing to import.")
+        elif st.button("Apply Changes", type="primary"):
+            applied = merge_holdings(rows)
+            st.success(
+                f"Done! Inserted **{len(applied.inserts)}**, updated **{len(applied.updates)}** "
+                f"and removed **{len(applied.deletes)}** holdings."
+            )
+            st.balloons()
@@ -0,0 +1,109 @@
+"""Value the portfolio without the UI, for cron jobs, batch exports and profiling.
+
+Values every holding in db/portfolio.db (refreshing expired prices in bulk
+first, unless --offline) and writes one row per symbol, lot or category.
+
+    python -m portfolio_cli                                   # by-symbol JSON on stdout
+    python -m portfolio_cli --level lots --format csv -o lots.csv
+    python -m portfolio_cli --category US_STOCK --category SG_STOCK --base USD
+    python -m portfolio_cli --offline --format parquet -o portfolio.parquet
+    python -m cProfile -s cumtime -m portfolio_cli --offline > /dev/null
+
+Parquet output needs pyarrow (or fastparquet).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sys
+import time
+
+import pandas as pd
+
+from db import database as db
+from services import metrics
+from services.portfolio import value_portfolio
+from services.valuation import Valuation
+from utils.constants import Category
+
+LEVELS = ("symbols", "lots", "categories")
+FORMATS = ("json", "csv", "parquet")
+
+
+def _rows(valuation: Valuation, level: str) -> pd.DataFrame:
+    if level == "lots":
+        return valuation.lots
+    if level == "categories":
+        return valuation.by_category.reset_index()
+    return valuation.by_symbol
+
+
+def _write(valuation: Valuation, rows: pd.DataFrame, fmt: str, output: str | None) -> None:
+    if fmt == "parquet":
+        rows.to_parquet(output, index=False)
+    elif fmt == "csv":
+        rows.to_csv(output or sys.stdout, index=False)
+    else:
+        document = {
+            "base": valuation.base,
+            "totals": valuation.totals,
+            "rows": json.loads(rows.to_json(orient="records")),
+        }
+        text = json.dumps(document, indent=2)
+        if output:
+            with open(output, "w") as f:
+                f.write(text + "\n")
+        else:
+            print(text)
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m portfolio_cli",
+        description="Value the portfolio and write it as JSON, CSV or Parquet.",
+    )
+    parser.add_argument("--format", choices=FORMATS, default="json", help="output format (default: json)")
+    parser.add_argument("-o", "--output", help="output file (default: stdout; required for parquet)")
+    parser.add_argument("--level", choices=LEVELS, default="symbols",
+                        help="one row per symbol, lot or category (default: symbols)")
+    parser.add_argument("--category", action="append", choices=[c.value for c in Category],
+                        help="only this category; repeat for several (default: all)")
+    parser.add_argument("--base", default="SGD", type=str.upper, help="currency to value in (default: SGD)")
+    parser.add_argument("--offline", action="store_true",
+                        help="use cached prices and FX rates only; make no network requests")
+    parser.add_argument("--db", help="SQLite database to read (default: db/portfolio.db)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log progress and timings to stderr")
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parser().parse_args(argv)
+    if args.format == "parquet" and not args.output:
+        _parser().error("--format parquet needs --output")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.db:
+        db.DB_PATH = args.db
+    db.init_db()
+
+    started = time.perf_counter()
+    valuation = value_portfolio(args.category, args.base, offline=args.offline)
+    valued = time.perf_counter() - started
+    try:
+        _write(valuation, _rows(valuation, args.level), args.format, args.output)
+    except ImportError as e:
+        print(f"Cannot write {args.format}: {e}", file=sys.stderr)
+        return 1
+    finally:
+        db.close_connection()
+
+    if args.verbose:
+        timings = {"valuation.seconds": valued, **metrics.snapshot("resolve.")}
+        print("\n".join(f"{name}: {value:.3f}" for name, value in timings.items()), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from db.database import (
+    bulk_upsert_price_cache,
+    get_history_stats_bulk,
+    get_last_history_dates,
+    transaction,
+    upsert_price_history,
+)
+from db.models import PriceData
+from services import http_client
+from services.price_history import cached_trend
+
+logger = logging.getLogger(__name__)
+
+# AMFI's daily file with the latest NAV of every scheme (~14k rows)
+AMFI_NAV_URL = "https://www.amfiindia.com/spages/NAVAll.txt"
+
+# Below this many schemes, concurrent per-scheme /latest requests finish
+# sooner than downloading the whole file (see benchmarks/bench_amfi_nav.py)
+AMFI_MIN_SCHEMES = 25
+
+
+def parse_nav_file(lines: Iterable[str], scheme_codes: set[str] | None = None) -> Iterator[tuple[str, str, float]]:
+    """Stream ``(scheme_code, date, nav)`` out of NAVAll.txt lines.
+
+    Data rows look like ``code;isin;isin;name;nav;17-Oct-2025``; headers and
+    fund-house lines are skipped. With ``scheme_codes`` other schemes are
+    dropped after reading their code, so most rows are never split further.
+    Rows with a missing or non-positive NAV ("N.A.") are skipped.
+    """
+    dates: dict[str, str | None] = {}
+    for line in lines:
+        code, sep, rest = line.partition(";")
+        code = code.strip()
+        if not sep or (scheme_codes is not None and code not in scheme_codes) or not code.isdigit():
+            continue
+        fields = rest.rsplit(";", 2)
+        if len(fields) != 3:
+            continue
+        try:
+            nav = float(fields[1])
+        except ValueError:
+            continue
+
+        # The whole file shares a handful of dates; parse each one once
+        date_text = fields[2].strip()
+        if date_text not in dates:
+            try:
+                dates[date_text] = datetime.strptime(date_text, "%d-%b-%Y").date().isoformat()
+            except ValueError:
+                dates[date_text] = None
+        if dates[date_text] and nav > 0:
+            yield code, dates[date_text], nav
+
+
+def _nav_lines(source: str | None) -> Iterator[str]:
+    if source and not source.startswith(("http://", "https://")):
+        with open(source, encoding="utf-8", errors="replace") as f:
+            yield from f
+        return
+
+    response = http_client.get(source or AMFI_NAV_URL, timeout=30, budget=60, stream=True)
+    response.encoding = response.encoding or "utf-8"
+    try:
+        yield from response.iter_lines(decode_unicode=True)
+    finally:
+        response.close()
+
+
+def refresh_from_amfi(scheme_codes: list[str], source: str | None = None) -> dict[str, PriceData]:
+    """Update many Indian MF schemes from one AMFI NAV file in a single transaction.
+
+    ``source`` is a URL or local path (default: AMFI's daily file). Only
+    schemes whose stored NAV history runs up to the business day before the
+    file's NAV are updated: the NAV is appended to their history and cache.
+    Schemes seen for the first time, or with a gap, are left to
+    mf_data.sync_nav_history(). Returns price data for the schemes updated.
+    """
+    navs = {code: (nav_date, nav) for code, nav_date, nav in parse_nav_file(_nav_lines(source), set(scheme_codes))}
+    last_dates = get_last_history_dates(list(navs))
+    contiguous = {
+        code: (nav_date, nav) for code, (nav_date, nav) in navs.items()
+        if code in last_dates and last_dates[code] <= nav_date and np.busday_count(last_dates[code], nav_date) <= 1
+    }
+    if not contiguous:
+        return {}
+
+    results = {}
+    with transaction():
+        for code, (nav_date, nav) in contiguous.items():
+            upsert_price_history(code, [{"date": nav_date, "close": nav}])
+        stats = get_history_stats_bulk(list(contiguous))
+        for code, (_, nav) in contiguous.items():
+            results[code] = PriceData(
+                current_price=nav,
+                all_time_high=stats[code]["all_time_high"],
+                all_time_low=stats[code]["all_time_low"],
+                # The new bar expired the stored trend; recompute it as the per-scheme path does
+                trend=cached_trend(code, stats[code]),
+            )
+        bulk_upsert_price_cache([
+            {"symbol": code, "current_price": p.current_price, "all_time_high": p.all_time_high,
+             "all_time_low": p.all_time_low, "trend": p.trend, "currency": "INR"}
+            for code, p in results.items()
+        ])
+
+    logger.info("Updated %d of %d schemes from the AMFI NAV file", len(results), len(scheme_codes))
+    return results
@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+MAX_REFRESH_WORKERS = 4
+
+_executor = ThreadPoolExecutor(max_workers=MAX_REFRESH_WORKERS, thread_name_prefix="price-refresh")
+_pending: set[str] = set()
+_lock = threading.Lock()
+
+
+def schedule_refresh(key: str, refresh: Callable[[], object]) -> bool:
+    """Run ``refresh`` in the background unless a refresh for ``key`` is already queued.
+
+    Returns True if a new refresh was scheduled.
+    """
+    with _lock:
+        if key in _pending:
+            return False
+        _pending.add(key)
+
+    def _run() -> None:
+        try:
+            refresh()
+        except Exception as e:
+            logger.warning("Background refresh failed for %s: %s", key, e)
+        finally:
+            with _lock:
+                _pending.discard(key)
+
+    _executor.submit(_run)
+    return True
+
+
+def pending_refreshes() -> int:
+    with _lock:
+        return len(_pending)
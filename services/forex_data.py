@@ -1,16 +1,32 @@
 from __future__ import annotations
 
 import logging
+import time
+from dataclasses import dataclass
+from typing import Iterable
 
-import requests
+import numpy as np
+import pandas as pd
 
-from db.database import get_cached_forex, upsert_forex_cache
+from db.database import (
+    get_all_cached_forex,
+    get_cached_forex,
+    get_fx_matrix_fetch,
+    store_fx_matrix,
+    upsert_forex_cache,
+)
+from services import http_client, negative_cache
+from services.singleflight import price_fetches
+from services.throttle import provider_slot
 
 logger = logging.getLogger(__name__)
 
 FRANKFURTER_URL = "https://api.frankfurter.dev/latest"
 FOREX_TTL_MINUTES = 60
 
+# Currency the FX matrix is quoted against
+MATRIX_BASE = "SGD"
+
 
 def get_exchange_rate(from_currency: str, to_currency: str) -> float | None:
     if from_currency == to_currency:
@@ -21,15 +37,24 @@ def get_exchange_rate(from_currency: str, to_currency: str) -> float | None:
     if cached:
         return cached
 
+    # Concurrent callers for the same pair share one in-flight request
+    rate = price_fetches.do(f"fx:{pair}", lambda: _fetch_exchange_rate(from_currency, to_currency))
+    if rate is None:
+        # Both sources are failing: fall back to the last known rate
+        rate = get_cached_forex(pair, FOREX_TTL_MINUTES, allow_stale=True)
+    return rate
+
+
+def _fetch_exchange_rate(from_currency: str, to_currency: str) -> float | None:
+    pair = f"{from_currency}{to_currency}"
+
     # Primary: Frankfurter API
     try:
-        resp = requests.get(
+        data = http_client.get_json(
             FRANKFURTER_URL,
             params={"from": from_currency, "to": to_currency},
             timeout=10,
         )
-        resp.raise_for_status()
-        data = resp.json()
         rate = data["rates"][to_currency]
         upsert_forex_cache(pair, rate)
         return rate
@@ -41,7 +66,8 @@ def get_exchange_rate(from_currency: str, to_currency: str) -> float | None:
         import yfinance as yf
         symbol = f"{from_currency}{to_currency}=X"
         ticker = yf.Ticker(symbol)
-        hist = ticker.history(period="1d")
+        with provider_slot("yfinance"):
+            hist = ticker.history(period="1d")
         if not hist.empty:
             rate = float(hist["Close"].iloc[-1])
             upsert_forex_cache(pair, rate)
@@ -52,10 +78,102 @@ def get_exchange_rate(from_currency: str, to_currency: str) -> float | None:
     return None
 
 
+@dataclass(frozen=True)
+class FxMatrix:
+    """Every currency against one base: 1 ``base`` buys ``rates[c]`` of currency c."""
+
+    base: str
+    rates: dict[str, float]
+    fetched_at: float  # time.monotonic()
+
+    def rate(self, from_currency: str, to_currency: str) -> float | None:
+        """Cross rate derived through the base; None if either currency is missing."""
+        if from_currency == to_currency:
+            return 1.0
+        src = 1.0 if from_currency == self.base else self.rates.get(from_currency)
+        dst = 1.0 if to_currency == self.base else self.rates.get(to_currency)
+        if not src or not dst:
+            return None
+        return dst / src
+
+
+_matrix: FxMatrix | None = None
+
+
+def _fetch_fx_matrix() -> FxMatrix | None:
+    global _matrix
+    data = http_client.get_json(FRANKFURTER_URL, params={"base": MATRIX_BASE}, timeout=10)
+    rates = {currency: float(rate) for currency, rate in data["rates"].items() if rate}
+    if not rates:
+        return None
+    _matrix = FxMatrix(MATRIX_BASE, rates, time.monotonic())
+    # Persist as ordinary pairs so per-pair lookups and restarts reuse this request
+    store_fx_matrix(MATRIX_BASE, {f"{c}{MATRIX_BASE}": 1 / r for c, r in rates.items()})
+    return _matrix
+
+
+def get_fx_matrix() -> FxMatrix | None:
+    """All rates against MATRIX_BASE, held in memory for FOREX_TTL_MINUTES.
+
+    A new process (or one whose matrix expired) first reuses the last full
+    matrix fetch if it was within FOREX_TTL_MINUTES and forex_cache still
+    has every currency it covered; per-pair rates cached on their own never
+    stand in for it. Otherwise one Frankfurter request refreshes every
+    currency at once. While a refresh fails (and backs off), the previous
+    matrix keeps being served.
+    """
+    global _matrix
+    matrix = _matrix
+    if matrix and time.monotonic() - matrix.fetched_at < FOREX_TTL_MINUTES * 60:
+        return matrix
+    fetch = get_fx_matrix_fetch(MATRIX_BASE)
+    if fetch and fetch["currencies"] and fetch["age_seconds"] < FOREX_TTL_MINUTES * 60:
+        cached = cached_fx_matrix()
+        if set(fetch["currencies"]) <= set(cached.rates):
+            _matrix = FxMatrix(MATRIX_BASE, cached.rates, time.monotonic() - fetch["age_seconds"])
+            return _matrix
+    fresh = price_fetches.do("fx:matrix", lambda: negative_cache.guard("fx:matrix", _fetch_fx_matrix))
+    return fresh or matrix
+
+
+def cached_fx_matrix() -> FxMatrix:
+    """FX matrix from the last cached rates against MATRIX_BASE, without a request
+    (offline use). Currencies never cached are missing from it."""
+    rates = {
+        pair[:-len(MATRIX_BASE)]: 1 / rate for pair, rate in get_all_cached_forex().items()
+        if pair.endswith(MATRIX_BASE) and len(pair) == 2 * len(MATRIX_BASE) and rate
+    }
+    return FxMatrix(MATRIX_BASE, rates, time.monotonic())
+
+
+def cross_rate(from_currency: str, to_currency: str) -> float | None:
+    """Rate from the FX matrix, falling back to a per-pair lookup for currencies it lacks."""
+    if from_currency == to_currency:
+        return 1.0
+    matrix = get_fx_matrix()
+    rate = matrix.rate(from_currency, to_currency) if matrix else None
+    return rate if rate is not None else get_exchange_rate(from_currency, to_currency)
+
+
+def convert(amounts: Iterable[float], currencies: Iterable[str], target: str = "SGD",
+            matrix: FxMatrix | None = None) -> np.ndarray:
+    """Convert a whole column of amounts in mixed currencies to ``target``.
+
+    Each distinct currency is looked up once, in ``matrix`` if given (no
+    requests) or else via cross_rate(). Amounts in a currency with no known
+    rate are returned unconverted, as in convert_to_sgd().
+    """
+    amounts = np.asarray(list(amounts), dtype=float)
+    inverse, codes = pd.factorize(np.asarray(list(currencies), dtype=object))
+    lookup = matrix.rate if matrix is not None else cross_rate
+    factors = np.array([lookup(c, target) or 1.0 for c in codes], dtype=float)
+    return amounts * factors[inverse]
+
+
 def convert_to_sgd(amount: float, from_currency: str) -> float:
     if from_currency == "SGD":
         return amount
-    rate = get_exchange_rate(from_currency, "SGD")
+    rate = cross_rate(from_currency, "SGD")
     if rate:
         return amount * rate
     return amount  # fallback: return unconverted
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import logging
+import time
+from datetime import date, timedelta
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from db.database import get_fx_history, get_fx_history_bounds, mark_fx_history_requested, upsert_fx_history
+from services import http_client, negative_cache
+from services.background_refresh import schedule_refresh
+from services.forex_data import FOREX_TTL_MINUTES, MATRIX_BASE, FxMatrix, cross_rate
+
+logger = logging.getLogger(__name__)
+
+# Frankfurter time series: daily ECB reference rates for a date range
+FRANKFURTER_SERIES_URL = "https://api.frankfurter.dev/{start}..{end}"
+
+# Frankfurter's series starts here; earlier buy dates fall back to today's rate
+FX_HISTORY_START = date(1999, 1, 4)
+
+# Days per time-series request
+SERIES_CHUNK_DAYS = 365
+
+# Currencies checked against Frankfurter in this process: currency -> time.monotonic()
+_checked_at: dict[str, float] = {}
+
+# Stored history loaded for rates_asof(): currencies -> (time.monotonic(), frame)
+_history_frames: dict[tuple[str, ...], tuple[float, pd.DataFrame]] = {}
+
+
+def _fetch_series(start: date, end: date, currencies: tuple[str, ...]) -> list[tuple[str, str, float]]:
+    data = http_client.get_json(
+        FRANKFURTER_SERIES_URL.format(start=start.isoformat(), end=end.isoformat()),
+        params={"base": MATRIX_BASE, "symbols": ",".join(currencies)},
+        timeout=20,
+    )
+    return [
+        (currency, day, float(rate))
+        for day, rates in data.get("rates", {}).items()
+        for currency, rate in rates.items() if rate
+    ]
+
+
+def _missing_ranges(first: str | None, last: str | None, start: date, today: date) -> list[tuple[date, date]]:
+    if first is None:
+        return [(start, today)]
+    ranges = []
+    # No fixing falls between a weekend start and the first stored one
+    if start < date.fromisoformat(first) and np.busday_count(start, first) > 0:
+        ranges.append((start, date.fromisoformat(first) - timedelta(days=1)))
+    # Extend once a business day has closed after the last stored rate
+    next_day = date.fromisoformat(last) + timedelta(days=1)
+    if np.busday_count(next_day, today) >= 1:
+        ranges.append((next_day, today))
+    return ranges
+
+
+def _due(currencies: Iterable[str]) -> list[str]:
+    """Currencies not checked against Frankfurter within FOREX_TTL_MINUTES."""
+    now = time.monotonic()
+    return [
+        c for c in dict.fromkeys(currencies)
+        if c != MATRIX_BASE and now - _checked_at.get(c, -np.inf) >= FOREX_TTL_MINUTES * 60
+    ]
+
+
+def sync_fx_history(currencies: Iterable[str], start: date) -> int:
+    """Backfill and extend the stored daily rates of ``currencies`` against MATRIX_BASE.
+
+    Only the dates not stored yet are requested: a missing head back to
+    ``start`` and a missing tail up to today, in SERIES_CHUNK_DAYS ranges.
+    Currencies that need the same range share each request. Each currency is
+    checked at most once per FOREX_TTL_MINUTES. Returns the rows stored.
+    """
+    now = time.monotonic()
+    currencies = _due(currencies)
+    if not currencies:
+        return 0
+
+    today = date.today()
+    start = max(start, FX_HISTORY_START)
+    bounds = get_fx_history_bounds(currencies)
+    wanted: dict[tuple[date, date], list[str]] = {}
+    for currency in currencies:
+        first, last = bounds.get(currency, (None, None))
+        for span in _missing_ranges(first, last, start, today):
+            wanted.setdefault(span, []).append(currency)
+
+    stored = 0
+    for (span_start, span_end), group in wanted.items():
+        chunk_start = span_start
+        while chunk_start <= span_end:
+            chunk_end = min(chunk_start + timedelta(days=SERIES_CHUNK_DAYS - 1), span_end)
+            rows = negative_cache.guard(
+                "fx:history", lambda: _fetch_series(chunk_start, chunk_end, tuple(group)),
+            )
+            if rows is None:
+                # Provider failing: keep what is stored and retry on a later sync
+                return stored
+            stored += upsert_fx_history(rows)
+            _history_frames.clear()
+            chunk_start = chunk_end + timedelta(days=1)
+
+    mark_fx_history_requested(currencies, start.isoformat())
+    for currency in currencies:
+        _checked_at[currency] = now
+    logger.info("Stored %d FX history rows for %s", stored, ", ".join(currencies))
+    return stored
+
+
+def _history_frame(currencies: tuple[str, ...]) -> pd.DataFrame:
+    """Stored history of ``currencies`` as ``date, code, rate`` sorted by date, with ``code``
+    the position in ``currencies``; kept in memory until a sync stores rows or FOREX_TTL_MINUTES pass."""
+    cached = _history_frames.get(currencies)
+    if cached and time.monotonic() - cached[0] < FOREX_TTL_MINUTES * 60:
+        return cached[1]
+    history = pd.DataFrame(get_fx_history(list(currencies)), columns=["currency", "date", "rate"])
+    frame = pd.DataFrame({
+        "date": pd.to_datetime(history["date"]).astype("datetime64[ns]"),
+        "code": pd.Index(currencies).get_indexer(history["currency"]),
+        "rate": history["rate"].astype(float),
+    }).sort_values("date", kind="stable")
+    _history_frames[currencies] = (time.monotonic(), frame)
+    return frame
+
+
+def rates_asof(
+    dates: Iterable[str | None],
+    currencies: Iterable[str],
+    target: str = "SGD",
+    sync: bool = True,
+    matrix: FxMatrix | None = None,
+    wait_for_sync: bool = False,
+) -> np.ndarray:
+    """Rate from each currency to ``target`` on each date, for a whole column of lots.
+
+    Each date takes the last stored rate on or before it (weekends and
+    holidays use the previous fixing), via one merge-asof over the distinct
+    (currency, date) pairs. Missing or unparseable dates, and dates before
+    any stored rate, use today's rate; currencies with no rate at all get
+    1.0, as in forex_data.convert(). With ``sync`` the stored history is
+    brought up to date in the background, and these rates come from what is
+    stored already; ``wait_for_sync`` syncs first instead. Today's rates
+    come from ``matrix`` if given.
+    """
+    currencies = np.asarray(currencies, dtype=object)
+    if len(currencies) == 0:
+        return np.array([], dtype=float)
+    days = pd.to_datetime(pd.Series(np.asarray(dates, dtype=object)), format="ISO8601", errors="coerce")
+    # Lots share few (currency, day) pairs: look each pair up once
+    currency_codes, names = pd.factorize(currencies)
+    day_codes, day_values = pd.factorize(days.dt.normalize().to_numpy("datetime64[ns]"), use_na_sentinel=False)
+    inverse, pairs = pd.factorize(day_codes * len(names) + currency_codes)
+    frame = pd.DataFrame({
+        "date": np.asarray(day_values, dtype="datetime64[ns]")[pairs // len(names)],
+        "currency": np.asarray(names, dtype=object)[pairs % len(names)],
+    })
+
+    needed = sorted((set(frame["currency"]) | {target}) - {MATRIX_BASE})
+    dated = frame["date"].notna().to_numpy()
+    if sync and dated.any() and _due(needed):
+        start = frame.loc[dated, "date"].min().date()
+        if wait_for_sync:
+            sync_fx_history(needed, start)
+        else:
+            # Backfilling years of rates can take several requests; keep it off the render path
+            schedule_refresh("fx:history:" + ",".join(needed), lambda: sync_fx_history(needed, start))
+
+    # Units per 1 MATRIX_BASE on each pair's date, for its currency and for the target.
+    # Currencies are matched by integer code; -1 is MATRIX_BASE or a currency with no history.
+    history = _history_frame(tuple(needed))
+    index = pd.Index(needed)
+
+    def units_per_base(currency: np.ndarray) -> np.ndarray:
+        units = np.where(currency == MATRIX_BASE, 1.0, np.nan)
+        codes = index.get_indexer(currency)
+        lookup = dated & (codes >= 0)
+        if lookup.any() and not history.empty:
+            wanted = pd.DataFrame({"date": frame["date"].to_numpy()[lookup], "code": codes[lookup],
+                                   "pos": np.flatnonzero(lookup)}).sort_values("date")
+            matched = pd.merge_asof(wanted, history, on="date", by="code", direction="backward")
+            units[matched["pos"].to_numpy()] = matched["rate"].to_numpy()
+        return units
+
+    pair_currencies = frame["currency"].to_numpy(dtype=object)
+    rates = units_per_base(np.full(len(frame), target, dtype=object)) / units_per_base(pair_currencies)
+
+    # Fall back to today's rate, looked up once per currency
+    missing = np.isnan(rates)
+    if missing.any():
+        missing_codes, missing_inverse = np.unique(pair_currencies[missing].astype(str), return_inverse=True)
+        rate_today = matrix.rate if matrix is not None else cross_rate
+        current = np.array([rate_today(c, target) or 1.0 for c in missing_codes], dtype=float)
+        rates[missing] = current[missing_inverse]
+    return rates[inverse]
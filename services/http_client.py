@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Iterator
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.throttle import CallOutcome, provider_for_host
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class HttpClient:
+    """Shared HTTP client: pooled keep-alive connections, bounded retries with
+    full-jitter exponential backoff, a per-host concurrency cap and an overall
+    time budget per request (covering every attempt and backoff sleep)."""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        timeout: float = 10.0,
+        budget: float = 30.0,
+        per_host_limit: int = 4,
+        pool_size: int = 16,
+    ):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.budget = budget
+        self.per_host_limit = per_host_limit
+
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._host_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _host_slot(self, host: str) -> Iterator[None]:
+        with self._lock:
+            slot = self._host_slots.get(host)
+            if slot is None:
+                slot = self._host_slots[host] = threading.BoundedSemaphore(self.per_host_limit)
+        with slot:
+            yield
+
+    def _backoff(self, attempt: int, response: requests.Response | None) -> float:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def get(
+        self,
+        url: str,
+        params: dict | None = None,
+        timeout: float | None = None,
+        budget: float | None = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        """GET with retries. Raises requests exceptions once retries or the budget run out."""
+        timeout = timeout or self.timeout
+        deadline = time.monotonic() + (budget or self.budget)
+        host = urlsplit(url).netloc
+        provider = provider_for_host(host)
+
+        for attempt in range(self.max_retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.Timeout(f"Time budget exhausted for {url}")
+
+            response = None
+            try:
+                # Known providers are also rate limited and adaptively capped
+                provider_slot = provider.slot() if provider else nullcontext(CallOutcome())
+                with self._host_slot(host), provider_slot as outcome:
+                    response = self._session.get(
+                        url, params=params, timeout=min(timeout, remaining), stream=stream,
+                    )
+                    if response.status_code in RETRY_STATUSES:
+                        outcome.fail(throttled=response.status_code == 429)
+                if response.status_code not in RETRY_STATUSES or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response
+                error: Exception = requests.HTTPError(f"{response.status_code} from {url}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                error = e
+
+            delay = self._backoff(attempt, response)
+            if response is not None:
+                # Hand the connection back to the pool before sleeping
+                response.close()
+            if time.monotonic() + delay >= deadline:
+                raise error
+            logger.info("Retrying %s in %.2fs (attempt %d): %s", url, delay, attempt + 1, error)
+            time.sleep(delay)
+
+        raise AssertionError("unreachable")
+
+    def get_json(self, url: str, params: dict | None = None, **kwargs: Any) -> Any:
+        return self.get(url, params=params, **kwargs).json()
+
+
+# Process-wide client used by every service; keeps connections alive across calls
+default_client = HttpClient()
+
+
+def get(url: str, params: dict | None = None, **kwargs: Any) -> requests.Response:
+    return default_client.get(url, params=params, **kwargs)
+
+
+def get_json(url: str, params: dict | None = None, **kwargs: Any) -> Any:
+    return default_client.get_json(url, params=params, **kwargs)
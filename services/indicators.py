@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, replace
+from datetime import date, timedelta
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+from db.database import get_closes_bulk, get_last_history_dates
+from utils.constants import Category
+
+# Daily closes per symbol the indicators are computed over (~1 trading year)
+LOOKBACK_BARS = 260
+LOOKBACK_DAYS = 380
+
+SMA_FAST, SMA_SLOW = 5, 20
+EMA_FAST, EMA_SLOW = 12, 26
+RSI_PERIOD = 14
+VOLATILITY_WINDOW = 20
+TRADING_DAYS_PER_YEAR = 252
+
+# SMA5 must clear SMA20 by this fraction for an UP/DOWN trend
+TREND_BAND = 0.01
+
+# Closes kept per symbol for the windowed indicators
+_WINDOW = max(SMA_SLOW, VOLATILITY_WINDOW + 1)
+
+# More new bars than this since the cached state rebuilds it from history
+MAX_INCREMENTAL_BARS = 5
+
+
+@dataclass(frozen=True)
+class IndicatorState:
+    """Running indicators for many symbols at once, one row per symbol.
+
+    ``advance()`` folds in one new close per symbol with vector operations, so
+    a new daily bar costs O(symbols) rather than a pass over every history.
+    Recursive indicators (EMA, Wilder RSI, peak) carry their state; windowed
+    ones (SMA, volatility) read the last closes kept in ``window``.
+    """
+
+    symbols: tuple[str, ...]
+    window: np.ndarray  # (symbols, _WINDOW) latest closes, oldest first; NaN before the first bar
+    bars: np.ndarray
+    ema_fast: np.ndarray
+    ema_slow: np.ndarray
+    avg_gain: np.ndarray
+    avg_loss: np.ndarray
+    peak: np.ndarray
+    max_drawdown: np.ndarray
+
+    @classmethod
+    def empty(cls, symbols: Iterable[str]) -> IndicatorState:
+        symbols = tuple(symbols)
+        nan = np.full(len(symbols), np.nan)
+        return cls(symbols, np.full((len(symbols), _WINDOW), np.nan), np.zeros(len(symbols), dtype=int),
+                   nan, nan, nan, nan, nan, np.zeros(len(symbols)))
+
+    @classmethod
+    def from_matrix(cls, symbols: Iterable[str], closes: np.ndarray) -> IndicatorState:
+        """State after every column of a (symbols × bars) close matrix; NaN means no bar."""
+        state = cls.empty(symbols)
+        for column in np.asarray(closes, dtype=float).T:
+            state = state.advance(column)
+        return state
+
+    def advance(self, closes: np.ndarray) -> IndicatorState:
+        """State after one more close per symbol; NaN leaves a symbol unchanged."""
+        close = np.asarray(closes, dtype=float)
+        has = ~np.isnan(close)
+        first = has & (self.bars == 0)
+        change = close - self.window[:, -1]
+        gain, loss = np.clip(change, 0, None), np.clip(-change, 0, None)
+
+        def ema(prev: np.ndarray, span: int) -> np.ndarray:
+            stepped = prev + 2 / (span + 1) * (close - prev)
+            return np.where(first, close, np.where(has, stepped, prev))
+
+        def wilder(prev: np.ndarray, move: np.ndarray) -> np.ndarray:
+            seeded = np.where(self.bars == 1, move, prev + (move - prev) / RSI_PERIOD)
+            return np.where(has & (self.bars >= 1), seeded, prev)
+
+        peak = np.where(has, np.fmax(self.peak, close), self.peak)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            drawdown = np.where(has, close / peak - 1, 0.0)
+        return replace(
+            self,
+            window=np.where(has[:, None], np.column_stack([self.window[:, 1:], close]), self.window),
+            bars=self.bars + has,
+            ema_fast=ema(self.ema_fast, EMA_FAST),
+            ema_slow=ema(self.ema_slow, EMA_SLOW),
+            avg_gain=wilder(self.avg_gain, gain),
+            avg_loss=wilder(self.avg_loss, loss),
+            peak=peak,
+            max_drawdown=np.fmin(self.max_drawdown, drawdown),
+        )
+
+    def frame(self) -> pd.DataFrame:
+        """Indicator columns indexed by symbol. Values needing more bars than seen are NaN."""
+        close = self.window[:, -1]
+        sma_fast = self.window[:, -SMA_FAST:].mean(axis=1)
+        sma_slow = self.window[:, -SMA_SLOW:].mean(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            returns = np.diff(np.log(self.window[:, -(VOLATILITY_WINDOW + 1):]), axis=1)
+            volatility = returns.std(axis=1, ddof=1) * np.sqrt(TRADING_DAYS_PER_YEAR)
+            rsi = np.where(self.avg_loss > 0, 100 - 100 / (1 + self.avg_gain / self.avg_loss),
+                           np.where(self.avg_gain > 0, 100.0, 50.0))
+            drawdown = close / self.peak - 1
+        rsi = np.where(self.bars > RSI_PERIOD, rsi, np.nan)
+        trend = np.select(
+            [sma_fast > sma_slow * (1 + TREND_BAND), sma_fast < sma_slow * (1 - TREND_BAND)],
+            ["UP", "DOWN"], "SIDEWAYS",
+        )
+        return pd.DataFrame({
+            "close": close,
+            "sma_5": sma_fast,
+            "sma_20": sma_slow,
+            "ema_12": self.ema_fast,
+            "ema_26": self.ema_slow,
+            "macd": self.ema_fast - self.ema_slow,
+            "rsi_14": rsi,
+            "volatility": volatility,
+            "drawdown": drawdown,
+            "max_drawdown": np.where(self.bars > 0, self.max_drawdown, np.nan),
+            "trend": trend,
+            "bars": self.bars,
+        }, index=pd.Index(self.symbols, name="symbol"))
+
+
+def _right_aligned(symbols: list[str], rows: pd.DataFrame, width: int) -> np.ndarray:
+    """(symbols × width) matrix of each symbol's last ``width`` closes, latest in the last column.
+
+    Symbols trade on different calendars (and MFs publish NAVs on their own
+    days), so bars are aligned by position from the latest one, not by date.
+    """
+    matrix = np.full((len(symbols), width), np.nan)
+    if rows.empty:
+        return matrix
+    rows = rows.assign(pos=rows.groupby("symbol").cumcount(ascending=False))
+    rows = rows[rows["pos"] < width]
+    index = pd.Index(symbols).get_indexer(rows["symbol"])
+    matrix[index, width - 1 - rows["pos"].to_numpy()] = rows["close"].to_numpy(dtype=float)
+    return matrix
+
+
+def compute(series: dict[str, Iterable[float]]) -> pd.DataFrame:
+    """Indicators for in-memory close series (e.g. freshly downloaded frames), in one pass."""
+    rows = pd.DataFrame(
+        [(symbol, float(c)) for symbol, closes in series.items() for c in closes if c == c],
+        columns=["symbol", "close"],
+    )
+    symbols = list(series)
+    return IndicatorState.from_matrix(symbols, _right_aligned(symbols, rows, LOOKBACK_BARS)).frame()
+
+
+def trends(series: dict[str, Iterable[float]]) -> dict[str, str]:
+    """UP / DOWN / SIDEWAYS per symbol from its SMA5/SMA20 crossover."""
+    return compute(series)["trend"].to_dict()
+
+
+def records(frame: pd.DataFrame) -> dict[str, dict]:
+    """Indicator rows by symbol with NaN as None and floats rounded, ready for JSON or display."""
+    rounded = frame.round(4).astype(object)
+    return rounded.where(rounded.notna(), None).to_dict("index")
+
+
+# --------------- Portfolio indicators from stored history ---------------
+
+@dataclass
+class _Snapshot:
+    symbols: tuple[str, ...]
+    committed: IndicatorState  # every stored bar except each symbol's latest
+    last_dates: dict[str, str]
+    frame: pd.DataFrame
+    built_on: date
+
+
+_snapshot: _Snapshot | None = None
+_snapshot_lock = threading.Lock()
+
+
+def _build(symbols: tuple[str, ...]) -> _Snapshot:
+    since = (date.today() - timedelta(days=LOOKBACK_DAYS)).isoformat()
+    rows = pd.DataFrame(get_closes_bulk(list(symbols), since), columns=["symbol", "date", "close"])
+    matrix = _right_aligned(list(symbols), rows, LOOKBACK_BARS)
+    committed = IndicatorState.from_matrix(symbols, matrix[:, :-1])
+    last_dates = rows.groupby("symbol")["date"].max().to_dict()
+    return _Snapshot(symbols, committed, last_dates, committed.advance(matrix[:, -1]).frame(), date.today())
+
+
+def _extend(snapshot: _Snapshot) -> _Snapshot | None:
+    """Fold bars stored since ``snapshot`` into it; None if it should be rebuilt."""
+    if not snapshot.last_dates:
+        # Still no stored history for any symbol (the caller checked): nothing to fold
+        return snapshot
+    symbols = list(snapshot.symbols)
+    rows = pd.DataFrame(get_closes_bulk(symbols, min(snapshot.last_dates.values())),
+                        columns=["symbol", "date", "close"])
+    # Each symbol's previously latest bar (its close may have moved since) and any newer ones
+    rows = rows[rows["date"] >= rows["symbol"].map(snapshot.last_dates)]
+    if rows.empty:
+        return None
+    width = int(rows.groupby("symbol").size().max())
+    if width - 1 > MAX_INCREMENTAL_BARS:
+        return None
+    tail = _right_aligned(symbols, rows, width)
+    committed = snapshot.committed
+    for column in tail[:, :-1].T:
+        committed = committed.advance(column)
+    last_dates = rows.groupby("symbol")["date"].max().to_dict()
+    return _Snapshot(snapshot.symbols, committed, last_dates, committed.advance(tail[:, -1]).frame(),
+                     snapshot.built_on)
+
+
+def portfolio_indicators(symbols: Iterable[str]) -> pd.DataFrame:
+    """Indicators for every symbol's stored daily history, indexed by symbol.
+
+    The result is kept between calls. New bars, and revisions of each
+    symbol's latest bar, are folded into the kept state instead of
+    re-reading every history. It is rebuilt for a different symbol set, for
+    more than MAX_INCREMENTAL_BARS new bars, and on the first call each day
+    (which also picks up backfills of older bars).
+    """
+    global _snapshot
+    symbols = tuple(sorted(set(symbols)))
+    if not symbols:
+        return IndicatorState.empty(()).frame()
+    with _snapshot_lock:
+        snapshot = _snapshot
+        reusable = (
+            snapshot is not None and snapshot.symbols == symbols and snapshot.built_on == date.today()
+            and snapshot.last_dates.keys() == get_last_history_dates(list(symbols)).keys()
+        )
+        _snapshot = (reusable and _extend(snapshot)) or _build(symbols)
+        return _snapshot.frame
+
+
+def history_symbol(category: str, symbol: str) -> str | None:
+    """Symbol a holding's daily history is stored under; None if it has none."""
+    if category == Category.PRECIOUS_METAL:
+        from services.metals_data import METAL_TICKERS
+        return METAL_TICKERS.get(symbol.upper())
+    if category == Category.SG_MF:
+        return None  # NAVs are entered by hand
+    return symbol
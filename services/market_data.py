@@ -1,99 +1,212 @@
 from __future__ import annotations
 
 import logging
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import yfinance as yf
-
-from db.database import get_cached_price, upsert_price_cache
+from db.database import (
+    bulk_upsert_price_cache,
+    get_cached_price,
+    get_cached_prices,
+    get_history_stats,
+    get_history_stats_bulk,
+    set_price_trends,
+    upsert_price_cache,
+)
 from db.models import PriceData
+from services import indicators, negative_cache
+from services.background_refresh import schedule_refresh
+from services.singleflight import price_fetches
+from services.price_history import (
+    BULK_CHUNK_SIZE,
+    cached_trend,
+    sync_history,
+    sync_history_bulk,
+)
+from utils.market_hours import effective_ttl_minutes
 
 logger = logging.getLogger(__name__)
 
 PRICE_TTL_MINUTES = 15
-ATH_TTL_MINUTES = 1440  # 24 hours
-
-
-def _compute_trend(history) -> str:
-    if history is None or len(history) < 20:
-        return "SIDEWAYS"
-    close = history["Close"]
-    sma5 = close.rolling(5).mean().iloc[-1]
-    sma20 = close.rolling(20).mean().iloc[-1]
-    if sma5 > sma20 * 1.01:
-        return "UP"
-    elif sma5 < sma20 * 0.99:
-        return "DOWN"
-    return "SIDEWAYS"
-
-
-def get_stock_price(symbol: str) -> PriceData | None:
-    cached = get_cached_price(symbol, PRICE_TTL_MINUTES)
-    if cached and cached.get("current_price"):
-        return PriceData(
-            current_price=cached["current_price"],
-            all_time_high=cached.get("all_time_high", 0),
-            all_time_low=cached.get("all_time_low", 0),
-            trend=cached.get("trend", "SIDEWAYS"),
-        )
+# ATH/ATL and trend in price_cache are rewritten by full refreshes only
+STATS_TTL_MINUTES = 60
+
+
+def _cached_price_data(cached: dict) -> PriceData:
+    return PriceData(
+        current_price=cached["current_price"],
+        all_time_high=cached.get("all_time_high", 0),
+        all_time_low=cached.get("all_time_low", 0),
+        trend=cached.get("trend", "SIDEWAYS"),
+        is_stale=bool(cached.get("is_stale")),
+        age_seconds=cached.get("age_seconds"),
+    )
+
+
+def stats_fresh(symbol: str, cached: dict) -> bool:
+    """Whether a cached row's ATH/ATL and trend are recent enough to serve.
+
+    Their ages are separate from the price's: a price-only write (the
+    monitor, manual entries) advances ``fetched_at`` but not these.
+    """
+    ttl = effective_ttl_minutes(symbol, STATS_TTL_MINUTES) * 60
+    return all(
+        cached.get(age) is not None and cached[age] <= ttl
+        for age in ("stats_age_seconds", "trend_age_seconds")
+    )
+
+
+def _cache_row(symbol: str, price_data: PriceData) -> dict:
+    return {
+        "symbol": symbol,
+        "current_price": price_data.current_price,
+        "all_time_high": price_data.all_time_high,
+        "all_time_low": price_data.all_time_low,
+        "trend": price_data.trend,
+        "currency": None,
+    }
+
+
+def _fetch_stock_price(symbol: str) -> PriceData | None:
+    """Sync local history for one symbol and derive its price data, without writing the cache.
+
+    Returns None if the provider has no data for ``symbol``; provider errors propagate.
+    """
+    # Only bars newer than the last stored date are downloaded
+    sync_history(symbol)
+    stats = get_history_stats(symbol)
+    if not stats or stats["last_close"] is None:
+        return None
 
-    try:
-        ticker = yf.Ticker(symbol)
+    return PriceData(
+        current_price=stats["last_close"],
+        all_time_high=stats["all_time_high"],
+        all_time_low=stats["all_time_low"],
+        trend=cached_trend(symbol, stats),
+    )
 
-        # Current price from recent history
-        hist_1d = ticker.history(period="5d")
-        if hist_1d.empty:
-            return None
-        current_price = float(hist_1d["Close"].iloc[-1])
 
-        # ATH/ATL from max history
-        ath_cached = get_cached_price(symbol, ATH_TTL_MINUTES)
-        if ath_cached and ath_cached.get("all_time_high"):
-            ath = ath_cached["all_time_high"]
-            atl = ath_cached["all_time_low"]
-        else:
-            hist_max = ticker.history(period="max")
-            if not hist_max.empty:
-                ath = float(hist_max["High"].max())
-                atl = float(hist_max["Low"].min())
-            else:
-                ath = current_price
-                atl = current_price
-
-        # Trend from 3-month history
-        hist_3m = ticker.history(period="3mo")
-        trend = _compute_trend(hist_3m)
-
-        price_data = PriceData(
-            current_price=current_price,
-            all_time_high=ath,
-            all_time_low=atl,
-            trend=trend,
+def _refresh_stock_price(symbol: str) -> PriceData | None:
+    key = f"stock:{symbol}"
+
+    def fetch_and_store() -> PriceData | None:
+        price_data = _fetch_stock_price(symbol)
+        if price_data:
+            upsert_price_cache(symbol, _cache_row(symbol, price_data))
+        return price_data
+
+    # Concurrent callers for the same symbol share one in-flight download;
+    # symbols that keep failing are only re-probed with exponential back-off
+    return price_fetches.do(key, lambda: negative_cache.guard(key, fetch_and_store))
+
+
+def schedule_stock_refresh(symbol: str) -> bool:
+    return schedule_refresh(f"stock:{symbol}", lambda: _refresh_stock_price(symbol))
+
+
+def get_stock_price(symbol: str, allow_stale: bool = False) -> PriceData | None:
+    """Price data for ``symbol``, from cache when fresh.
+
+    With ``allow_stale`` an expired cache entry is returned immediately
+    (flagged ``is_stale``) and refreshed in the background; only symbols that
+    were never cached block on the network. If a refresh fails, the last
+    cached price is returned instead.
+    """
+    # Outside trading hours a post-close price stays fresh until the next open
+    ttl = effective_ttl_minutes(symbol, PRICE_TTL_MINUTES)
+    cached = get_cached_price(symbol, ttl, allow_stale=True)
+    has_price = bool(cached and cached.get("current_price"))
+    outdated = has_price and (cached["is_stale"] or not stats_fresh(symbol, cached))
+    if has_price and (allow_stale or not outdated):
+        if outdated:
+            schedule_stock_refresh(symbol)
+        return _cached_price_data(cached)
+
+    price_data = _refresh_stock_price(symbol)
+    if price_data is None and has_price:
+        return _cached_price_data(cached)
+    return price_data
+
+
+def refresh_prices_bulk(
+    symbols: list[str],
+    chunk_size: int = BULK_CHUNK_SIZE,
+    download=None,
+) -> dict[str, PriceData | None]:
+    """Refresh every symbol from batched multi-ticker downloads and cache them all at once.
+
+    Current price and trend come straight from each symbol's downloaded frame;
+    ATH/ATL from the local history it was merged into. Symbols still backing
+    off after earlier failures are skipped (their result is None).
+    """
+    symbols = list(dict.fromkeys(symbols))
+    failures = negative_cache.failures([f"stock:{s}" for s in symbols])
+    skipped = {s for s in symbols if failures.get(f"stock:{s}", {}).get("is_suppressed")}
+
+    frames = sync_history_bulk([s for s in symbols if s not in skipped], chunk_size=chunk_size, download=download)
+    stats = get_history_stats_bulk([s for s, frame in frames.items() if not frame.empty])
+    # Trends for every downloaded frame in one pass
+    trends = indicators.trends({s: frames[s]["Close"] for s in stats})
+    results: dict[str, PriceData | None] = {}
+    for symbol in symbols:
+        frame = frames.get(symbol)
+        if symbol not in stats:
+            results[symbol] = None
+            continue
+        results[symbol] = PriceData(
+            current_price=float(frame["Close"].dropna().iloc[-1]),
+            all_time_high=stats[symbol]["all_time_high"],
+            all_time_low=stats[symbol]["all_time_low"],
+            trend=trends[symbol],
         )
 
-        upsert_price_cache(symbol, {
-            "current_price": current_price,
-            "all_time_high": ath,
-            "all_time_low": atl,
-            "trend": trend,
-            "currency": None,
-        })
+    set_price_trends({symbol: price_data.trend for symbol, price_data in results.items() if price_data})
+    bulk_upsert_price_cache([
+        _cache_row(symbol, price_data) for symbol, price_data in results.items() if price_data
+    ])
+
+    # An empty frame means the provider answered without data for the symbol
+    # (delisted or mistyped); symbols from failed downloads have no frame at all.
+    negative_cache.record_failure(
+        [f"stock:{s}" for s in symbols if s in frames and frames[s].empty], "no data returned",
+    )
+    negative_cache.record_success(
+        [f"stock:{s}" for s, price_data in results.items() if price_data and f"stock:{s}" in failures]
+    )
+    return results
 
-        return price_data
 
-    except Exception as e:
-        logger.warning("Failed to fetch price for %s: %s", symbol, e)
-        return None
+def refresh_stock_prices(symbols: list[str]) -> dict[str, PriceData | None]:
+    """refresh_prices_bulk() under per-symbol single-flight: symbols another
+    caller is already fetching (singly or in bulk) are joined, the rest are
+    downloaded together."""
+    keys = {f"stock:{s}": s for s in dict.fromkeys(symbols)}
+    results = price_fetches.do_many(
+        list(keys),
+        lambda led: {f"stock:{s}": p for s, p in refresh_prices_bulk([keys[k] for k in led]).items()},
+    )
+    return {keys[key]: price_data for key, price_data in results.items()}
 
 
 def batch_fetch_prices(symbols: list[str]) -> dict[str, PriceData | None]:
+    """Resolve many symbols: fresh cache hits are served from one bulk read,
+    the rest are refreshed together through refresh_prices_bulk()."""
     results = {}
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {executor.submit(get_stock_price, s): s for s in symbols}
-        for future in as_completed(futures):
-            symbol = futures[future]
-            try:
-                results[symbol] = future.result()
-            except Exception:
-                results[symbol] = None
+    cached = get_cached_prices(symbols, PRICE_TTL_MINUTES)
+    to_fetch = []
+    for symbol in dict.fromkeys(symbols):
+        row = cached.get(symbol)
+        fresh = (row is not None and row["age_seconds"] <= effective_ttl_minutes(symbol, PRICE_TTL_MINUTES) * 60
+                 and stats_fresh(symbol, row))
+        if fresh and row.get("current_price"):
+            results[symbol] = _cached_price_data(row)
+        else:
+            to_fetch.append(symbol)
+
+    if to_fetch:
+        # Sessions refreshing overlapping sets of expired symbols share the downloads
+        for symbol, price_data in refresh_stock_prices(to_fetch).items():
+            row = cached.get(symbol)
+            if price_data is None and row and row.get("current_price"):
+                # Keep serving the last good price while the symbol or its provider fails
+                price_data = _cached_price_data(row)
+            results[symbol] = price_data
     return results
@@ -2,12 +2,15 @@ from __future__ import annotations
 
 import logging
 
-import yfinance as yf
-
-from db.database import get_cached_price, upsert_price_cache
+from db.database import get_cached_price, get_history_stats, upsert_price_cache
 from db.models import PriceData
-from services.forex_data import get_exchange_rate
+from services import negative_cache
+from services.background_refresh import schedule_refresh
+from services.singleflight import price_fetches
+from services.forex_data import cross_rate
+from services.price_history import cached_trend, sync_history
 from utils.constants import TROY_OZ_TO_GRAMS
+from utils.market_hours import effective_ttl_minutes
 
 logger = logging.getLogger(__name__)
 
@@ -19,80 +22,98 @@ METAL_TICKERS = {
 METALS_TTL_MINUTES = 15
 
 
-def get_metal_price_sgd_per_gram(metal: str) -> PriceData | None:
-    """Get metal price in SGD per gram (matching OCBC buy units)."""
-    cache_key = f"METAL_{metal}_SGD"
-    cached = get_cached_price(cache_key, METALS_TTL_MINUTES)
-    if cached and cached.get("current_price"):
-        return PriceData(
-            current_price=cached["current_price"],
-            all_time_high=cached.get("all_time_high", 0),
-            all_time_low=cached.get("all_time_low", 0),
-            trend=cached.get("trend", "SIDEWAYS"),
-        )
+def metal_cache_key(metal: str) -> str:
+    return f"METAL_{metal}_SGD"
+
+
+def metal_cache_ttl_minutes(metal: str) -> float:
+    """Cache TTL for a metal, following its futures market's trading hours."""
+    ticker_symbol = METAL_TICKERS.get(metal.upper())
+    if not ticker_symbol:
+        return METALS_TTL_MINUTES
+    return effective_ttl_minutes(ticker_symbol, METALS_TTL_MINUTES)
+
+
+def _cached_price_data(cached: dict) -> PriceData:
+    return PriceData(
+        current_price=cached["current_price"],
+        all_time_high=cached.get("all_time_high", 0),
+        all_time_low=cached.get("all_time_low", 0),
+        trend=cached.get("trend", "SIDEWAYS"),
+        is_stale=cached["is_stale"],
+        age_seconds=cached["age_seconds"],
+    )
+
+
+def get_metal_price_sgd_per_gram(metal: str, allow_stale: bool = False) -> PriceData | None:
+    """Get metal price in SGD per gram (matching OCBC buy units).
+
+    With ``allow_stale`` an expired cache entry is returned immediately and
+    refreshed in the background. If a refresh fails, the last cached price
+    is returned instead.
+    """
+    cached = get_cached_price(metal_cache_key(metal), metal_cache_ttl_minutes(metal), allow_stale=True)
+    has_price = bool(cached and cached.get("current_price"))
+    if has_price and (allow_stale or not cached["is_stale"]):
+        if cached["is_stale"]:
+            schedule_metal_refresh(metal)
+        return _cached_price_data(cached)
+
+    price_data = _refresh_metal_price(metal)
+    if price_data is None and has_price:
+        return _cached_price_data(cached)
+    return price_data
+
+
+def schedule_metal_refresh(metal: str) -> bool:
+    return schedule_refresh(f"metal:{metal}", lambda: _refresh_metal_price(metal))
+
+
+def _refresh_metal_price(metal: str) -> PriceData | None:
+    key = f"metal:{metal}"
+    # Concurrent callers for the same key share one in-flight download;
+    # repeated failures back off exponentially
+    return price_fetches.do(key, lambda: negative_cache.guard(key, lambda: _fetch_metal_price(metal)))
+
 
+def _fetch_metal_price(metal: str) -> PriceData | None:
+    cache_key = metal_cache_key(metal)
     ticker_symbol = METAL_TICKERS.get(metal.upper())
     if not ticker_symbol:
         return None
 
-    try:
-        ticker = yf.Ticker(ticker_symbol)
-
-        # Current price in USD per troy ounce
-        hist_1d = ticker.history(period="5d")
-        if hist_1d.empty:
-            return None
-        price_usd_oz = float(hist_1d["Close"].iloc[-1])
-
-        # Convert: USD/troy oz -> USD/gram -> SGD/gram
-        usd_sgd = get_exchange_rate("USD", "SGD")
-        if not usd_sgd:
-            usd_sgd = 1.35  # fallback
-        price_sgd_gram = (price_usd_oz / TROY_OZ_TO_GRAMS) * usd_sgd
-
-        # ATH/ATL
-        hist_max = ticker.history(period="max")
-        if not hist_max.empty:
-            ath_usd_oz = float(hist_max["High"].max())
-            atl_usd_oz = float(hist_max["Low"].min())
-            ath_sgd = (ath_usd_oz / TROY_OZ_TO_GRAMS) * usd_sgd
-            atl_sgd = (atl_usd_oz / TROY_OZ_TO_GRAMS) * usd_sgd
-        else:
-            ath_sgd = price_sgd_gram
-            atl_sgd = price_sgd_gram
-
-        # Trend
-        hist_3m = ticker.history(period="3mo")
-        if hist_3m is not None and len(hist_3m) >= 20:
-            close = hist_3m["Close"]
-            sma5 = close.rolling(5).mean().iloc[-1]
-            sma20 = close.rolling(20).mean().iloc[-1]
-            if sma5 > sma20 * 1.01:
-                trend = "UP"
-            elif sma5 < sma20 * 0.99:
-                trend = "DOWN"
-            else:
-                trend = "SIDEWAYS"
-        else:
-            trend = "SIDEWAYS"
-
-        price_data = PriceData(
-            current_price=round(price_sgd_gram, 2),
-            all_time_high=round(ath_sgd, 2),
-            all_time_low=round(atl_sgd, 2),
-            trend=trend,
-        )
-
-        upsert_price_cache(cache_key, {
-            "current_price": price_data.current_price,
-            "all_time_high": price_data.all_time_high,
-            "all_time_low": price_data.all_time_low,
-            "trend": trend,
-            "currency": "SGD",
-        })
-
-        return price_data
-
-    except Exception as e:
-        logger.warning("Failed to fetch metal price for %s: %s", metal, e)
+    # Bars are stored in USD per troy ounce; only new ones are downloaded
+    sync_history(ticker_symbol)
+    stats = get_history_stats(ticker_symbol)
+    if not stats or stats["last_close"] is None:
         return None
+    price_usd_oz = stats["last_close"]
+
+    # Convert: USD/troy oz -> USD/gram -> SGD/gram (shares the FX matrix request)
+    usd_sgd = cross_rate("USD", "SGD")
+    if not usd_sgd:
+        usd_sgd = 1.35  # fallback
+    price_sgd_gram = (price_usd_oz / TROY_OZ_TO_GRAMS) * usd_sgd
+
+    # ATH/ATL
+    ath_sgd = (stats["all_time_high"] / TROY_OZ_TO_GRAMS) * usd_sgd
+    atl_sgd = (stats["all_time_low"] / TROY_OZ_TO_GRAMS) * usd_sgd
+
+    trend = cached_trend(ticker_symbol, stats)
+
+    price_data = PriceData(
+        current_price=round(price_sgd_gram, 2),
+        all_time_high=round(ath_sgd, 2),
+        all_time_low=round(atl_sgd, 2),
+        trend=trend,
+    )
+
+    upsert_price_cache(cache_key, {
+        "current_price": price_data.current_price,
+        "all_time_high": price_data.all_time_high,
+        "all_time_low": price_data.all_time_low,
+        "trend": trend,
+        "currency": "SGD",
+    })
+
+    return price_data
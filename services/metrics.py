@@ -0,0 +1,30 @@
+from __future__ import annotations
+
+import threading
+
+_lock = threading.Lock()
+_counters: dict[str, float] = {}
+_gauges: dict[str, float] = {}
+
+
+def incr(name: str, value: float = 1) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float) -> None:
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot(prefix: str = "") -> dict[str, float]:
+    """Current counters and gauges, optionally limited to names starting with ``prefix``."""
+    with _lock:
+        merged = {**_counters, **_gauges}
+    return {k: v for k, v in sorted(merged.items()) if k.startswith(prefix)}
+
+
+def reset() -> None:
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
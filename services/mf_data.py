@@ -1,82 +1,189 @@
 from __future__ import annotations
 
 import logging
-
-import requests
-
-from db.database import get_cached_price, upsert_price_cache
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from db.database import (
+    get_cached_price,
+    get_history_stats,
+    get_last_history_date,
+    get_mf_schemes_age,
+    replace_mf_schemes,
+    search_mf_schemes,
+    upsert_price_cache,
+    upsert_price_history,
+)
 from db.models import PriceData
+from services import http_client, negative_cache
+from services.amfi_nav import AMFI_MIN_SCHEMES, refresh_from_amfi
+from services.background_refresh import schedule_refresh
+from services.price_history import cached_trend
+from services.singleflight import price_fetches
+from services.throttle import PROVIDERS
 
 logger = logging.getLogger(__name__)
 
 BASE_URL = "https://api.mfapi.in"
 MF_TTL_MINUTES = 30
 
+# New schemes are rare; the local search index is rebuilt once a day
+SCHEME_INDEX_TTL_HOURS = 24
 
-def search_mutual_funds(query: str) -> list[dict]:
-    try:
-        resp = requests.get(f"{BASE_URL}/mf/search", params={"q": query}, timeout=10)
-        resp.raise_for_status()
-        return resp.json()
-    except Exception as e:
-        logger.warning("MF search failed: %s", e)
-        return []
 
+def refresh_scheme_index() -> int:
+    """Download mfapi's full scheme list into the local search index. Returns schemes indexed."""
+    schemes = http_client.get_json(f"{BASE_URL}/mf", timeout=30, budget=60)
+    return replace_mf_schemes([(str(s["schemeCode"]), s["schemeName"]) for s in schemes if s.get("schemeName")])
 
-def get_mf_price_data(scheme_code: str) -> PriceData | None:
-    cached = get_cached_price(scheme_code, MF_TTL_MINUTES)
-    if cached and cached.get("current_price"):
-        return PriceData(
-            current_price=cached["current_price"],
-            all_time_high=cached.get("all_time_high", 0),
-            all_time_low=cached.get("all_time_low", 0),
-            trend=cached.get("trend", "SIDEWAYS"),
-        )
 
+def search_mutual_funds(query: str, limit: int = 10) -> list[dict]:
+    """Search schemes by name in the local index ([{"schemeCode", "schemeName"}], best first).
+
+    The index is built on first use and refreshed in the background once a
+    day; mfapi's search endpoint is only used while it cannot be built.
+    """
+    age = get_mf_schemes_age()
     try:
-        resp = requests.get(f"{BASE_URL}/mf/{scheme_code}", timeout=15)
-        resp.raise_for_status()
-        data = resp.json()
-
-        nav_history = data.get("data", [])
-        if not nav_history:
-            return None
-
-        current_nav = float(nav_history[0]["nav"])
-        all_navs = [float(d["nav"]) for d in nav_history]
-        ath = max(all_navs)
-        atl = min(all_navs)
-
-        # Trend: compare current vs 30 days ago
-        if len(all_navs) > 30:
-            nav_30d = all_navs[30]
-            pct_change = (current_nav - nav_30d) / nav_30d * 100
-            if pct_change > 1:
-                trend = "UP"
-            elif pct_change < -1:
-                trend = "DOWN"
-            else:
-                trend = "SIDEWAYS"
-        else:
-            trend = "SIDEWAYS"
-
-        price_data = PriceData(
-            current_price=current_nav,
-            all_time_high=ath,
-            all_time_low=atl,
-            trend=trend,
+        if age is None:
+            refresh_scheme_index()
+        elif age > SCHEME_INDEX_TTL_HOURS * 3600:
+            schedule_refresh("mf-scheme-index", refresh_scheme_index)
+    except Exception as e:
+        logger.warning("MF scheme index refresh failed, searching remotely: %s", e)
+        try:
+            return http_client.get_json(f"{BASE_URL}/mf/search", params={"q": query}, timeout=10)[:limit]
+        except Exception as e:
+            logger.warning("MF search failed: %s", e)
+            return []
+
+    return [
+        {"schemeCode": r["scheme_code"], "schemeName": r["scheme_name"]}
+        for r in search_mf_schemes(query, limit)
+    ]
+
+
+def _cached_price_data(cached: dict) -> PriceData:
+    return PriceData(
+        current_price=cached["current_price"],
+        all_time_high=cached.get("all_time_high", 0),
+        all_time_low=cached.get("all_time_low", 0),
+        trend=cached.get("trend", "SIDEWAYS"),
+        is_stale=cached["is_stale"],
+        age_seconds=cached["age_seconds"],
+    )
+
+
+def get_mf_price_data(scheme_code: str, allow_stale: bool = False) -> PriceData | None:
+    """NAV data for a scheme, from cache when fresh.
+
+    With ``allow_stale`` an expired entry is returned immediately and
+    refreshed in the background. If a refresh fails, the last cached NAV is
+    returned instead.
+    """
+    cached = get_cached_price(scheme_code, MF_TTL_MINUTES, allow_stale=True)
+    has_price = bool(cached and cached.get("current_price"))
+    if has_price and (allow_stale or not cached["is_stale"]):
+        if cached["is_stale"]:
+            schedule_mf_refresh(scheme_code)
+        return _cached_price_data(cached)
+
+    price_data = _refresh_mf_price(scheme_code)
+    if price_data is None and has_price:
+        return _cached_price_data(cached)
+    return price_data
+
+
+def schedule_mf_refresh(scheme_code: str) -> bool:
+    return schedule_refresh(f"mf:{scheme_code}", lambda: _refresh_mf_price(scheme_code))
+
+
+def _refresh_mf_price(scheme_code: str) -> PriceData | None:
+    key = f"mf:{scheme_code}"
+    # Concurrent callers for the same key share one in-flight download;
+    # repeated failures back off exponentially
+    return price_fetches.do(key, lambda: negative_cache.guard(key, lambda: _fetch_mf_price(scheme_code)))
+
+
+def refresh_mf_prices_bulk(scheme_codes: list[str]) -> dict[str, PriceData | None]:
+    """Refresh many schemes at once: one AMFI NAV file for every scheme whose
+    history is up to date, concurrent per-scheme mfapi requests for the rest."""
+    scheme_codes = list(dict.fromkeys(scheme_codes))
+    results: dict[str, PriceData | None] = {}
+    if len(scheme_codes) >= AMFI_MIN_SCHEMES:
+        try:
+            results.update(refresh_from_amfi(scheme_codes))
+        except Exception as e:
+            logger.warning("AMFI NAV file refresh failed: %s", e)
+    remaining = [code for code in scheme_codes if code not in results]
+    if len(remaining) > 1:
+        with ThreadPoolExecutor(max_workers=PROVIDERS["mfapi"].limiter.maximum) as executor:
+            results.update(zip(remaining, executor.map(_refresh_mf_price, remaining)))
+    else:
+        results.update((code, _refresh_mf_price(code)) for code in remaining)
+    return results
+
+
+def _navs_from_payload(payload: dict) -> list[dict]:
+    """Parse an mfapi payload into price_history bars (close = NAV), oldest first.
+
+    Conversion is vectorized: full payloads carry a row per business day
+    since the scheme's launch.
+    """
+    frame = pd.DataFrame.from_records(payload.get("data") or [], columns=["date", "nav"])
+    if frame.empty:
+        return []
+    dates = pd.to_datetime(frame["date"], format="%d-%m-%Y", errors="coerce")
+    navs = pd.to_numeric(frame["nav"], errors="coerce")
+    valid = dates.notna() & (navs > 0)
+    bars = pd.DataFrame({"date": dates[valid].dt.strftime("%Y-%m-%d"), "close": navs[valid]})
+    return bars.drop_duplicates("date").sort_values("date").to_dict("records")
+
+
+def sync_nav_history(scheme_code: str) -> int:
+    """Bring the local NAV history for a scheme up to date. Returns NAVs written.
+
+    The full history is downloaded once. After that only /latest is asked
+    for, unless a business day was missed since the last stored NAV; then the
+    history from that date onwards is requested.
+    """
+    last_date = get_last_history_date(scheme_code)
+    if last_date is None:
+        payload = http_client.get_json(f"{BASE_URL}/mf/{scheme_code}", timeout=15)
+        return upsert_price_history(scheme_code, _navs_from_payload(payload))
+
+    bars = _navs_from_payload(http_client.get_json(f"{BASE_URL}/mf/{scheme_code}/latest", timeout=10))
+    if bars and np.busday_count(last_date, bars[-1]["date"]) > 1:
+        payload = http_client.get_json(
+            f"{BASE_URL}/mf/{scheme_code}",
+            params={"startDate": last_date, "endDate": bars[-1]["date"]},
+            timeout=15,
         )
+        bars = _navs_from_payload(payload)
+    return upsert_price_history(scheme_code, [b for b in bars if b["date"] >= last_date])
 
-        upsert_price_cache(scheme_code, {
-            "current_price": current_nav,
-            "all_time_high": ath,
-            "all_time_low": atl,
-            "trend": trend,
-            "currency": "INR",
-        })
 
-        return price_data
-
-    except Exception as e:
-        logger.warning("Failed to fetch MF data for %s: %s", scheme_code, e)
+def _fetch_mf_price(scheme_code: str) -> PriceData | None:
+    sync_nav_history(scheme_code)
+    stats = get_history_stats(scheme_code)
+    if not stats or stats["last_close"] is None:
         return None
+
+    price_data = PriceData(
+        current_price=stats["last_close"],
+        all_time_high=stats["all_time_high"],
+        all_time_low=stats["all_time_low"],
+        trend=cached_trend(scheme_code, stats),
+    )
+
+    upsert_price_cache(scheme_code, {
+        "current_price": price_data.current_price,
+        "all_time_high": price_data.all_time_high,
+        "all_time_low": price_data.all_time_low,
+        "trend": price_data.trend,
+        "currency": "INR",
+    })
+
+    return price_data
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import logging
+from typing import Callable, TypeVar
+
+from db.database import clear_fetch_failures, get_fetch_failures, record_fetch_failures
+from services import metrics
+from services.throttle import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+# A failing key is re-probed after 5 minutes, then 10, 20 ... up to once a day
+RETRY_BASE_SECONDS = 300
+RETRY_MAX_SECONDS = 24 * 60 * 60
+
+T = TypeVar("T")
+
+
+def failures(keys: list[str]) -> dict[str, dict]:
+    """Recorded failure rows for ``keys``, whether or not they are still backing off."""
+    return get_fetch_failures(keys)
+
+
+def suppressed(keys: list[str]) -> dict[str, dict]:
+    """Failure rows for the keys that are still backing off."""
+    return {k: row for k, row in get_fetch_failures(keys).items() if row["is_suppressed"]}
+
+
+def record_failure(keys: list[str], error: str) -> None:
+    if not keys:
+        return
+    record_fetch_failures(keys, error, RETRY_BASE_SECONDS, RETRY_MAX_SECONDS)
+    metrics.incr("negative_cache.recorded", len(keys))
+
+
+def record_success(keys: list[str]) -> None:
+    clear_fetch_failures(keys)
+
+
+def guard(key: str, fetch: Callable[[], T | None]) -> T | None:
+    """Run ``fetch`` for ``key`` unless it failed recently.
+
+    A None result or an exception counts as a failure and backs the key off
+    exponentially; a result clears it. An open circuit breaker is a provider
+    outage rather than a problem with ``key``, so it is not recorded.
+    """
+    failure = get_fetch_failures([key]).get(key)
+    if failure and failure["is_suppressed"]:
+        metrics.incr("negative_cache.hits")
+        return None
+
+    try:
+        result = fetch()
+    except CircuitOpenError as e:
+        logger.info("Skipping %s: %s", key, e)
+        return None
+    except Exception as e:
+        logger.warning("Fetch failed for %s: %s", key, e)
+        record_failure([key], str(e))
+        return None
+
+    if result is None:
+        record_failure([key], "no data returned")
+    elif failure:
+        record_success([key])
+    return result
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import pandas as pd
+
+from db.database import get_holdings
+from db.models import PriceData
+from services.indicators import history_symbol, portfolio_indicators
+from services.price_resolver import cached_prices, price_cache_key, resolve_prices
+from services.valuation import Valuation, lots_frame, value_holdings
+
+# Lot column -> portfolio_indicators() column
+INDICATOR_COLUMNS = {"rsi": "rsi_14", "volatility": "volatility", "drawdown": "drawdown"}
+
+
+def priced_lots(holdings: list[dict], prices: dict[str, PriceData | None],
+                universe: list[dict] | None = None) -> pd.DataFrame:
+    """lots_frame() for ``holdings`` priced from ``prices`` (keyed by price_cache_key()),
+    with the INDICATOR_COLUMNS from each holding's stored history.
+
+    Indicators are computed over ``universe`` (default ``holdings``). Pass
+    the whole portfolio when valuing it in parts, so every part reuses
+    portfolio_indicators()' kept state.
+    """
+    lots = lots_frame(holdings, [prices.get(price_cache_key(h["category"], h["symbol"])) for h in holdings])
+    history_symbols = {history_symbol(h["category"], h["symbol"]) for h in universe or holdings}
+    indicators = portfolio_indicators(s for s in history_symbols if s)
+    lot_symbols = [history_symbol(h["category"], h["symbol"]) for h in holdings]
+    lots[list(INDICATOR_COLUMNS)] = indicators.reindex(lot_symbols)[list(INDICATOR_COLUMNS.values())].to_numpy()
+    return lots
+
+
+def value_portfolio(categories: list[str] | None = None, base: str = "SGD",
+                    offline: bool = False) -> Valuation:
+    """Value the stored portfolio, or only ``categories``, in ``base``.
+
+    Expired prices are refetched in bulk, every asset class concurrently,
+    and waited for, as is any buy-date FX history not stored yet. ``offline`` values from price_cache and cached FX rates
+    only: nothing is requested, and holdings never priced are valued at
+    their buy price.
+    """
+    holdings = get_holdings()
+    if categories:
+        holdings = [h for h in holdings if h["category"] in categories]
+    prices = cached_prices(holdings) if offline else resolve_prices(holdings, wait_for_fresh=True)
+    return value_holdings(priced_lots(holdings, prices), base, offline=offline, wait_for_fresh=not offline)
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import logging
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import pandas as pd
+import yfinance as yf
+
+from db.database import (
+    get_last_history_date,
+    get_last_history_dates,
+    get_price_history,
+    replace_price_history,
+    set_price_trends,
+    transaction,
+    upsert_price_history,
+)
+from services import indicators
+from services.throttle import PROVIDERS, provider_slot
+
+logger = logging.getLogger(__name__)
+
+# If the re-fetched copy of the last stored bar moved by more than this, the
+# provider has re-adjusted history (split/dividend) and we backfill again.
+ADJUSTMENT_TOLERANCE = 0.005
+
+# Calendar days of local history loaded for trend computation (~3 months)
+TREND_LOOKBACK_DAYS = 100
+
+# A cached trend is recomputed after this long even without a new daily bar,
+# since the latest bar keeps moving during the session
+TREND_TTL_MINUTES = 60
+
+# Tickers per multi-symbol yf.download request
+BULK_CHUNK_SIZE = 100
+
+# Latency above which a multi-ticker incremental download counts as slow for the
+# yfinance limiter (single quotes use the provider's default). Full-history
+# downloads take as long as the history is, so their latency is not judged at all.
+BULK_LATENCY_TARGET = 30.0
+
+
+def _bars_from_frame(history: pd.DataFrame) -> list[dict]:
+    if history is None or history.empty:
+        return []
+    frame = history.dropna(subset=["Close"])
+    dates = frame.index.strftime("%Y-%m-%d")
+    volume = frame["Volume"] if "Volume" in frame else [None] * len(frame)
+    return [
+        {"date": d, "open": float(o), "high": float(h), "low": float(lo), "close": float(c),
+         "volume": float(v) if v is not None else None}
+        for d, o, h, lo, c, v in zip(dates, frame["Open"], frame["High"], frame["Low"], frame["Close"], volume)
+    ]
+
+
+def _latency_target(kwargs: dict, default: float | None) -> float | None:
+    return math.inf if kwargs.get("period") == "max" else default
+
+
+def _history(ticker: yf.Ticker, **kwargs) -> pd.DataFrame:
+    with provider_slot("yfinance", _latency_target(kwargs, None)):
+        return ticker.history(**kwargs)
+
+
+def _is_readjusted(symbol: str, last_date: str, bars: list[dict]) -> bool:
+    stored = get_price_history(symbol, since=last_date)
+    fetched = next((b for b in bars if b["date"] == last_date), None)
+    if not stored or not fetched or not stored[0]["close"]:
+        return False
+    return abs(fetched["close"] / stored[0]["close"] - 1) > ADJUSTMENT_TOLERANCE
+
+
+def _backfill(symbol: str, ticker: yf.Ticker) -> int:
+    """Replace the stored history with a fresh period="max" download.
+
+    The download comes first and the swap is one transaction, so a failed or
+    empty download leaves the stored history as it was.
+    """
+    logger.info("History for %s was re-adjusted upstream; backfilling", symbol)
+    bars = _bars_from_frame(_history(ticker, period="max"))
+    if not bars:
+        logger.warning("Backfill for %s returned no data; keeping the stored history", symbol)
+    return replace_price_history(symbol, bars)
+
+
+def sync_history(symbol: str, ticker: yf.Ticker | None = None) -> int:
+    """Bring the local price_history for ``symbol`` up to date.
+
+    The full history is downloaded once; later calls only fetch bars from the
+    last stored date onwards (that bar is re-fetched because it may have been
+    partial). Returns number of bars written.
+    """
+    ticker = ticker or yf.Ticker(symbol)
+    last_date = get_last_history_date(symbol)
+
+    if last_date is None:
+        bars = _bars_from_frame(_history(ticker, period="max"))
+        return upsert_price_history(symbol, bars)
+
+    bars = _bars_from_frame(_history(ticker, start=last_date))
+    if _is_readjusted(symbol, last_date, bars):
+        return _backfill(symbol, ticker)
+    return upsert_price_history(symbol, bars)
+
+
+def _split_download(data: pd.DataFrame, chunk: list[str]) -> dict[str, pd.DataFrame]:
+    if data is None or data.empty:
+        return {}
+    if isinstance(data.columns, pd.MultiIndex):
+        present = set(data.columns.get_level_values(0))
+        return {s: data[s].dropna(how="all") for s in chunk if s in present}
+    # A single-ticker download may come back with flat columns
+    return {chunk[0]: data.dropna(how="all")} if len(chunk) == 1 else {}
+
+
+def sync_history_bulk(
+    symbols: list[str],
+    chunk_size: int = BULK_CHUNK_SIZE,
+    download=None,
+) -> dict[str, pd.DataFrame]:
+    """Bring history for many symbols up to date with multi-ticker downloads.
+
+    Symbols never seen before are backfilled with period="max"; the rest share
+    one download per chunk starting at the oldest of their last stored dates
+    (and at least TREND_LOOKBACK_DAYS back, so callers can compute trend from
+    the returned frames). Chunks are downloaded concurrently under the
+    yfinance rate limiter and each chunk's bars are written in one transaction.
+    Returns the downloaded frame per symbol. Symbols the provider returned
+    no data for map to an empty frame; symbols whose download failed are absent.
+    """
+    download = download or yf.download
+    symbols = list(dict.fromkeys(symbols))
+    last_dates = get_last_history_dates(symbols)
+    window_start = (date.today() - timedelta(days=TREND_LOOKBACK_DAYS)).isoformat()
+
+    new = [s for s in symbols if s not in last_dates]
+    known = [s for s in symbols if s in last_dates]
+
+    jobs = []
+    for group, period in ((new, "max"), (known, None)):
+        for i in range(0, len(group), chunk_size):
+            chunk = group[i:i + chunk_size]
+            kwargs = {"period": period} if period else {
+                "start": min([window_start, *(last_dates[s] for s in chunk)]),
+            }
+            jobs.append((chunk, kwargs))
+
+    def fetch(chunk: list[str], kwargs: dict) -> pd.DataFrame:
+        with provider_slot("yfinance", _latency_target(kwargs, BULK_LATENCY_TARGET)):
+            return download(chunk, group_by="ticker", auto_adjust=True,
+                            progress=False, threads=True, **kwargs)
+
+    # Chunks download in parallel, as far as the yfinance limiter allows;
+    # results are written from this thread as each one completes.
+    frames: dict[str, pd.DataFrame] = {}
+    readjusted = []
+    with ThreadPoolExecutor(max_workers=PROVIDERS["yfinance"].limiter.maximum) as executor:
+        futures = {executor.submit(fetch, chunk, kwargs): chunk for chunk, kwargs in jobs}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                data = future.result()
+            except Exception as e:
+                logger.warning("Bulk history download failed for %d symbols: %s", len(chunk), e)
+                continue
+
+            chunk_frames = _split_download(data, chunk)
+            with transaction():
+                for symbol in chunk:
+                    frame = chunk_frames.get(symbol)
+                    bars = _bars_from_frame(frame)
+                    if not bars:
+                        frames[symbol] = pd.DataFrame()
+                        continue
+                    if symbol in last_dates and _is_readjusted(symbol, last_dates[symbol], bars):
+                        readjusted.append(symbol)
+                        continue
+                    upsert_price_history(symbol, bars)
+                    frames[symbol] = frame
+
+    for symbol in readjusted:
+        try:
+            _backfill(symbol, yf.Ticker(symbol))
+        except Exception as e:
+            logger.warning("Backfill failed for %s: %s", symbol, e)
+        frames[symbol] = load_history(symbol, days=TREND_LOOKBACK_DAYS)
+    return frames
+
+
+def load_history(symbol: str, days: int | None = None) -> pd.DataFrame:
+    """Stored bars as a DataFrame (Open/High/Low/Close/Volume) indexed by date."""
+    since = (date.today() - timedelta(days=days)).isoformat() if days else None
+    rows = get_price_history(symbol, since=since)
+    frame = pd.DataFrame(rows, columns=["date", "open", "high", "low", "close", "volume"])
+    frame = frame.rename(columns=str.capitalize).set_index("Date")
+    frame.index = pd.to_datetime(frame.index)
+    return frame
+
+
+def cached_trend(symbol: str, stats: dict) -> str:
+    """Trend from the price_stats row, recomputed from local history once it has expired."""
+    if stats.get("trend") and stats["trend_age_seconds"] <= TREND_TTL_MINUTES * 60:
+        return stats["trend"]
+    trend = indicators.trends({symbol: load_history(symbol, days=TREND_LOOKBACK_DAYS)["Close"]})[symbol]
+    set_price_trends({symbol: trend})
+    return trend
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator
+
+from db.database import get_cached_prices
+from db.models import PriceData
+from services import metrics
+from services.amfi_nav import AMFI_MIN_SCHEMES
+from services.background_refresh import schedule_refresh
+from services.forex_data import get_fx_matrix
+from services.market_data import PRICE_TTL_MINUTES, batch_fetch_prices, schedule_stock_refresh, stats_fresh
+from services.metals_data import (
+    get_metal_price_sgd_per_gram,
+    metal_cache_key,
+    metal_cache_ttl_minutes,
+    schedule_metal_refresh,
+)
+from services.mf_data import MF_TTL_MINUTES, refresh_mf_prices_bulk, schedule_mf_refresh
+from utils.constants import Category
+from utils.market_hours import effective_ttl_minutes
+
+logger = logging.getLogger(__name__)
+
+STOCK_CATEGORIES = (Category.INDIAN_STOCK, Category.SG_STOCK, Category.US_STOCK)
+
+# Cache TTL per category; None means the cached value never expires (manual NAV entries).
+# Stock and metal TTLs also stretch while their market is closed.
+CACHE_TTL_MINUTES = {
+    Category.INDIAN_STOCK: lambda symbol: effective_ttl_minutes(symbol, PRICE_TTL_MINUTES),
+    Category.SG_STOCK: lambda symbol: effective_ttl_minutes(symbol, PRICE_TTL_MINUTES),
+    Category.US_STOCK: lambda symbol: effective_ttl_minutes(symbol, PRICE_TTL_MINUTES),
+    Category.INDIAN_MF: lambda symbol: MF_TTL_MINUTES,
+    Category.PRECIOUS_METAL: metal_cache_ttl_minutes,
+    Category.SG_MF: lambda symbol: None,
+}
+
+
+def price_cache_key(category: str, symbol: str) -> str:
+    """Key a holding's price is cached under in price_cache."""
+    if category == Category.PRECIOUS_METAL:
+        return metal_cache_key(symbol)
+    return symbol
+
+
+def _asset_class(category: str) -> str | None:
+    """Fetcher group for a category; None for prices that are only entered by hand."""
+    if category in STOCK_CATEGORIES:
+        return "stock"
+    if category == Category.INDIAN_MF:
+        return "mf"
+    if category == Category.PRECIOUS_METAL:
+        return "metal"
+    return None
+
+
+def _price_from_cache(row: dict, is_stale: bool = False) -> PriceData:
+    return PriceData(
+        current_price=row["current_price"],
+        all_time_high=row.get("all_time_high") or 0,
+        all_time_low=row.get("all_time_low") or 0,
+        trend=row.get("trend") or "SIDEWAYS",
+        is_stale=is_stale,
+        age_seconds=row["age_seconds"],
+    )
+
+
+def _is_stale(category: str, symbol: str, row: dict) -> bool:
+    ttl = CACHE_TTL_MINUTES[category](symbol)
+    return ttl is not None and row["age_seconds"] > ttl * 60
+
+
+def cached_prices(holdings: list[dict]) -> dict[str, PriceData | None]:
+    """Prices for every holding from price_cache alone, keyed by price_cache_key().
+
+    Nothing is fetched or scheduled; expired entries are marked stale.
+    """
+    keys = {price_cache_key(h["category"], h["symbol"]): h for h in holdings}
+    cached = get_cached_prices(list(keys))
+    prices: dict[str, PriceData | None] = {}
+    for key, h in keys.items():
+        row = cached.get(key)
+        if row and row.get("current_price"):
+            prices[key] = _price_from_cache(row, is_stale=_is_stale(h["category"], h["symbol"], row))
+        else:
+            prices[key] = None
+    return prices
+
+
+def _schedule_stale_refreshes(stale: dict[str, list[str]]) -> None:
+    """Revalidate stale entries in the background: stocks in one batched download,
+    MFs from one AMFI file when there are enough of them, metals one by one."""
+    if len(stale["stock"]) > 1:
+        symbols = sorted(stale["stock"])
+        schedule_refresh("stock-bulk:" + ",".join(symbols), lambda: batch_fetch_prices(symbols))
+    else:
+        for symbol in stale["stock"]:
+            schedule_stock_refresh(symbol)
+
+    if len(stale["mf"]) >= AMFI_MIN_SCHEMES:
+        codes = list(stale["mf"])
+        schedule_refresh("mf-bulk", lambda: refresh_mf_prices_bulk(codes))
+    else:
+        for code in stale["mf"]:
+            schedule_mf_refresh(code)
+
+    for metal in stale["metal"]:
+        schedule_metal_refresh(metal)
+
+
+def _fetch_tasks(to_fetch: dict[str, list[str]]) -> dict[str, tuple[list[str], Callable[[], dict]]]:
+    """One task per asset class (per metal): the cache keys it resolves and a
+    callable returning their prices by cache key."""
+    tasks: dict[str, tuple[list[str], Callable[[], dict]]] = {}
+    if to_fetch["stock"]:
+        tasks["stock"] = (to_fetch["stock"], lambda: batch_fetch_prices(to_fetch["stock"]))
+    if to_fetch["mf"]:
+        tasks["mf"] = (to_fetch["mf"], lambda: refresh_mf_prices_bulk(to_fetch["mf"]))
+    for metal in to_fetch["metal"]:
+        key = metal_cache_key(metal)
+        tasks[f"metal:{metal}"] = ([key], lambda metal=metal, key=key: {key: get_metal_price_sgd_per_gram(metal)})
+    return tasks
+
+
+def _prefetch_fx() -> dict[str, PriceData | None]:
+    get_fx_matrix()
+    return {}
+
+
+def _timed(name: str, task: Callable[[], dict[str, PriceData | None]]) -> dict[str, PriceData | None]:
+    start = time.perf_counter()
+    try:
+        return task()
+    finally:
+        metrics.set_gauge(f"resolve.{name}.seconds", time.perf_counter() - start)
+
+
+def iter_prices(holdings: list[dict],
+                wait_for_fresh: bool = False) -> Iterator[tuple[dict[str, PriceData | None], int]]:
+    """resolve_prices() as it progresses: ``(prices, pending)`` batches keyed by price_cache_key().
+
+    The first batch has every price that needs no fetch. It is yielded
+    before any network round trip, with the fetches already running. Each
+    later batch has one fetch's prices, in the order the fetches complete.
+    ``pending`` counts the fetches still running.
+    """
+    holdings_by_key = {price_cache_key(h["category"], h["symbol"]): h for h in holdings}
+    cached = get_cached_prices(list(holdings_by_key))
+
+    prices: dict[str, PriceData | None] = {}
+    stale: dict[str, list[str]] = {"stock": [], "mf": [], "metal": []}
+    to_fetch: dict[str, list[str]] = {"stock": [], "mf": [], "metal": []}
+    for key, h in holdings_by_key.items():
+        category, symbol = h["category"], h["symbol"]
+        asset_class = _asset_class(category)
+        row = cached.get(key)
+        if row and row.get("current_price"):
+            if not _is_stale(category, symbol, row):
+                prices[key] = _price_from_cache(row)
+                if asset_class == "stock" and not stats_fresh(symbol, row):
+                    # The price is current but ATH/ATL or trend predate it
+                    stale["stock"].append(symbol)
+                continue
+            if not wait_for_fresh:
+                prices[key] = _price_from_cache(row, is_stale=True)
+                stale[asset_class].append(symbol)
+                continue
+        if asset_class is None:
+            prices[key] = None
+        else:
+            to_fetch[asset_class].append(symbol)
+
+    _schedule_stale_refreshes(stale)
+
+    tasks = _fetch_tasks(to_fetch)
+    if not tasks:
+        yield prices, 0
+        return
+
+    # Converting to SGD needs the FX matrix right after; fetch it alongside the prices
+    tasks["fx"] = ([], _prefetch_fx)
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="price-resolve") as executor:
+        futures = {executor.submit(_timed, name, task): (name, keys) for name, (keys, task) in tasks.items()}
+        yield prices, len(futures)
+
+        for done, future in enumerate(as_completed(futures), start=1):
+            name, keys = futures[future]
+            try:
+                fetched = future.result()
+            except Exception as e:
+                logger.warning("Price fetch failed for %s: %s", name, e)
+                fetched = {}
+            batch: dict[str, PriceData | None] = {}
+            for key in keys:
+                price = fetched.get(key)
+                row = cached.get(key)
+                if price is None and row and row.get("current_price"):
+                    # Keep showing the last known price while its provider fails
+                    price = _price_from_cache(row, is_stale=True)
+                batch[key] = price
+            yield batch, len(futures) - done
+
+
+def resolve_prices(holdings: list[dict], wait_for_fresh: bool = False) -> dict[str, PriceData | None]:
+    """Prices for every holding, keyed by price_cache_key().
+
+    Fresh cache entries come from one bulk read. Stale ones are served as-is
+    and revalidated in the background, unless ``wait_for_fresh``. Whatever
+    has to be fetched now is fetched concurrently per asset class: stocks in
+    one batched download, Indian MF NAVs in parallel (or from one AMFI file),
+    each metal, and the FX matrix the conversions need. A cold load takes
+    about as long as the slowest of them. A fetch that fails falls back to
+    the last cached price.
+    """
+    prices: dict[str, PriceData | None] = {}
+    for batch, _ in iter_prices(holdings, wait_for_fresh):
+        prices.update(batch)
+    return prices
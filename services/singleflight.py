@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, TypeVar
+
+from services import metrics
+
+T = TypeVar("T")
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait and receive the same result (or exception). Once it
+    finishes the key is released, so later calls execute again — this is
+    deduplication of in-flight work, not a cache.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        metrics.incr(f"singleflight.{self._name}.calls")
+        if not leader:
+            metrics.incr(f"singleflight.{self._name}.coalesced")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        metrics.incr(f"singleflight.{self._name}.executions")
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def do_many(self, keys: list[str], fn: Callable[[list[str]], dict[str, T]]) -> dict[str, T]:
+        """do() for many keys with one bulk execution.
+
+        Keys already in flight (from do() or another do_many()) are joined;
+        ``fn`` runs once for the rest and returns a result per key (missing
+        keys resolve to None). Returns a result for every key.
+        """
+        keys = list(dict.fromkeys(keys))
+        led: dict[str, _Call] = {}
+        joined: dict[str, _Call] = {}
+        with self._lock:
+            for key in keys:
+                call = self._calls.get(key)
+                if call is None:
+                    led[key] = self._calls[key] = _Call()
+                else:
+                    joined[key] = call
+
+        metrics.incr(f"singleflight.{self._name}.calls", len(keys))
+        if joined:
+            metrics.incr(f"singleflight.{self._name}.coalesced", len(joined))
+
+        results: dict[str, T] = {}
+        if led:
+            metrics.incr(f"singleflight.{self._name}.executions")
+            try:
+                fetched = fn(list(led))
+                for key, call in led.items():
+                    call.result = results[key] = fetched.get(key)
+            except BaseException as e:
+                for call in led.values():
+                    call.error = e
+                raise
+            finally:
+                with self._lock:
+                    for key in led:
+                        del self._calls[key]
+                for call in led.values():
+                    call.done.set()
+
+        for key, call in joined.items():
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            results[key] = call.result
+        return {key: results[key] for key in keys}
+
+    def stats(self) -> dict[str, float]:
+        return metrics.snapshot(f"singleflight.{self._name}.")
+
+
+# Process-wide: Streamlit sessions, the monitor thread and AI tools all share it
+price_fetches = SingleFlight("price")
@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator
+
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Classic token bucket: ``rate`` requests per second with bursts up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Block until a token is available. Returns seconds spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class AdaptiveLimiter:
+    """Concurrency limit tuned by AIMD.
+
+    Each success under ``latency_target`` grows the limit by roughly one slot
+    per window of requests (additive increase); an error, a throttle response
+    or a slow call halves it (multiplicative decrease).
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self) -> None:
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, ok: bool, latency: float, latency_target: float | None = None) -> None:
+        """Return a slot; ``latency_target`` overrides the default for this call's kind."""
+        target = self.latency_target if latency_target is None else latency_target
+        with self._cond:
+            self._in_flight -= 1
+            if ok and latency <= target:
+                self._limit = min(self.maximum, self._limit + 1 / self._limit)
+            else:
+                self._limit = max(self.minimum, self._limit / 2)
+            self._cond.notify_all()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(f"{provider} is unavailable; retrying in {retry_in:.0f}s")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Stops calling a provider after ``failure_threshold`` consecutive failures.
+
+    While open, calls are rejected without touching the network. Once
+    ``reset_timeout`` has passed a single probe call is let through
+    (half-open): success closes the circuit, failure re-opens it with the
+    timeout doubled, up to ``max_reset_timeout``.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 max_reset_timeout: float = 600.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._timeout = reset_timeout
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._retry_in() == 0:
+                return self.HALF_OPEN
+            return self._state
+
+    def _retry_in(self) -> float:
+        return max(0.0, self._opened_at + self._timeout - time.monotonic())
+
+    def retry_in(self) -> float:
+        """Seconds until the next probe is allowed (0 unless open)."""
+        with self._lock:
+            return self._retry_in() if self._state == self.OPEN else 0.0
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and self._retry_in() == 0:
+                self._state = self.HALF_OPEN
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, ok: bool) -> bool:
+        """Record a call's result. Returns True if this failure opened the circuit."""
+        with self._lock:
+            if ok:
+                self._state = self.CLOSED
+                self._failures = 0
+                self._timeout = self.reset_timeout
+                self._probing = False
+                return False
+            self._failures += 1
+            if self._state == self.HALF_OPEN:
+                self._timeout = min(self.max_reset_timeout, self._timeout * 2)
+            elif self._state == self.OPEN or self._failures < self.failure_threshold:
+                return False
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+            return True
+
+
+_STATE_GAUGE = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+
+@dataclass
+class CallOutcome:
+    ok: bool = True
+    throttled: bool = False
+
+    def fail(self, throttled: bool = False) -> None:
+        self.ok = False
+        self.throttled = self.throttled or throttled
+
+
+def _is_throttle_error(error: BaseException) -> bool:
+    # requests.HTTPError with a 429 response, or yfinance's YFRateLimitError
+    response = getattr(error, "response", None)
+    return getattr(response, "status_code", None) == 429 or "RateLimit" in type(error).__name__
+
+
+class Provider:
+    def __init__(self, name: str, rate: float, burst: float,
+                 initial: int, minimum: int, maximum: int, latency_target: float,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.limiter = AdaptiveLimiter(initial, minimum, maximum, latency_target)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self._publish()
+
+    def _publish(self) -> None:
+        metrics.set_gauge(f"throttle.{self.name}.limit", self.limiter.limit)
+        metrics.set_gauge(f"throttle.{self.name}.in_flight", self.limiter.in_flight)
+        metrics.set_gauge(f"circuit.{self.name}.state", _STATE_GAUGE[self.breaker.state])
+
+    @contextmanager
+    def slot(self, latency_target: float | None = None) -> Iterator[CallOutcome]:
+        """Hold one rate-limited, concurrency-limited call to this provider.
+
+        Exceptions count as failures; callers that get an error response
+        without an exception report it through the yielded outcome. Calls
+        expected to run long (bulk downloads) pass their own
+        ``latency_target``, or ``math.inf`` to never count as slow. Raises
+        CircuitOpenError straight away while the provider's breaker is open.
+        """
+        if not self.breaker.allow():
+            metrics.incr(f"circuit.{self.name}.rejected")
+            raise CircuitOpenError(self.name, self.breaker.retry_in())
+
+        waited = self.bucket.acquire()
+        if waited:
+            metrics.incr(f"throttle.{self.name}.rate_limited_seconds", waited)
+        self.limiter.acquire()
+        self._publish()
+
+        outcome = CallOutcome()
+        start = time.monotonic()
+        try:
+            yield outcome
+        except Exception as e:
+            outcome.fail(throttled=_is_throttle_error(e))
+            raise
+        finally:
+            latency = time.monotonic() - start
+            self.limiter.release(outcome.ok, latency, latency_target)
+            metrics.incr(f"throttle.{self.name}.calls")
+            if not outcome.ok:
+                metrics.incr(f"throttle.{self.name}.errors")
+            if outcome.throttled:
+                metrics.incr(f"throttle.{self.name}.throttled")
+            if self.breaker.record(outcome.ok):
+                metrics.incr(f"circuit.{self.name}.opened")
+                logger.warning("Circuit opened for %s after repeated failures", self.name)
+            self._publish()
+
+
+PROVIDERS = {
+    "yfinance": Provider("yfinance", rate=2.0, burst=5, initial=4, minimum=1, maximum=8, latency_target=5.0),
+    "mfapi": Provider("mfapi", rate=5.0, burst=10, initial=4, minimum=1, maximum=16, latency_target=3.0),
+    "frankfurter": Provider("frankfurter", rate=5.0, burst=10, initial=2, minimum=1, maximum=4, latency_target=2.0),
+    "amfi": Provider("amfi", rate=1.0, burst=2, initial=1, minimum=1, maximum=2, latency_target=30.0),
+}
+
+PROVIDER_HOSTS = {
+    "api.mfapi.in": "mfapi",
+    "api.frankfurter.dev": "frankfurter",
+    "api.frankfurter.app": "frankfurter",
+    "www.amfiindia.com": "amfi",
+}
+
+
+def provider_slot(name: str, latency_target: float | None = None):
+    return PROVIDERS[name].slot(latency_target)
+
+
+def provider_for_host(host: str) -> Provider | None:
+    name = PROVIDER_HOSTS.get(host)
+    return PROVIDERS[name] if name else None
+
+
+def provider_status() -> list[dict]:
+    """Breaker state per provider, for the UI."""
+    return [
+        {"provider": p.name, "state": p.breaker.state, "retry_in": p.breaker.retry_in()}
+        for p in PROVIDERS.values()
+    ]
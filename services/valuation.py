@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from operator import attrgetter, itemgetter
+
+import numpy as np
+import pandas as pd
+
+from db.database import get_cached_prices
+from db.models import PriceData
+from services.forex_data import cached_fx_matrix, convert
+from services.fx_history import rates_asof
+from services.price_resolver import price_cache_key
+from utils.constants import CATEGORY_CURRENCIES
+
+HOLDING_COLUMNS = ("id", "category", "name", "symbol", "quantity", "buy_price", "buy_date", "currency")
+
+# Per-lot price fields carried from PriceData into the lots frame
+PRICE_COLUMNS = ("current_price", "all_time_high", "all_time_low", "trend", "is_stale", "price_age_seconds")
+
+# Columns summed when a symbol's lots are grouped; other columns, apart from the
+# per-lot ones, are shared by all its lots and taken from the first
+_SUMMED = ["quantity", "invested", "value", "value_base", "invested_base", "fx_pnl_base"]
+_PER_LOT = {"id", "buy_price", "buy_date", "pnl", "pnl_pct", "pnl_base"}
+
+
+_HOLDING_FIELDS = itemgetter(*HOLDING_COLUMNS)
+_PRICE_FIELDS = attrgetter("current_price", "all_time_high", "all_time_low", "trend", "is_stale", "age_seconds")
+_HOLDING_DTYPES = {"id": np.int64, "quantity": float, "buy_price": float}
+_FLOAT_PRICE_COLUMNS = {"current_price", "all_time_high", "all_time_low", "price_age_seconds"}
+
+
+def lots_frame(holdings: list[dict], prices: list[PriceData | None]) -> pd.DataFrame:
+    """Holdings as columns, one row per lot, with ``prices[i]`` for ``holdings[i]``.
+
+    Holdings are rows as returned by get_holdings(). A lot without price
+    data has NaN in the price columns. Each column is built as one array,
+    with its dtype given rather than inferred.
+    """
+    n = len(holdings)
+    holding_columns = zip(*map(_HOLDING_FIELDS, holdings)) if n else [()] * len(HOLDING_COLUMNS)
+    columns = {column: np.array(values, dtype=_HOLDING_DTYPES.get(column, object))
+               for column, values in zip(HOLDING_COLUMNS, holding_columns)}
+
+    has_price = np.fromiter((p is not None for p in prices), dtype=bool, count=n)
+    priced = [p for p in prices if p is not None]
+    price_columns = zip(*map(_PRICE_FIELDS, priced)) if priced else [()] * len(PRICE_COLUMNS)
+    for column, values in zip(PRICE_COLUMNS, price_columns):
+        if column in _FLOAT_PRICE_COLUMNS:
+            full = np.full(n, np.nan)
+        elif column == "is_stale":
+            full = np.zeros(n, dtype=bool)
+        else:
+            full = np.full(n, None, dtype=object)
+        full[has_price] = values
+        columns[column] = full
+
+    return pd.DataFrame(columns)
+
+
+def cached_lots_frame(holdings: list[dict], ttl_minutes: int = 1440) -> pd.DataFrame:
+    """Lots priced from price_cache only (no network); expired or missing prices are NaN."""
+    keys = [price_cache_key(h["category"], h["symbol"]) for h in holdings]
+    cached = get_cached_prices(keys, ttl_minutes=ttl_minutes)
+    prices = [
+        PriceData(
+            current_price=row["current_price"],
+            all_time_high=row.get("all_time_high") or 0,
+            all_time_low=row.get("all_time_low") or 0,
+            trend=row.get("trend") or "SIDEWAYS",
+            age_seconds=row["age_seconds"],
+        ) if row and not row["is_stale"] and row.get("current_price") else None
+        for row in (cached.get(k) for k in keys)
+    ]
+    return lots_frame(holdings, prices)
+
+
+@dataclass(frozen=True)
+class Valuation:
+    """A valued portfolio: ``lots`` per holding, plus by-symbol and by-category aggregates.
+
+    Local-currency columns (invested, value, pnl) are in each lot's currency;
+    ``*_base`` columns are in ``base``, with invested converted at the
+    buy-date rate and ``fx_pnl_base`` the part of the P&L due to the exchange
+    rate moving since.
+    """
+
+    base: str
+    lots: pd.DataFrame
+    by_symbol: pd.DataFrame
+    by_category: pd.DataFrame
+
+    @property
+    def totals(self) -> dict[str, float]:
+        invested_base = float(self.lots["invested_base"].sum())
+        value_base = float(self.lots["value_base"].sum())
+        pnl_base = value_base - invested_base
+        return {
+            "count": len(self.lots),
+            "value_base": value_base,
+            "invested_base": invested_base,
+            "pnl_base": pnl_base,
+            "pnl_pct": pnl_base / invested_base * 100 if invested_base else 0.0,
+            "fx_pnl_base": float(self.lots["fx_pnl_base"].sum()),
+        }
+
+
+def _pnl_columns(columns: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    invested = columns["invested"]
+    pnl = columns["value"] - invested
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pnl_pct = np.where(invested != 0, pnl / invested * 100, 0.0)
+    return {**columns, "pnl": pnl, "pnl_pct": pnl_pct,
+            "pnl_base": columns["value_base"] - columns["invested_base"]}
+
+
+def _aggregate(columns: dict[str, np.ndarray], codes: np.ndarray, shared: list[str]) -> dict[str, np.ndarray]:
+    """One row per group ``codes`` (0..k-1 in order of first appearance): _SUMMED columns
+    summed with bincount, ``shared`` columns from each group's first lot."""
+    first = np.unique(codes, return_index=True)[1]
+    sums = {c: np.bincount(codes, weights=columns[c], minlength=len(first)) for c in _SUMMED}
+    return {**{c: columns[c][first] for c in shared}, **_pnl_columns(sums)}
+
+
+def value_holdings(lots: pd.DataFrame, base: str = "SGD", fx_history: bool = True,
+                   offline: bool = False, wait_for_fresh: bool = False) -> Valuation:
+    """Value every lot and aggregate, with column arithmetic instead of a per-holding loop.
+
+    ``lots`` is a lots_frame(), optionally with extra per-lot columns (e.g.
+    indicators), which are carried into ``by_symbol`` from the symbol's first
+    lot. A lot without a current price is valued at its buy price. FX rates
+    are looked up once per currency (and once per currency and buy date for
+    the cost basis); with ``fx_history`` off, the invested amount uses
+    today's rate. Missing buy-date rates are fetched in the background (and
+    today's rate used until they are stored) unless ``wait_for_fresh``.
+    ``offline`` uses only cached rates and requests nothing.
+    """
+    quantity = lots["quantity"].to_numpy(dtype=float)
+    buy_price = lots["buy_price"].to_numpy(dtype=float)
+    price = lots["current_price"].to_numpy(dtype=float)
+    has_price = ~np.isnan(price)
+    price = np.where(has_price, price, buy_price)
+
+    currencies = lots["currency"].to_numpy(dtype=object)
+    matrix = cached_fx_matrix() if offline else None
+    rate_now = convert(np.ones(len(lots)), currencies, base, matrix)
+    rate_at_buy = (
+        rates_asof(lots["buy_date"].to_numpy(dtype=object), currencies, base, sync=not offline, matrix=matrix,
+                   wait_for_sync=wait_for_fresh)
+        if fx_history else rate_now
+    )
+
+    invested = quantity * buy_price
+    value = quantity * price
+    valued = _pnl_columns({
+        "current_price": price,
+        "has_price": has_price,
+        "invested": invested,
+        "value": value,
+        "value_base": value * rate_now,
+        "invested_base": invested * rate_at_buy,
+        "fx_pnl_base": invested * (rate_now - rate_at_buy),
+    })
+    columns = {c: lots[c].to_numpy() for c in lots.columns if c not in valued} | valued
+    lots = pd.DataFrame(columns)
+
+    category_codes, category_names = pd.factorize(columns["category"])
+    symbol_codes, symbol_names = pd.factorize(columns["symbol"])
+    symbol_groups = pd.factorize(category_codes * len(symbol_names) + symbol_codes)[0]
+    shared = [c for c in columns if c not in {*_SUMMED, *_PER_LOT}]
+    by_symbol = _aggregate(columns, symbol_groups, shared)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        by_symbol["avg_buy"] = np.where(by_symbol["quantity"] != 0, by_symbol["invested"] / by_symbol["quantity"], 0.0)
+    by_symbol = pd.DataFrame(by_symbol)
+
+    by_category = pd.DataFrame(
+        {"currency": [CATEGORY_CURRENCIES.get(c, base) for c in category_names],
+         "count": np.bincount(category_codes),
+         **_aggregate(columns, category_codes, [])},
+        index=pd.Index(category_names, name="category"),
+    )
+
+    return Valuation(base, lots, by_symbol, by_category)
+
+
+def combine(valuations: list[Valuation]) -> Valuation:
+    """One Valuation from non-empty valuations, in the same base, of disjoint sets of categories."""
+    return Valuation(
+        valuations[0].base,
+        pd.concat([v.lots for v in valuations], ignore_index=True),
+        pd.concat([v.by_symbol for v in valuations], ignore_index=True),
+        pd.concat([v.by_category for v in valuations]),
+    )
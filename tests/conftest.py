@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+import pytest
+
+from db import database as db
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """An initialised, empty database in ``tmp_path`` in place of db/portfolio.db."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "portfolio.db"))
+    db.init_db()
+    yield db
+    db.close_connection()
@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import amfi_nav
+from services.amfi_nav import parse_nav_file, refresh_from_amfi
+
+NAV_FILE = Path(__file__).parent / "fixtures" / "NAVAll.txt"
+
+
+def _lines() -> list[str]:
+    return NAV_FILE.read_text().splitlines()
+
+
+def test_parse_skips_headers_blank_lines_and_missing_navs():
+    rows = list(parse_nav_file(_lines()))
+
+    assert rows == [
+        ("119551", "2025-10-17", 512.3456),
+        ("119552", "2025-10-17", 48.12),
+        ("118989", "2025-10-17", 210.01),
+        # A ";" inside the scheme name does not shift the NAV and date
+        ("120503", "2025-10-17", 1990.5),
+        ("122639", "2025-10-16", 89.77),
+    ]
+
+
+def test_parse_filters_by_scheme_code():
+    rows = list(parse_nav_file(_lines(), scheme_codes={"118989", "148567", "999999"}))
+
+    # 148567 is N.A. and 999999 is not in the file
+    assert rows == [("118989", "2025-10-17", 210.01)]
+
+
+@pytest.fixture
+def transactions(monkeypatch):
+    """Number of transactions refresh_from_amfi() opens (nested ones join these)."""
+    opened = []
+    transaction = amfi_nav.transaction
+
+    @contextmanager
+    def counting():
+        opened.append(True)
+        with transaction() as conn:
+            yield conn
+
+    monkeypatch.setattr(amfi_nav, "transaction", counting)
+    return opened
+
+
+def test_refresh_writes_only_held_contiguous_schemes(temp_db, transactions):
+    # Held schemes with history up to the business day before the file's NAV
+    temp_db.upsert_price_history("119551", [{"date": "2025-10-15", "close": 500.0},
+                                            {"date": "2025-10-16", "close": 520.0}])
+    temp_db.upsert_price_history("118989", [{"date": "2025-10-16", "close": 200.0}])
+    # Held, but the stored history stops a week before: left to the per-scheme sync
+    temp_db.upsert_price_history("120503", [{"date": "2025-10-09", "close": 1900.0}])
+    held = ["119551", "118989", "120503", "148567", "100000"]
+
+    results = refresh_from_amfi(held, source=str(NAV_FILE))
+
+    assert set(results) == {"119551", "118989"}
+    assert len(transactions) == 1
+
+    cached = temp_db.get_cached_prices(held + ["119552", "122639"])
+    assert set(cached) == {"119551", "118989"}
+    assert cached["119551"]["current_price"] == 512.3456
+    assert cached["119551"]["currency"] == "INR"
+    assert (cached["119551"]["all_time_high"], cached["119551"]["all_time_low"]) == (520.0, 500.0)
+    assert cached["118989"]["current_price"] == 210.01
+
+    assert [b["date"] for b in temp_db.get_price_history("119551")] == ["2025-10-15", "2025-10-16", "2025-10-17"]
+    assert temp_db.get_price_history("120503")[-1]["date"] == "2025-10-09"
+    # Schemes that are not held are never written
+    assert temp_db.get_price_history("119552") == []
+
+
+def test_refresh_without_contiguous_schemes_writes_nothing(temp_db, transactions):
+    assert refresh_from_amfi(["119551", "118989"], source=str(NAV_FILE)) == {}
+    assert transactions == []
+    assert temp_db.get_cached_prices(["119551", "118989"]) == {}
+
+
+def test_refresh_recomputes_the_trend(temp_db, tmp_path):
+    # 30 rising daily NAVs up to the business day before the file's date
+    nav_day = np.busday_offset(date.today(), 0, roll="backward")
+    days = pd.bdate_range(end=pd.Timestamp(np.busday_offset(nav_day, -1)), periods=30)
+    temp_db.upsert_price_history("119551", [
+        {"date": d.date().isoformat(), "close": 100.0 + i} for i, d in enumerate(days)
+    ])
+    nav_file = tmp_path / "NAVAll.txt"
+    nav_file.write_text(f"119551;-;-;Rising Fund;140.0;{pd.Timestamp(nav_day):%d-%b-%Y}\n")
+
+    results = refresh_from_amfi(["119551"], source=str(nav_file))
+
+    assert results["119551"].trend == "UP"
+    assert temp_db.get_cached_prices(["119551"])["119551"]["trend"] == "UP"
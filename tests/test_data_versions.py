@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+
+def test_price_epoch_follows_price_writes(temp_db):
+    temp_db.upsert_price_cache("AAPL", {"current_price": 150.0})
+    temp_db.upsert_price_cache("MSFT", {"current_price": 300.0})
+    before = temp_db.get_price_epoch(["AAPL"])
+
+    temp_db.upsert_price_cache("MSFT", {"current_price": 301.0})
+    assert temp_db.get_price_epoch(["AAPL"]) == before
+    temp_db.upsert_price_cache("AAPL", {"current_price": 151.0})
+    assert temp_db.get_price_epoch(["AAPL"]) > before
+
+
+def test_history_epoch_follows_history_writes(temp_db):
+    assert temp_db.get_history_epoch(["AAPL"]) == 0
+    temp_db.upsert_price_history("AAPL", [{"date": "2024-01-02", "close": 150.0}])
+    first = temp_db.get_history_epoch(["AAPL"])
+    assert first > 0
+
+    # Another symbol's history and a trend-only write leave it alone
+    temp_db.upsert_price_history("MSFT", [{"date": "2024-01-02", "close": 300.0}])
+    temp_db.set_price_trends({"AAPL": "UP"})
+    assert temp_db.get_history_epoch(["AAPL"]) == first
+
+    temp_db.upsert_price_history("AAPL", [{"date": "2024-01-03", "close": 151.0}])
+    assert temp_db.get_history_epoch(["AAPL"]) > first
+    assert temp_db.get_history_epoch(["AAPL", "MSFT"]) == temp_db.get_data_version("history")
+
+
+def test_fx_version_follows_rate_writes(temp_db):
+    version = temp_db.get_data_version("fx")
+    temp_db.bulk_upsert_forex_cache({"USDSGD": 1.35})
+    assert temp_db.get_data_version("fx") > version
+
+    version = temp_db.get_data_version("fx")
+    temp_db.upsert_fx_history([("USD", "2024-01-02", 0.75)])
+    assert temp_db.get_data_version("fx") > version
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import pytest
+
+
+def test_history_stats_for_symbols_without_history_is_a_read(temp_db, monkeypatch):
+    temp_db.upsert_price_history("AAPL", [{"date": "2024-01-02", "close": 150.0}])
+    monkeypatch.setattr(temp_db, "transaction", lambda: pytest.fail("opened a write transaction"))
+
+    stats = temp_db.get_history_stats_bulk(["AAPL", "NEW1", "NEW2"])
+
+    assert set(stats) == {"AAPL"}
+
+
+def test_history_stats_rebuilt_for_history_without_stats(temp_db):
+    temp_db.upsert_price_history("AAPL", [{"date": "2024-01-02", "close": 150.0},
+                                          {"date": "2024-01-03", "close": 160.0}])
+    with temp_db.transaction() as conn:
+        conn.execute("DELETE FROM price_stats")
+
+    stats = temp_db.get_history_stats_bulk(["AAPL", "NEW1"])
+
+    assert set(stats) == {"AAPL"}
+    assert (stats["AAPL"]["all_time_high"], stats["AAPL"]["last_close"]) == (160.0, 160.0)
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import pytest
+
+from services import forex_data
+
+
+@pytest.fixture
+def frankfurter(temp_db, monkeypatch):
+    """Matrix requests answered locally (and counted); no matrix in memory."""
+    requests = []
+
+    def get_json(url, params=None, **kwargs):
+        requests.append(params)
+        return {"base": "SGD", "rates": {"USD": 0.74, "INR": 64.5, "EUR": 0.68}}
+
+    monkeypatch.setattr(forex_data, "_matrix", None)
+    monkeypatch.setattr(forex_data.http_client, "get_json", get_json)
+    return requests
+
+
+def test_new_process_reuses_last_full_fetch(frankfurter):
+    forex_data.get_fx_matrix()
+    forex_data._matrix = None
+
+    matrix = forex_data.get_fx_matrix()
+
+    assert len(frankfurter) == 1
+    assert set(matrix.rates) == {"USD", "INR", "EUR"}
+    assert matrix.rate("USD", "SGD") == pytest.approx(1 / 0.74)
+
+
+def test_per_pair_rates_do_not_stand_in_for_the_matrix(frankfurter, temp_db):
+    temp_db.upsert_forex_cache("USDSGD", 1.35)
+
+    matrix = forex_data.get_fx_matrix()
+
+    assert len(frankfurter) == 1
+    assert set(matrix.rates) == {"USD", "INR", "EUR"}
+
+
+def test_refetches_when_a_currency_is_missing_or_the_fetch_expired(frankfurter, temp_db):
+    forex_data.get_fx_matrix()
+
+    with temp_db.transaction() as conn:
+        conn.execute("DELETE FROM forex_cache WHERE pair = 'INRSGD'")
+    forex_data._matrix = None
+    forex_data.get_fx_matrix()
+    assert len(frankfurter) == 2
+
+    with temp_db.transaction() as conn:
+        conn.execute("UPDATE fx_matrix_fetches SET fetched_at = datetime('now', '-2 hours')")
+    forex_data._matrix = None
+    forex_data.get_fx_matrix()
+    assert len(frankfurter) == 3
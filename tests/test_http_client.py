@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from services import http_client
+from services.http_client import HttpClient
+
+
+class _Server:
+    """Local HTTP server answering GETs from a script of (status, headers) replies;
+    the last reply repeats once the script runs out."""
+
+    def __init__(self, script: list[tuple[int, dict]], delay: float = 0.0):
+        self.script = list(script)
+        self.delay = delay
+        self.requests = 0
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    status, headers = server.script[min(server.requests, len(server.script) - 1)]
+                    server.requests += 1
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                time.sleep(server.delay)
+                with server._lock:
+                    server.active -= 1
+                body = b'{"ok": true}'
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._httpd.server_port}/"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(script, delay=0.0):
+        servers.append(_Server(script, delay))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff sleeps requested by the client (recorded, and shortened to nothing)."""
+    recorded = []
+    monkeypatch.setattr(http_client, "time", SimpleNamespace(monotonic=time.monotonic, sleep=recorded.append))
+    return recorded
+
+
+def test_retries_retryable_statuses_then_succeeds(serve, sleeps, monkeypatch):
+    server = serve([(503, {}), (503, {}), (200, {})])
+    closed = []
+    close = requests.Response.close
+    monkeypatch.setattr(requests.Response, "close", lambda self: (closed.append(self.status_code), close(self)))
+
+    response = HttpClient(max_retries=3, backoff_base=0.5, backoff_max=8.0).get(server.url)
+
+    assert response.status_code == 200
+    assert response.json() == {"ok": True}
+    assert server.requests == 3
+    # Full-jitter exponential backoff: attempt n sleeps at most base * 2**n
+    assert len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 0.5 and 0 <= sleeps[1] <= 1.0
+    # Each failed response is released before its retry
+    assert closed == [503, 503]
+
+
+def test_gives_up_after_max_retries(serve, sleeps):
+    server = serve([(503, {})])
+
+    with pytest.raises(requests.HTTPError) as excinfo:
+        HttpClient(max_retries=2).get(server.url)
+
+    assert excinfo.value.response.status_code == 503
+    assert server.requests == 3
+    assert len(sleeps) == 2
+
+
+def test_non_retryable_status_is_not_retried(serve, sleeps):
+    server = serve([(404, {})])
+
+    with pytest.raises(requests.HTTPError):
+        HttpClient().get(server.url)
+
+    assert server.requests == 1
+    assert sleeps == []
+
+
+def test_honours_retry_after(serve, sleeps):
+    server = serve([(429, {"Retry-After": "2"}), (200, {})])
+
+    assert HttpClient().get(server.url).status_code == 200
+    assert sleeps == [2.0]
+    assert server.requests == 2
+
+
+def test_stops_when_backoff_would_exceed_budget(serve, sleeps):
+    server = serve([(503, {"Retry-After": "5"})])
+
+    started = time.monotonic()
+    with pytest.raises(requests.HTTPError):
+        HttpClient(max_retries=5).get(server.url, budget=1.0)
+
+    assert server.requests == 1
+    assert sleeps == []
+    assert time.monotonic() - started < 1.0
+
+
+def test_per_host_concurrency_cap(serve):
+    server = serve([(200, {})], delay=0.2)
+    client = HttpClient(per_host_limit=2)
+
+    threads = [threading.Thread(target=client.get, args=(server.url,)) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert server.requests == 6
+    assert server.max_active == 2
@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from services import indicators
+from services.indicators import portfolio_indicators
+
+
+@pytest.fixture
+def fresh(temp_db, monkeypatch):
+    monkeypatch.setattr(indicators, "_snapshot", None)
+    return temp_db
+
+
+def _bars(closes, end=None):
+    days = pd.bdate_range(end=end or date.today(), periods=len(closes))
+    return [{"date": d.date().isoformat(), "close": float(c)} for d, c in zip(days, closes)]
+
+
+def test_cold_database_twice(fresh):
+    # No stored history for any symbol (first launch, or every fetch failed)
+    for _ in range(2):
+        frame = portfolio_indicators(["AAPL", "D05.SI"])
+        assert list(frame.index) == ["AAPL", "D05.SI"]
+        assert frame["rsi_14"].isna().all()
+
+
+def test_history_arriving_after_a_cold_call(fresh):
+    portfolio_indicators(["AAPL", "D05.SI"])
+    fresh.upsert_price_history("AAPL", _bars(np.linspace(100, 130, 40)))
+
+    frame = portfolio_indicators(["AAPL", "D05.SI"])
+
+    assert frame.loc["AAPL", "trend"] == "UP"
+    assert np.isnan(frame.loc["D05.SI", "rsi_14"])
+
+
+def test_new_bars_fold_into_the_kept_state(fresh, monkeypatch):
+    closes = 100 + np.sin(np.arange(60) / 3) * 5
+    yesterday = date.today() - timedelta(days=1)
+    fresh.upsert_price_history("AAPL", _bars(closes[:-1], end=yesterday))
+    fresh.upsert_price_history("D05.SI", _bars(closes[:-1] * 0.3, end=yesterday))
+    portfolio_indicators(["AAPL", "D05.SI"])
+
+    fresh.upsert_price_history("AAPL", [{"date": date.today().isoformat(), "close": float(closes[-1])}])
+    extended = portfolio_indicators(["AAPL", "D05.SI"])
+    monkeypatch.setattr(indicators, "_snapshot", None)
+    rebuilt = portfolio_indicators(["AAPL", "D05.SI"])
+
+    pd.testing.assert_frame_equal(extended, rebuilt)
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import csv
+import json
+
+import pytest
+
+import portfolio_cli
+from services import fx_history, http_client
+
+
+@pytest.fixture
+def portfolio(temp_db, monkeypatch):
+    """Two holdings with cached prices and rates; any request fails the test."""
+    monkeypatch.setattr(fx_history, "_history_frames", {})
+    monkeypatch.setattr(http_client.default_client, "get", pytest.fail)
+    temp_db.bulk_insert_holdings([
+        {"category": "US_STOCK", "name": "Apple", "symbol": "AAPL", "quantity": 10, "buy_price": 100.0,
+         "buy_date": None, "currency": "USD", "broker": None, "notes": None},
+        {"category": "SG_STOCK", "name": "DBS", "symbol": "D05.SI", "quantity": 100, "buy_price": 30.0,
+         "buy_date": None, "currency": "SGD", "broker": None, "notes": None},
+    ])
+    temp_db.upsert_price_cache("AAPL", {"current_price": 150.0})
+    temp_db.bulk_upsert_forex_cache({"USDSGD": 1.35})
+    return temp_db
+
+
+def test_offline_json_by_symbol(portfolio, capsys):
+    assert portfolio_cli.main(["--offline", "--db", portfolio.DB_PATH]) == 0
+
+    document = json.loads(capsys.readouterr().out)
+    assert document["base"] == "SGD"
+    # D05.SI was never priced: valued at its buy price
+    assert document["totals"]["value_base"] == pytest.approx(150 * 10 * 1.35 + 30 * 100)
+    assert document["totals"]["invested_base"] == pytest.approx(100 * 10 * 1.35 + 30 * 100)
+    assert sorted(row["symbol"] for row in document["rows"]) == ["AAPL", "D05.SI"]
+
+
+def test_offline_csv_categories_in_another_base(portfolio, tmp_path):
+    output = tmp_path / "categories.csv"
+
+    assert portfolio_cli.main(["--offline", "--db", portfolio.DB_PATH, "--format", "csv",
+                               "--level", "categories", "--category", "US_STOCK", "--base", "usd",
+                               "-o", str(output)]) == 0
+
+    rows = list(csv.DictReader(output.open()))
+    assert [row["category"] for row in rows] == ["US_STOCK"]
+    assert float(rows[0]["value_base"]) == pytest.approx(1500.0)
+
+
+def test_parquet_needs_output(portfolio):
+    with pytest.raises(SystemExit):
+        portfolio_cli.main(["--offline", "--format", "parquet"])
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import itertools
+import math
+
+from services import throttle
+from services.throttle import AdaptiveLimiter, Provider
+
+
+def test_limiter_aimd():
+    limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=8, latency_target=1.0)
+
+    limiter.acquire()
+    limiter.release(ok=True, latency=0.5)
+    assert limiter.limit == 4 and limiter._limit == 4.25
+    limiter.acquire()
+    limiter.release(ok=False, latency=0.5)
+    assert limiter.limit == 2
+    limiter.acquire()
+    limiter.release(ok=True, latency=2.0)
+    assert limiter.limit == 1
+
+
+def test_per_call_latency_target(monkeypatch):
+    # Every clock reading is 10 s after the previous one, so every call takes 10 s
+    clock = itertools.count(0.0, 10.0)
+    monkeypatch.setattr(throttle.time, "monotonic", lambda: next(clock))
+    provider = Provider("test", rate=100.0, burst=100, initial=4, minimum=1, maximum=8, latency_target=5.0)
+
+    with provider.slot(math.inf):
+        pass
+    with provider.slot(30.0):
+        pass
+    assert provider.limiter._limit > 4
+    with provider.slot():
+        pass
+    assert provider.limiter.limit == 2
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+from db.models import PriceData
+from services import fx_history
+from services.forex_data import FxMatrix
+from services.fx_history import _missing_ranges, rates_asof
+from services.valuation import combine, lots_frame, value_holdings
+
+# Today's rates: units per 1 SGD (USD 1.35 SGD, INR 0.016 SGD)
+TODAY = {"USD": 1 / 1.35, "INR": 1 / 0.016}
+# Stored daily history for USD only
+USD_HISTORY = [("USD", "2024-01-05", 0.75), ("USD", "2024-01-08", 0.74)]
+
+
+@pytest.fixture
+def fx(temp_db, monkeypatch):
+    """Cached today's rates and USD history in the temporary database; nothing is fetched."""
+    monkeypatch.setattr(fx_history, "_history_frames", {})
+    monkeypatch.setattr(fx_history, "_checked_at", {})
+    monkeypatch.setattr(fx_history, "_fetch_series", pytest.fail)
+    temp_db.bulk_upsert_forex_cache({f"{c}SGD": 1 / units for c, units in TODAY.items()})
+    temp_db.upsert_fx_history(USD_HISTORY)
+    return temp_db
+
+
+def _holding(id, category, symbol, quantity, buy_price, buy_date, currency):
+    return {"id": id, "category": category, "name": symbol, "symbol": symbol, "quantity": quantity,
+            "buy_price": buy_price, "buy_date": buy_date, "currency": currency}
+
+
+def _lots():
+    holdings = [
+        # Bought on a Saturday: costed at Friday's fixing
+        _holding(1, "US_STOCK", "AAPL", 10, 100.0, "2024-01-06", "USD"),
+        _holding(2, "US_STOCK", "AAPL", 5, 120.0, "2024-01-08", "USD"),
+        # No price yet, and INR has no stored history
+        _holding(3, "INDIAN_STOCK", "INFY", 2, 1500.0, "2024-01-08", "INR"),
+        _holding(4, "SG_STOCK", "D05", 100, 30.0, None, "SGD"),
+    ]
+    prices = [PriceData(150.0, 200.0, 90.0, "UP"), PriceData(150.0, 200.0, 90.0, "UP"),
+              None, PriceData(35.0, 40.0, 20.0, "SIDEWAYS")]
+    return lots_frame(holdings, prices)
+
+
+def test_value_holdings_lots(fx):
+    lots = value_holdings(_lots(), "SGD", offline=True).lots.set_index("id")
+
+    np.testing.assert_allclose(lots["invested"], [1000.0, 600.0, 3000.0, 3000.0])
+    np.testing.assert_allclose(lots["value"], [1500.0, 750.0, 3000.0, 3500.0])
+    np.testing.assert_allclose(lots["pnl"], [500.0, 150.0, 0.0, 500.0])
+    np.testing.assert_allclose(lots["pnl_pct"], [50.0, 25.0, 0.0, 500 / 30])
+    assert lots["has_price"].tolist() == [True, True, False, True]
+    assert lots.loc[3, "current_price"] == 1500.0
+
+    np.testing.assert_allclose(lots["value_base"], [2025.0, 1012.5, 48.0, 3500.0])
+    # Cost basis at the buy-date rate: 1/0.75 on Friday 5 Jan, 1/0.74 on 8 Jan, today's for INR and SGD
+    np.testing.assert_allclose(lots["invested_base"], [1000 / 0.75, 600 / 0.74, 48.0, 3000.0])
+    np.testing.assert_allclose(lots["fx_pnl_base"], [1000 * (1.35 - 1 / 0.75), 600 * (1.35 - 1 / 0.74), 0.0, 0.0])
+    np.testing.assert_allclose(lots["pnl_base"], lots["value_base"] - lots["invested_base"])
+
+
+def test_value_holdings_aggregates(fx):
+    valuation = value_holdings(_lots(), "SGD", offline=True)
+
+    by_symbol = valuation.by_symbol.set_index("symbol")
+    assert list(by_symbol.index) == ["AAPL", "INFY", "D05"]
+    aapl = by_symbol.loc["AAPL"]
+    assert (aapl["quantity"], aapl["invested"], aapl["value"], aapl["pnl"]) == (15, 1600.0, 2250.0, 650.0)
+    assert aapl["avg_buy"] == pytest.approx(1600 / 15)
+    assert aapl["value_base"] == pytest.approx(3037.5)
+    assert aapl["invested_base"] == pytest.approx(1000 / 0.75 + 600 / 0.74)
+    assert aapl["trend"] == "UP"
+
+    by_category = valuation.by_category
+    assert by_category.loc["US_STOCK", "count"] == 2
+    assert by_category.loc["INDIAN_STOCK", "currency"] == "INR"
+    assert by_category["value_base"].sum() == pytest.approx(6585.5)
+
+    totals = valuation.totals
+    invested_base = 1000 / 0.75 + 600 / 0.74 + 48 + 3000
+    assert totals["count"] == 4
+    assert totals["value_base"] == pytest.approx(6585.5)
+    assert totals["invested_base"] == pytest.approx(invested_base)
+    assert totals["pnl_pct"] == pytest.approx((6585.5 - invested_base) / invested_base * 100)
+
+
+def test_value_holdings_in_another_base(fx):
+    lots = value_holdings(_lots(), "USD", offline=True).lots.set_index("id")
+
+    np.testing.assert_allclose(lots["value_base"], [1500.0, 750.0, 48 / 1.35, 3500 / 1.35])
+    # USD lots have no FX P&L against USD whatever the history says
+    np.testing.assert_allclose(lots.loc[[1, 2], "invested_base"], [1000.0, 600.0])
+
+
+def test_combine_matches_valuing_together(fx):
+    lots = _lots()
+    together = value_holdings(lots, "SGD", offline=True)
+    parts = combine([value_holdings(part, "SGD", offline=True) for _, part in lots.groupby("category", sort=False)])
+
+    assert parts.totals == pytest.approx(together.totals)
+    assert sorted(parts.by_symbol["symbol"]) == sorted(together.by_symbol["symbol"])
+
+
+def test_rates_asof(fx):
+    matrix = FxMatrix("SGD", TODAY, 0.0)
+    dates = ["2024-01-05", "2024-01-06", "2024-01-09", "2023-12-29", None, "not a date", "2024-01-08", "2024-01-08"]
+    currencies = ["USD", "USD", "USD", "USD", "USD", "USD", "INR", "XYZ"]
+
+    rates = rates_asof(dates, currencies, "SGD", sync=False, matrix=matrix)
+
+    np.testing.assert_allclose(rates, [
+        1 / 0.75,  # on a fixing
+        1 / 0.75,  # Saturday: Friday's fixing
+        1 / 0.74,  # after the last fixing: the last one
+        1.35,      # before any stored fixing: today's rate
+        1.35,      # no date
+        1.35,      # unparseable date
+        0.016,     # no history for the currency: today's rate
+        1.0,       # no rate at all: unconverted
+    ])
+
+
+def test_rates_asof_cross_rate(fx):
+    matrix = FxMatrix("SGD", TODAY, 0.0)
+
+    rates = rates_asof(["2024-01-05", "2024-01-05"], ["USD", "SGD"], "INR", sync=False, matrix=matrix)
+
+    # INR has no history, so the target side falls back to today's rate for the pair
+    np.testing.assert_allclose(rates, [1.35 / 0.016, 1 / 0.016])
+
+
+def test_missing_ranges():
+    today = date(2024, 1, 15)
+    assert _missing_ranges(None, None, date(2024, 1, 1), today) == [(date(2024, 1, 1), today)]
+    # Saturday start before a Monday first fixing: nothing to fetch before it
+    assert _missing_ranges("2024-01-08", "2024-01-12", date(2024, 1, 6), date(2024, 1, 13)) == []
+    assert _missing_ranges("2024-01-08", "2024-01-12", date(2024, 1, 3), date(2024, 1, 16)) == [
+        (date(2024, 1, 3), date(2024, 1, 7)),
+        (date(2024, 1, 13), date(2024, 1, 16)),
+    ]
+
+
+def test_requested_head_is_not_fetched_again(fx, monkeypatch):
+    requested = []
+
+    def fetch(start, end, currencies):
+        requested.append((start, end))
+        return []
+
+    monkeypatch.setattr(fx_history, "_fetch_series", fetch)
+    # Monday 1 Jan 2024 is a holiday with no fixing; the stored history starts on the 5th
+    fx_history.sync_fx_history(["USD"], date(2024, 1, 1))
+    assert requested[0] == (date(2024, 1, 1), date(2024, 1, 4))
+
+    requested.clear()
+    fx_history._checked_at.clear()
+    fx_history.sync_fx_history(["USD"], date(2024, 1, 1))
+    assert all(start > date(2024, 1, 8) for start, _ in requested)
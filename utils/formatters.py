@@ -17,3 +17,13 @@ def format_pnl(value: float, currency: str) -> str:
 def format_percentage(value: float) -> str:
     sign = "+" if value >= 0 else ""
     return f"{sign}{value:.1f}%"
+
+
+def format_age(seconds: float | None) -> str:
+    if seconds is None or seconds < 60:
+        return "just now"
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m ago"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)}h ago"
+    return f"{int(seconds // 86400)}d ago"
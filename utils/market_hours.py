@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+CALENDAR_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "exchange_calendar.json")
+
+# How far to search for the previous/next session (covers long holiday runs)
+MAX_SEARCH_DAYS = 15
+
+
+@dataclass(frozen=True)
+class Exchange:
+    name: str
+    tz: ZoneInfo
+    open: time
+    close: time
+    weekdays: frozenset[int]
+    holidays: frozenset[date]
+    settle_minutes: int
+
+    def is_trading_day(self, day: date) -> bool:
+        return day.weekday() in self.weekdays and day not in self.holidays
+
+    def session(self, day: date) -> tuple[datetime, datetime]:
+        """Open and close of ``day``'s session; overnight sessions open the evening before."""
+        open_day = day - timedelta(days=1) if self.open >= self.close else day
+        return (datetime.combine(open_day, self.open, self.tz),
+                datetime.combine(day, self.close, self.tz))
+
+
+@lru_cache(maxsize=1)
+def load_calendar(path: str = CALENDAR_PATH) -> dict[str, Exchange]:
+    with open(path) as f:
+        data = json.load(f)
+    return {
+        name: Exchange(
+            name=name,
+            tz=ZoneInfo(cfg["timezone"]),
+            open=time.fromisoformat(cfg["open"]),
+            close=time.fromisoformat(cfg["close"]),
+            weekdays=frozenset(cfg["weekdays"]),
+            holidays=frozenset(date.fromisoformat(d) for d in cfg.get("holidays", [])),
+            settle_minutes=cfg.get("settle_minutes", 0),
+        )
+        for name, cfg in data["exchanges"].items()
+    }
+
+
+def exchange_for_symbol(symbol: str) -> str | None:
+    """Map a Yahoo symbol to its exchange, following holding_form._normalize_symbol.
+
+    Returns None for symbols without a session model (FX pairs, indices).
+    """
+    s = symbol.upper()
+    if s.endswith(".NS"):
+        return "NSE"
+    if s.endswith(".BO"):
+        return "BSE"
+    if s.endswith(".SI"):
+        return "SGX"
+    if s.endswith("=F"):
+        return "COMEX"
+    if "=" in s or s.startswith("^"):
+        return None
+    return "NYSE"
+
+
+def _now(now: datetime | None) -> datetime:
+    return now or datetime.now(timezone.utc)
+
+
+def is_open(exchange: str, now: datetime | None = None) -> bool:
+    ex = load_calendar()[exchange]
+    local = _now(now).astimezone(ex.tz)
+    # An overnight session for tomorrow may already be running this evening
+    for day in (local.date(), local.date() + timedelta(days=1)):
+        if ex.is_trading_day(day):
+            start, end = ex.session(day)
+            if start <= local < end:
+                return True
+    return False
+
+
+def last_close(exchange: str, now: datetime | None = None) -> datetime | None:
+    ex = load_calendar()[exchange]
+    local = _now(now).astimezone(ex.tz)
+    for offset in range(MAX_SEARCH_DAYS):
+        day = local.date() - timedelta(days=offset)
+        if ex.is_trading_day(day):
+            _, end = ex.session(day)
+            if end <= local:
+                return end
+    return None
+
+
+def next_open(exchange: str, now: datetime | None = None) -> datetime | None:
+    ex = load_calendar()[exchange]
+    local = _now(now).astimezone(ex.tz)
+    for offset in range(MAX_SEARCH_DAYS + 1):
+        day = local.date() + timedelta(days=offset)
+        if ex.is_trading_day(day):
+            start, _ = ex.session(day)
+            if start > local:
+                return start
+    return None
+
+
+def effective_ttl_minutes(symbol: str, ttl_minutes: float, now: datetime | None = None) -> float:
+    """Cache TTL for ``symbol`` that respects its exchange's trading hours.
+
+    While the market is open this is just ``ttl_minutes``. While it is closed,
+    any price fetched after the last close (plus a settlement grace period)
+    stays fresh until the next session opens, so the TTL stretches back to
+    that point.
+    """
+    exchange = exchange_for_symbol(symbol)
+    if exchange is None:
+        return ttl_minutes
+    now = _now(now)
+    if is_open(exchange, now):
+        return ttl_minutes
+    closed_at = last_close(exchange, now)
+    if closed_at is None:
+        return ttl_minutes
+    settled_at = closed_at + timedelta(minutes=load_calendar()[exchange].settle_minutes)
+    minutes_since_settle = (now - settled_at).total_seconds() / 60
+    return max(ttl_minutes, minutes_since_settle)